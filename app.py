@@ -1,125 +1,223 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import asyncio
 import json
 import base64
+import hmac
+import queue
+import time
+import logfire
 from io import BytesIO
 from PIL import Image
 import io
 
 # Import your existing clinic AI functionality
-from pydantic_ai_expert import clinic_ai_expert, ClinicAIDeps, load_knowledge_base
-from openai import AsyncOpenAI
+from pydantic_ai_expert import clinic_ai_expert, ClinicAIDeps, KNOWLEDGE_BASE_FILE, openai_client, system_prompt, system_prompt_version
+from knowledge_manager import KnowledgeBaseManager
+from event_loop import get_event_loop
+from session_store import create_session_store
+from session_tokens import SessionTokens
+from history_compaction import compact_history, openai_summarizer
+from prompt_layout import PromptCacheStats, with_static_prefix
+from embedding_cache import EmbeddingCache
+from response_cache import ResponseCache
+from vector_store import vector_store_directory
+from web_search_cache import WebSearchCache
+import metrics
+from pydantic_ai.messages import ModelResponse, TextPart
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Session-ID', 'X-KB-Version'])
 
 # Initialize clients and load knowledge base
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-knowledge_base = load_knowledge_base()
+# openai_client is the agent's own client, so all OpenAI calls share one connection pool
+# The knowledge base and the local site_pages vectors for hybrid search (optional, see
+# vector_store.py) are reloaded in the background when their files change
+knowledge_base_manager = KnowledgeBaseManager(KNOWLEDGE_BASE_FILE, vector_store_dir=vector_store_directory()).start()
 
-# Store conversation history (in production, use a proper database)
-conversation_history = {}
+# All agent runs share one long-lived event loop (and with it the OpenAI connection pool)
+agent_loop = get_event_loop()
+AGENT_TIMEOUT = 60  # seconds
+
+# Conversation history per session (bounded, see session_store.py)
+session_store = create_session_store()
+# Session ids are issued and signed by the server (SESSION_SECRET)
+session_tokens = SessionTokens()
+summarize_history = openai_summarizer(openai_client)
+
+# Cached answers to first-turn questions, per knowledge base snapshot and prompt (see answer_version)
+embedding_cache = EmbeddingCache()
+response_cache = ResponseCache(
+    embedding_cache=embedding_cache,
+    openai_client=openai_client
+)
+# Web search results shared by all sessions (TTL, coalescing, stale-while-revalidate)
+web_search_cache = WebSearchCache()
+# Prompt tokens the API served from its prompt cache
+prompt_cache_stats = PromptCacheStats()
 
 # Add logging to debug environment variables and knowledge base
 print("🔍 Checking environment variables...")
 print(f"OPENAI_API_KEY: {'✅ Set' if os.getenv('OPENAI_API_KEY') else '❌ Missing'}")
 
 print("\n📚 Checking knowledge base...")
+knowledge_base = knowledge_base_manager.current
 if not knowledge_base.get("treatments") and not knowledge_base.get("pages"):
     print("⚠️  Warning: Knowledge base is empty. Please check combined_database_newest.json file.")
 else:
     treatment_count = len(knowledge_base.get("treatments", []))
     page_count = len(knowledge_base.get("pages", []))
-    print(f"✅ Knowledge base loaded: {treatment_count} treatments, {page_count} pages")
+    print(f"✅ Knowledge base loaded: {treatment_count} treatments, {page_count} pages (version {knowledge_base.version})")
 
 @app.route('/')
 def index():
     """Serve the main HTML page with the chatbot widget"""
     return render_template('index.html')
 
+def extract_response_text(result):
+    """Collect the assistant text parts of an agent run"""
+    response_text = ""
+    for message in result.new_messages():
+        if hasattr(message, 'parts'):
+            for part in message.parts:
+                if hasattr(part, 'content') and part.part_kind == 'text':
+                    response_text += part.content
+
+    # Clean up the response - remove any system prompt content
+    if "You are an expert consultant" in response_text:
+        # Find where the actual response starts
+        start_idx = response_text.find("Tell me about")
+        if start_idx != -1:
+            response_text = response_text[start_idx:]
+
+    return response_text
+
+def get_session_id():
+    """Return the client's signed session id, or a freshly issued one so clients never share a history"""
+    return session_tokens.verify(request.headers.get('X-Session-ID')) or session_tokens.issue()
+
+async def load_history(session_id):
+    """Load a session's history, compacted to the prompt token budget"""
+    history = await asyncio.to_thread(session_store.load, session_id)
+    compacted = await compact_history(history, summarize=summarize_history)
+    if compacted is not history:
+        # Store the compacted history so older turns are only summarized once,
+        # unless another request appended to the session while we summarized
+        await asyncio.to_thread(session_store.replace, session_id, compacted, history)
+    # The current system prompt first and byte-identical, so the provider can cache the prefix
+    return with_static_prefix(compacted, system_prompt)
+
+def record_usage(usage, span):
+    """Record the token counts and prompt caching of one agent run"""
+    cached_tokens = prompt_cache_stats.record(usage)
+    metrics.record_tokens(usage)
+    span.set_attribute('prompt_tokens', usage.request_tokens or 0)
+    span.set_attribute('completion_tokens', usage.response_tokens or 0)
+    span.set_attribute('cached_tokens', cached_tokens)
+    span.set_attribute('model_requests', usage.requests)
+    print(f"🧾 Prompt tokens: {usage.request_tokens or 0} ({cached_tokens} cached) in {usage.requests} requests")
+
+def record_queue_wait(submitted, span):
+    """Record how long a request waited for the agent event loop"""
+    queue_wait = time.perf_counter() - submitted
+    metrics.queue_wait_seconds.observe(queue_wait)
+    span.set_attribute('queue_wait_seconds', queue_wait)
+
+async def run_ai_agent(user_message, session_id, knowledge_base, submitted):
+    """Run the AI agent on the shared event loop and update the session history"""
+    # The request span is opened on the event loop, so the agent, model and tool spans nest under it
+    with logfire.span('chat request', endpoint='chat', kb_version=knowledge_base.version) as span:
+        record_queue_wait(submitted, span)
+        return await answer(user_message, session_id, knowledge_base, span)
+
+def answer_version(knowledge_base):
+    """The knowledge base snapshot and system prompt an answer is generated with"""
+    return f"{knowledge_base.version}:{system_prompt_version}"
+
+async def answer(user_message, session_id, knowledge_base, span):
+    """Answer a chat message (from the cache or with an agent run) and update the session history"""
+    print(f"🤖 Processing query: '{user_message}'")
+
+    # Prepare dependencies
+    deps = ClinicAIDeps(
+        knowledge_base=knowledge_base,
+        openai_client=openai_client,
+        vector_store=knowledge_base_manager.vector_store,
+        embedding_cache=embedding_cache,
+        web_search_cache=web_search_cache
+    )
+
+    history = await load_history(session_id)
+
+    # First-turn questions do not depend on any history and can be answered from the cache
+    if not history:
+        cached = await response_cache.get(user_message, answer_version(knowledge_base))
+        if cached:
+            await asyncio.to_thread(session_store.append, session_id, cached.messages_for(user_message))
+            metrics.response_cache_hits.inc()
+            span.set_attribute('response_cache_hit', True)
+            print(f"⚡ Cached response: {len(cached.answer)} characters")
+            return cached.answer
+
+    # Run the agent with the user's message
+    started = time.perf_counter()
+    result = await clinic_ai_expert.run(
+        user_message,
+        deps=deps,
+        message_history=history
+    )
+    metrics.agent_run_seconds.observe(time.perf_counter() - started, mode='run')
+
+    response_text = extract_response_text(result)
+    record_usage(result.usage(), span)
+
+    # Update conversation history
+    await asyncio.to_thread(session_store.append, session_id, result.new_messages())
+    if not history:
+        await response_cache.put(user_message, response_text, result.new_messages(), time.perf_counter() - started,
+                                 answer_version(knowledge_base))
+
+    print(f"✅ AI response generated: {len(response_text)} characters")
+    return response_text
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat messages from the frontend"""
+    started = time.perf_counter()
+    status = 'error'
     try:
         data = request.get_json()
         user_message = data.get('message', '')
         
         if not user_message:
+            status = 'invalid'
             return jsonify({'error': 'No message provided'}), 400
         
-        # Get or create conversation history for this session
-        session_id = request.headers.get('X-Session-ID', 'default')
-        if session_id not in conversation_history:
-            conversation_history[session_id] = []
-        
-        # Run the AI agent in a separate thread to handle async operations
-        import asyncio
-        import threading
-        from concurrent.futures import ThreadPoolExecutor
-        
-        def run_ai_agent():
-            """Run the AI agent in a new event loop"""
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                print(f"🤖 Processing query: '{user_message}'")
-                
-                # Prepare dependencies
-                deps = ClinicAIDeps(
-                    knowledge_base=knowledge_base,
-                    openai_client=openai_client
-                )
-                
-                # Run the agent with the user's message
-                result = loop.run_until_complete(clinic_ai_expert.run(
-                    user_message,
-                    deps=deps,
-                    message_history=conversation_history[session_id]
-                ))
-                
-                # Extract the response text (only from assistant messages, not system prompts)
-                response_text = ""
-                for message in result.new_messages():
-                    if hasattr(message, 'parts'):
-                        for part in message.parts:
-                            if hasattr(part, 'content') and part.part_kind == 'text':
-                                response_text += part.content
-                
-                # Clean up the response - remove any system prompt content
-                if "You are an expert consultant" in response_text:
-                    # Find where the actual response starts
-                    start_idx = response_text.find("Tell me about")
-                    if start_idx != -1:
-                        response_text = response_text[start_idx:]
-                
-                # Update conversation history
-                conversation_history[session_id].extend(result.new_messages())
-                
-                print(f"✅ AI response generated: {len(response_text)} characters")
-                return response_text
-            except Exception as e:
-                print(f"❌ Error in AI agent: {e}")
-                import traceback
-                traceback.print_exc()
-                raise e
-            finally:
-                loop.close()
+        session_id = get_session_id()
+        # One knowledge base snapshot for the whole run, even if a reload happens meanwhile
+        knowledge_base = knowledge_base_manager.current
         
-        # Run the AI agent in a thread pool
-        with ThreadPoolExecutor() as executor:
-            future = executor.submit(run_ai_agent)
-            response_text = future.result(timeout=60)  # 60 second timeout
+        # Await the agent on the shared event loop; this thread only waits for the result
+        response_text = agent_loop.run(
+            run_ai_agent(user_message, session_id, knowledge_base, time.perf_counter()),
+            timeout=AGENT_TIMEOUT
+        )
+        status = 'ok'
         
-        return jsonify({
+        response = jsonify({
             'message': response_text,
-            'sources': []  # You can add sources here if available
+            'sources': [],  # You can add sources here if available
+            'session_id': session_id,
+            'kb_version': knowledge_base.version
         })
+        response.headers['X-Session-ID'] = session_id
+        response.headers['X-KB-Version'] = knowledge_base.version
+        return response
         
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
@@ -129,6 +227,141 @@ def chat():
             'message': 'Entschuldigung, es gab einen Fehler bei der Verarbeitung Ihrer Anfrage. Bitte versuchen Sie es erneut.',
             'sources': []
         }), 500
+    finally:
+        metrics.chat_requests.inc(endpoint='chat', status=status)
+        metrics.chat_request_seconds.observe(time.perf_counter() - started, endpoint='chat')
+
+async def stream_ai_agent(user_message, session_id, knowledge_base, deltas, submitted):
+    """Stream the agent's answer into the deltas queue and update the session history"""
+    with logfire.span('chat request', endpoint='chat_stream', kb_version=knowledge_base.version) as span:
+        record_queue_wait(submitted, span)
+        return await stream_answer(user_message, session_id, knowledge_base, deltas, span)
+
+async def stream_answer(user_message, session_id, knowledge_base, deltas, span):
+    """Stream the answer to a chat message (from the cache or the agent) and update the session history"""
+    print(f"🤖 Streaming query: '{user_message}'")
+
+    deps = ClinicAIDeps(
+        knowledge_base=knowledge_base,
+        openai_client=openai_client,
+        vector_store=knowledge_base_manager.vector_store,
+        embedding_cache=embedding_cache,
+        web_search_cache=web_search_cache
+    )
+
+    history = await load_history(session_id)
+
+    if not history:
+        cached = await response_cache.get(user_message, answer_version(knowledge_base))
+        if cached:
+            await asyncio.to_thread(session_store.append, session_id, cached.messages_for(user_message))
+            deltas.put(cached.answer)
+            metrics.response_cache_hits.inc()
+            span.set_attribute('response_cache_hit', True)
+            print(f"⚡ Cached response: {len(cached.answer)} characters")
+            return cached.answer
+
+    started = time.perf_counter()
+    async with clinic_ai_expert.run_stream(
+        user_message,
+        deps=deps,
+        message_history=history
+    ) as result:
+        response_text = ""
+        async for delta in result.stream_text(delta=True):
+            response_text += delta
+            deltas.put(delta)
+
+        # stream_text(delta=True) does not record the final response, so add it ourselves
+        new_messages = result.new_messages() + [ModelResponse(parts=[TextPart(content=response_text)])]
+        metrics.agent_run_seconds.observe(time.perf_counter() - started, mode='stream')
+        record_usage(result.usage(), span)
+        await asyncio.to_thread(session_store.append, session_id, new_messages)
+
+    if not history:
+        await response_cache.put(user_message, response_text, new_messages, time.perf_counter() - started,
+                                 answer_version(knowledge_base))
+
+    print(f"✅ AI response streamed: {len(response_text)} characters")
+    return response_text
+
+def sse_event(event, data):
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the answer to a chat message as Server-Sent Events
+
+    Emits `delta` events with text chunks as they are generated, then a single
+    `done` event with the full message (or an `error` event).
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '')
+
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    session_id = get_session_id()
+    knowledge_base = knowledge_base_manager.current
+
+    started = time.perf_counter()
+    deltas = queue.Queue()
+    future = agent_loop.submit(stream_ai_agent(user_message, session_id, knowledge_base, deltas, started))
+    future.add_done_callback(lambda _: deltas.put(None))
+
+    def generate():
+        deadline = time.monotonic() + AGENT_TIMEOUT
+        # Stays 'cancelled' if the client goes away before the answer is complete
+        status = 'cancelled'
+        try:
+            while True:
+                try:
+                    delta = deltas.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    future.cancel()
+                    status = 'timeout'
+                    yield sse_event('error', {'message': 'Zeitüberschreitung bei der Verarbeitung Ihrer Anfrage.'})
+                    return
+                if delta is None:
+                    break
+                yield sse_event('delta', {'delta': delta})
+
+            if future.cancelled() or future.exception():
+                if not future.cancelled():
+                    print(f"Error in chat stream: {future.exception()}")
+                status = 'error'
+                yield sse_event('error', {
+                    'message': 'Entschuldigung, es gab einen Fehler bei der Verarbeitung Ihrer Anfrage. Bitte versuchen Sie es erneut.'
+                })
+            else:
+                status = 'ok'
+                yield sse_event('done', {'message': future.result(), 'sources': [], 'kb_version': knowledge_base.version})
+        finally:
+            # Client went away or we timed out: stop generating on the event loop
+            if not future.done():
+                future.cancel()
+            metrics.chat_requests.inc(endpoint='chat_stream', status=status)
+            metrics.chat_request_seconds.observe(time.perf_counter() - started, endpoint='chat_stream')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'X-Session-ID': session_id,
+            'X-KB-Version': knowledge_base.version
+        }
+    )
+
+@app.route('/api/session/reset', methods=['POST'])
+def reset_session():
+    """Forget the conversation of the client's session (restart button of the widget)"""
+    session_id = session_tokens.verify(request.headers.get('X-Session-ID'))
+    if session_id:
+        session_store.reset(session_id)
+    return jsonify({'reset': bool(session_id)})
 
 @app.route('/api/analyze-image', methods=['POST'])
 def analyze_image():
@@ -177,6 +410,38 @@ def analyze_image():
             'error': 'Fehler bei der Bildanalyse. Bitte versuchen Sie es erneut.'
         }), 500
 
+@app.route('/api/admin/reload-knowledge-base', methods=['POST'])
+def reload_knowledge_base():
+    """Reload the knowledge base now (requires the ADMIN_TOKEN as X-Admin-Token header)"""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    # Indexing runs on this request thread; chat requests keep using the old snapshot until the swap
+    reloaded = knowledge_base_manager.reload_knowledge_base(force=True)
+    # The vector store is reloaded if the ingestion CLI replaced its files
+    vector_store_reloaded = knowledge_base_manager.reload_vector_store()
+    return jsonify({
+        'reloaded': reloaded,
+        'vector_store_reloaded': vector_store_reloaded,
+        'kb_version': knowledge_base_manager.version
+    })
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Hit rates of the response, embedding and web search caches and of the provider prompt cache"""
+    return jsonify({
+        'response_cache': response_cache.stats,
+        'embedding_cache': embedding_cache.stats,
+        'web_search_cache': web_search_cache.stats,
+        'prompt_cache': prompt_cache_stats.stats
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Request, agent, tool and model latencies and token counts in the Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/health')
 def health_check():
     """Health check endpoint for Render.com"""
@@ -184,4 +449,4 @@ def health_check():
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port, debug=False) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True) 
\ No newline at end of file
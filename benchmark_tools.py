@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Offline latency benchmark of the knowledge base tools.
+
+Loads combined_database_newest.json, scales its treatments synthetically
+(every treatment copied with a unique id and name) and replays a fixed set
+of German queries against search_treatments, search_pages,
+search_knowledge_base, get_treatment_details and list_treatments_by_category.
+For every scale and tool it reports
+
+- p50/p95/p99 latency over all queries and repetitions,
+- the memory allocated per call (peak above the start, traced with tracemalloc).
+
+The peak RSS is reported once per scale: ru_maxrss is the high-water mark of
+the whole process, so a per-tool value would only repeat the largest so far.
+
+No network is used: search_knowledge_base runs without vector store, so it
+measures BM25 retrieval, fusion and rendering. The results are written as
+JSON; pass an earlier file as --baseline to compare p95 latencies between
+commits:
+
+    python benchmark_tools.py [--scales 1 10 100 1000] [--output results.json] [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+# The agent module creates its OpenAI model at import; the benchmark never calls it
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+from knowledge_index import KnowledgeBase
+from pydantic_ai_expert import (
+    KNOWLEDGE_BASE_FILE,
+    ClinicAIDeps,
+    get_treatment_details,
+    list_treatments_by_category,
+    search_knowledge_base,
+    search_pages,
+    search_treatments,
+)
+
+DEFAULT_SCALES = [1, 10, 100, 1000]
+DEFAULT_REPEATS = 5
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+# p95 latency increase (relative to the baseline) reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+SEARCH_QUERIES = [
+    "Was kostet Botox?",
+    "Faltenbehandlung Stirn",
+    "Morpheus8 Ausfallzeit",
+    "Laser gegen Akne Narben",
+    "dauerhafte Haarentfernung Beine",
+    "HydraFacial Ablauf",
+    "Behandlungen für Männer",
+    "Lippen aufspritzen Hyaluron",
+    "Cellulite am Po",
+    "schwitzen unter den Achseln",
+    "Pigmentflecken entfernen",
+    "Öffnungszeiten und Anfahrt",
+]
+
+TREATMENT_NAMES = [
+    "Botox",
+    "Morpheus8",
+    "HydraFacial",
+    "CO2 Laser",
+    "Hyaluronsäure",
+    "Radiesse",
+    "Ultherapy",
+    "Morpheus",
+    "Hydrafacial Behandlung",
+    "Unbekannte Behandlung",
+]
+
+CATEGORIES = ["", "Gesicht", "Körper", "Männer"]
+
+
+def scale_knowledge_base(data: Dict[str, Any], factor: int) -> Dict[str, Any]:
+    """The knowledge base with every treatment copied `factor` times under unique ids and names."""
+    treatments = []
+    for copy in range(factor):
+        for treatment in data.get("treatments", []):
+            if copy == 0:
+                treatments.append(treatment)
+            else:
+                treatments.append(dict(
+                    treatment,
+                    id=f"{treatment.get('id', '')}-v{copy}",
+                    treatment_name=f"{treatment.get('treatment_name', '')} Variante {copy}"
+                ))
+    # A JSON round trip gives every copy its own objects, as if loaded from a file that large
+    return json.loads(json.dumps(dict(data, treatments=treatments)))
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    # Rounded first, so e.g. 0.95 * 100 is rank 95 and not 96
+    rank = max(1, math.ceil(round(fraction * len(sorted_values), 9)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(call: Callable[[Any], Any], inputs: List[Any], repeats: int) -> Dict[str, float]:
+    """Latency percentiles (ms) and allocations per call (KB) of call over inputs."""
+    call(inputs[0])  # warm up lazily built state
+
+    durations = []
+    for _ in range(repeats):
+        for value in inputs:
+            started = time.perf_counter()
+            call(value)
+            durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+
+    # Allocations are traced in a separate pass, tracemalloc slows every allocation down
+    allocations = []
+    tracemalloc.start()
+    try:
+        for value in inputs:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            call(value)
+            allocations.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": len(durations),
+        "p50_ms": percentile(durations, 0.50),
+        "p95_ms": percentile(durations, 0.95),
+        "p99_ms": percentile(durations, 0.99),
+        "max_ms": durations[-1],
+        "alloc_kb_mean": sum(allocations) / len(allocations),
+        "alloc_kb_max": max(allocations),
+    }
+
+
+def tool_calls(knowledge_base: KnowledgeBase, loop: asyncio.AbstractEventLoop) -> Dict[str, tuple]:
+    """The benchmarked tools as (call, inputs) pairs for one knowledge base."""
+    # The tools only use ctx.deps
+    ctx = SimpleNamespace(deps=ClinicAIDeps(knowledge_base=knowledge_base, openai_client=None))
+
+    def run_tool(tool):
+        # The tool itself, without the timed_tool span and metrics (and their console output)
+        tool = getattr(tool, "__wrapped__", tool)
+        return lambda value: loop.run_until_complete(tool(ctx, value))
+
+    return {
+        "search_treatments": (lambda query: search_treatments(knowledge_base, query), SEARCH_QUERIES),
+        "search_pages": (lambda query: search_pages(knowledge_base, query), SEARCH_QUERIES),
+        "search_knowledge_base": (run_tool(search_knowledge_base), SEARCH_QUERIES),
+        "get_treatment_details": (run_tool(get_treatment_details), TREATMENT_NAMES),
+        "list_treatments_by_category": (run_tool(list_treatments_by_category), CATEGORIES),
+    }
+
+
+def run_benchmark(data: Dict[str, Any], scales: List[int], repeats: int = DEFAULT_REPEATS) -> Dict[str, Any]:
+    """Benchmark all tools for every scale factor."""
+    results: Dict[str, Any] = {}
+    loop = asyncio.new_event_loop()
+    try:
+        for factor in scales:
+            scaled = scale_knowledge_base(data, factor)
+            started = time.perf_counter()
+            knowledge_base = KnowledgeBase(scaled, version=f"x{factor}")
+            build_seconds = time.perf_counter() - started
+            print(f"📚 x{factor}: {len(knowledge_base['treatments'])} treatments indexed in {build_seconds:.2f}s")
+
+            tools = {}
+            for name, (call, inputs) in tool_calls(knowledge_base, loop).items():
+                tools[name] = measure(call, inputs, repeats)
+                print(f"   {name:<28} p50 {tools[name]['p50_ms']:8.3f} ms   p95 {tools[name]['p95_ms']:8.3f} ms   "
+                      f"p99 {tools[name]['p99_ms']:8.3f} ms   {tools[name]['alloc_kb_mean']:9.1f} KB/call")
+
+            results[str(factor)] = {
+                "treatments": len(knowledge_base["treatments"]),
+                "pages": len(knowledge_base.get("pages", [])),
+                "build_seconds": build_seconds,
+                "peak_rss_mb": peak_rss_mb(),
+                "tools": tools,
+            }
+            print(f"   peak RSS {results[str(factor)]['peak_rss_mb']:.1f} MB")
+            del knowledge_base, scaled
+    finally:
+        loop.close()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """p95 changes per scale and tool against a baseline run; returns the regressions."""
+    regressions = []
+    print(f"\n📊 p95 compared to {baseline.get('commit') or 'baseline'}:")
+    for scale, result in current["scales"].items():
+        for name, stats in result["tools"].items():
+            old = baseline.get("scales", {}).get(scale, {}).get("tools", {}).get(name)
+            if not old or not old["p95_ms"]:
+                continue
+            change = stats["p95_ms"] / old["p95_ms"] - 1
+            marker = "⚠️ " if change > threshold else "  "
+            print(f"{marker} x{scale:<5} {name:<28} {old['p95_ms']:8.3f} -> {stats['p95_ms']:8.3f} ms ({change:+.0%})")
+            if change > threshold:
+                regressions.append(f"x{scale} {name}")
+    return regressions
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the knowledge base tools at synthetic scales")
+    parser.add_argument("--knowledge-base", default=KNOWLEDGE_BASE_FILE)
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="repetitions of the query set per tool")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    with open(args.knowledge_base, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    results = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "repeats": args.repeats,
+        "scales": run_benchmark(data, args.scales, args.repeats),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_results(json.load(f), results)
+        if regressions:
+            print(f"\n⚠️  {len(regressions)} p95 regressions over {REGRESSION_THRESHOLD:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare the prompt tokens of the full and the compact system prompt mode.
+
+For a set of typical questions, counts the system prompt tokens sent per
+request with all of system_prompt.txt (SYSTEM_PROMPT_MODE=full) and with
+the core plus the retrieved topic sections (SYSTEM_PROMPT_MODE=compact):
+
+    python compare_system_prompt.py [system_prompt.txt] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from history_compaction import count_text_tokens
+from prompt_sections import PromptSections
+
+SAMPLE_QUESTIONS = [
+    "Hallo",
+    "Was kostet Morpheus8?",
+    "Wie lange hält Botox bei Männern?",
+    "Was hilft gegen Falten?",
+    "Was ist der Unterschied zwischen Radiesse und Sculptra?",
+    "Haben Sie Instagram?",
+    "Wo ist die Praxis und wie erreiche ich Sie telefonisch?",
+    "Wer arbeitet in Ihrem Team?",
+    "Wie lange ist die Ausfallzeit nach der CO2-Laserbehandlung?",
+    "Bieten Sie dauerhafte Haarentfernung an?",
+    "Was sind die neuesten Entwicklungen in der ästhetischen Medizin?",
+    "Kann ich einen Termin buchen?",
+]
+
+
+def compare(sections: PromptSections, questions: List[str]) -> Dict[str, Any]:
+    """Token counts per question for both modes and the average saving."""
+    full_tokens = count_text_tokens(sections.text)
+    core_tokens = count_text_tokens(sections.core)
+    rows = []
+    for question in questions:
+        topics = sections.render(question)
+        compact_tokens = core_tokens + (count_text_tokens(topics) if topics else 0)
+        rows.append({
+            "question": question,
+            "topics": [section.title for section in sections.relevant(question)],
+            "full_tokens": full_tokens,
+            "compact_tokens": compact_tokens,
+        })
+    average = sum(row["compact_tokens"] for row in rows) / len(rows)
+    return {
+        "full_tokens": full_tokens,
+        "core_tokens": core_tokens,
+        "topic_sections": len(sections.topics),
+        "average_compact_tokens": average,
+        "average_saving": 1 - average / full_tokens,
+        "questions": rows,
+    }
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="Compare full and compact system prompt tokens")
+    parser.add_argument("path", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompt.txt"))
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    with open(args.path, "r", encoding="utf-8") as f:
+        sections = PromptSections(f.read())
+    results = compare(sections, SAMPLE_QUESTIONS)
+
+    print(f"System prompt: {results['full_tokens']} tokens, core: {results['core_tokens']} tokens, "
+          f"{results['topic_sections']} topic sections")
+    print(f"{'Frage':<62} {'full':>6} {'compact':>8}")
+    for row in results["questions"]:
+        print(f"{row['question'][:60]:<62} {row['full_tokens']:>6} {row['compact_tokens']:>8}")
+    print(f"\n✅ Average: {results['average_compact_tokens']:.0f} instead of {results['full_tokens']} tokens "
+          f"per request ({results['average_saving']:.0%} saved)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,220 @@
+"""
+Persistent cache for OpenAI embeddings.
+
+Embeddings are keyed by (model, hash of the normalized text) and kept in two
+tiers: a small in-memory LRU in front of a size-bounded SQLite file. Repeated
+questions and unchanged site_pages chunks are therefore embedded only once,
+across requests and process restarts.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+# Next to this module, so the app, the ingestion CLI and gunicorn share one file whatever their working directory
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache.sqlite3")
+# The disk tier is counted and trimmed once per this many written embeddings, not on every write
+EVICTION_INTERVAL = 1000
+# Keys per SQLite "in (...)" query, below the default host parameter limit
+SQLITE_BATCH_SIZE = 500
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so trivial variations share one cache entry."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def cache_key(model: str, text: str) -> str:
+    """Return the cache key for an embedding of text by model."""
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier (memory LRU + SQLite) embedding cache with hit/miss counters.
+
+    The SQLite file holds about `disk_entries` embeddings: every
+    EVICTION_INTERVAL written embeddings, the least recently used entries
+    beyond that are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_entries: int = 1024,
+        disk_entries: int = 100_000,
+    ):
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("pragma journal_mode=wal")
+        self._connection.execute(
+            """
+            create table if not exists embeddings (
+                key text primary key,
+                model text not null,
+                embedding blob not null,
+                last_used real not null
+            )
+            """
+        )
+        self._connection.execute("create index if not exists idx_embeddings_last_used on embeddings (last_used)")
+        self._connection.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes_since_eviction = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            disk_size = self._connection.execute("select count(*) from embeddings").fetchone()[0]
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_size": len(self._memory),
+                "disk_size": disk_size,
+            }
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str], model: str = DEFAULT_EMBEDDING_MODEL) -> List[Optional[List[float]]]:
+        """
+        Return the cached embeddings of texts (None for misses). Memory misses
+        are read from SQLite in one query and their last_used updated in one
+        transaction; this blocks, so call it off the event loop.
+        """
+        keys = [cache_key(model, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        with self._lock:
+            on_disk: Dict[str, List[int]] = {}
+            for position, key in enumerate(keys):
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[position] = embedding
+                else:
+                    on_disk.setdefault(key, []).append(position)
+            if not on_disk:
+                return results
+
+            found: Dict[str, List[float]] = {}
+            pending = list(on_disk)
+            for start in range(0, len(pending), SQLITE_BATCH_SIZE):
+                batch = pending[start:start + SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in self._connection.execute(
+                    f"select key, embedding from embeddings where key in ({placeholders})", batch
+                ):
+                    found[key] = array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "update embeddings set last_used = ? where key = ?", [(now, key) for key in found]
+                )
+                self._connection.commit()
+            for key, positions in on_disk.items():
+                embedding = found.get(key)
+                if embedding is None:
+                    self.misses += len(positions)
+                    continue
+                self._remember(key, embedding)
+                self.disk_hits += len(positions)
+                for position in positions:
+                    results[position] = embedding
+            return results
+
+    def get(self, text: str, model: str = DEFAULT_EMBEDDING_MODEL) -> Optional[List[float]]:
+        """Return the cached embedding of text, or None (counted as a miss)."""
+        return self.get_many([text], model=model)[0]
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]], model: str = DEFAULT_EMBEDDING_MODEL) -> None:
+        """Store embeddings for texts in both tiers and evict old entries if needed."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = cache_key(model, text)
+                embedding = list(embedding)
+                self._remember(key, embedding)
+                rows.append((key, model, array("f", embedding).tobytes(), now))
+
+            self._connection.executemany(
+                "insert or replace into embeddings (key, model, embedding, last_used) values (?, ?, ?, ?)",
+                rows,
+            )
+            self._writes_since_eviction += len(rows)
+            if self._writes_since_eviction >= min(EVICTION_INTERVAL, self.disk_entries):
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        # Counting is a full scan, so it only runs every EVICTION_INTERVAL writes
+        self._writes_since_eviction = 0
+        excess = self._connection.execute("select count(*) from embeddings").fetchone()[0] - self.disk_entries
+        if excess > 0:
+            self._connection.execute(
+                "delete from embeddings where key in (select key from embeddings order by last_used, rowid limit ?)",
+                (excess,),
+            )
+
+    def put(self, text: str, embedding: Sequence[float], model: str = DEFAULT_EMBEDDING_MODEL) -> None:
+        """Store a single embedding."""
+        self.put_many([text], [embedding], model=model)
+
+    async def embed_many(self, openai_client, texts: Sequence[str], model: str = DEFAULT_EMBEDDING_MODEL) -> List[List[float]]:
+        """
+        Return embeddings for texts, calling the OpenAI API once for all
+        texts that are not cached yet.
+        """
+        # One thread hop for all lookups, so SQLite never blocks the event loop
+        results = await asyncio.to_thread(self.get_many, texts, model)
+
+        # Embed each distinct missing text once, even if it appears several times
+        missing: Dict[str, List[int]] = {}
+        for position, (text, embedding) in enumerate(zip(texts, results)):
+            if embedding is None:
+                missing.setdefault(normalize_text(text), []).append(position)
+
+        if missing:
+            pending = [texts[positions[0]] for positions in missing.values()]
+            response = await openai_client.embeddings.create(model=model, input=pending)
+            embeddings = [item.embedding for item in response.data]
+            await asyncio.to_thread(self.put_many, pending, embeddings, model)
+            for positions, embedding in zip(missing.values(), embeddings):
+                for position in positions:
+                    results[position] = list(embedding)
+
+        return results
+
+    async def embed(self, openai_client, text: str, model: str = DEFAULT_EMBEDDING_MODEL) -> List[float]:
+        """Return the embedding for a single text, using the cache when possible."""
+        return (await self.embed_many(openai_client, [text], model=model))[0]
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,66 @@
+"""
+A single long-lived asyncio event loop for synchronous front ends.
+
+Flask (and Streamlit) handle requests in ordinary threads. Instead of creating
+a new event loop for every agent run, which throws away the pooled HTTP
+connections of the OpenAI clients each time, all coroutines are submitted to
+one loop running in a background thread. Requests then only wait on a future
+while hundreds of agent runs share the same loop and connection pool.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BackgroundEventLoop:
+    """An asyncio event loop running forever in a daemon thread."""
+
+    def __init__(self, name: str = "agent-event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine: Coroutine[Any, Any, T]) -> "concurrent.futures.Future[T]":
+        """Schedule a coroutine on the loop and return a thread-safe future for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """
+        Run a coroutine on the loop and block the calling thread until it finishes.
+
+        If it does not finish within timeout seconds it is cancelled and
+        concurrent.futures.TimeoutError is raised.
+        """
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        """Stop the loop and wait for its thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+_shared_loop: Optional[BackgroundEventLoop] = None
+_shared_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> BackgroundEventLoop:
+    """Return the process-wide background loop, starting it on first use."""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            _shared_loop = BackgroundEventLoop()
+        return _shared_loop
@@ -0,0 +1,178 @@
+"""
+German text analysis for the knowledge base search.
+
+Turns free text into normalized search terms: unicode/umlaut folding,
+stopword removal, a light CISTEM-style stemmer and dictionary based
+compound splitting ("Faltenbehandlung" -> "falt", "behandlung").
+"""
+
+import functools
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+_WORD_RE = re.compile(r"\w+")
+
+# Common German function words plus a few English ones, since users sometimes ask in English
+STOPWORDS = frozenset("""
+aber alle allem allen aller alles als also am an ander andere anderen anderer anderes auch auf aus
+bei beim bin bis bist da damit dann das dass dem den denn der des dessen die dies diese diesem diesen
+dieser dieses doch dort du durch ein eine einem einen einer eines er es etwa etwas euch euer fur
+gegen gibt hab habe haben hat hatte hier hin ich ihm ihn ihnen ihr ihre ihrem ihren ihrer im in
+ist ja jede jedem jeden jeder jedes kann kannst konnen konnte mal man mehr mein meine meinem meinen
+meiner mich mir mit muss nach nicht noch nun nur ob oder ohne sehr sein seine sich sie sind so
+soll sollte um und uns unser unsere unter viel vom von vor war waren was weil welche welchem welchen
+welcher welches wenn wer werden wie wieviel wird wir wo wurde zu zum zur zwischen uber
+a about an and are as at be by can do does for from how i in is it me my of on or the to what
+when which with you your
+""".split())
+
+MIN_COMPOUND_PART = 4
+
+# Upper bound on cached word analyses, so arbitrary query words cannot grow the cache forever
+MAX_CACHED_WORDS = 50_000
+
+
+def fold(text: str) -> str:
+    """
+    Lower-case text and fold umlauts, ß, accents and sub/superscripts.
+
+    "Männer" and "Manner" fold to "manner"; "CO₂" folds to "co2". Spelled-out
+    "ae"/"oe"/"ue" are left alone: in most words they are not umlauts
+    ("aktuell", "Feuer", "Poesie").
+    """
+    text = unicodedata.normalize("NFKD", text.lower().replace("ß", "ss"))
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def fold_spelled_umlauts(text: str) -> str:
+    """
+    fold() that also reads "ae"/"oe"/"ue" as umlauts ("koerper" -> "korper").
+    Only for lookups in a small closed set of names such as the categories,
+    where it cannot merge unrelated words.
+    """
+    text = fold(text)
+    for spelled, replacement in (("ae", "a"), ("oe", "o"), ("ue", "u")):
+        text = text.replace(spelled, replacement)
+    return text
+
+
+def stem(word: str) -> str:
+    """
+    Light German stemmer based on CISTEM (Weissweiler & Fraser, 2017).
+
+    Strips inflectional endings (-em, -er, -nd, -t, -e, -s, -n) without trying
+    to reduce derivations, which keeps medical terms recognizable. Like the
+    two-letter endings, -t is only stripped from longer words so that short
+    stems such as "haut" survive.
+    """
+    if len(word) <= 3:
+        return word
+
+    word = word.replace("sch", "$").replace("ei", "%").replace("ie", "&")
+    word = re.sub(r"(.)\1", r"\1*", word)
+
+    while len(word) > 3:
+        if len(word) > 5 and word[-2:] in ("em", "er", "nd"):
+            word = word[:-2]
+        elif len(word) > 5 and word[-1] == "t":
+            word = word[:-1]
+        elif word[-1] in "esn":
+            word = word[:-1]
+        else:
+            break
+
+    word = re.sub(r"(.)\*", r"\1\1", word)
+    return word.replace("&", "ie").replace("%", "ei").replace("$", "sch")
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_WORDS)
+def cached_stem(word: str) -> str:
+    """stem() memoized per word; index builds stem the same words over and over."""
+    return stem(word)
+
+
+def split_compound(word: str, vocabulary: Set[str]) -> List[str]:
+    """
+    Split a folded compound word into stems that occur in the vocabulary.
+
+    Tries every split point (allowing the linking elements -s-, -n-, -en-, -es-)
+    and recurses into the tail, e.g. "faltenbehandlung" -> ["falt", "behandlung"].
+    Returns an empty list if the word cannot be fully decomposed.
+    """
+    if len(word) < 2 * MIN_COMPOUND_PART:
+        return []
+
+    for split in range(len(word) - MIN_COMPOUND_PART, MIN_COMPOUND_PART - 1, -1):
+        head, tail = word[:split], word[split:]
+        head_stems = [cached_stem(head)]
+        for link in ("es", "en", "s", "n"):
+            if head.endswith(link) and len(head) - len(link) >= MIN_COMPOUND_PART:
+                head_stems.append(cached_stem(head[:-len(link)]))
+
+        head_stem = next((candidate for candidate in head_stems if candidate in vocabulary), None)
+        if head_stem is None:
+            continue
+
+        tail_stem = cached_stem(tail)
+        if tail_stem in vocabulary:
+            return [head_stem, tail_stem]
+        tail_parts = split_compound(tail, vocabulary)
+        if tail_parts:
+            return [head_stem] + tail_parts
+
+    return []
+
+
+def words(text: Optional[str]) -> List[str]:
+    """Return the folded words of text with stopwords removed."""
+    if not text:
+        return []
+    return [word for word in _WORD_RE.findall(fold(text)) if word not in STOPWORDS]
+
+
+class GermanAnalyzer:
+    """
+    Turns text into search terms.
+
+    Each word contributes its stem; if a vocabulary of known stems is given,
+    compound words additionally contribute the stems of their parts. Results
+    are cached per word since the same words repeat throughout the corpus.
+    """
+
+    def __init__(self, vocabulary: Optional[Set[str]] = None):
+        self.vocabulary = vocabulary or set()
+        self._cache: Dict[str, List[str]] = {}
+
+    def word_terms(self, word: str) -> List[str]:
+        """Return the search terms for a single folded word."""
+        terms = self._cache.get(word)
+        if terms is None:
+            terms = [cached_stem(word)] + split_compound(word, self.vocabulary)
+            if len(self._cache) < MAX_CACHED_WORDS:
+                self._cache[word] = terms
+        return terms
+
+    def analyze(self, text: Optional[str]) -> List[str]:
+        """Return the search terms for text."""
+        return self.analyze_words(words(text))
+
+    def analyze_words(self, folded_words: Iterable[str]) -> List[str]:
+        """Return the search terms for the output of words(), e.g. when it was already computed."""
+        terms = []
+        for word in folded_words:
+            terms.extend(self.word_terms(word))
+        return terms
+
+
+def vocabulary_of_words(word_lists: Iterable[Iterable[str]]) -> Set[str]:
+    """Collect the set of stems of the words() output of several texts, used for compound splitting."""
+    distinct: Set[str] = set()
+    for folded_words in word_lists:
+        distinct.update(folded_words)
+    return {cached_stem(word) for word in distinct if len(word) >= MIN_COMPOUND_PART}
+
+
+def vocabulary_of(texts: Iterable[Optional[str]]) -> Set[str]:
+    """Collect the set of stems occurring in texts, used for compound splitting."""
+    return vocabulary_of_words(words(text) for text in texts)
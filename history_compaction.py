@@ -0,0 +1,266 @@
+"""
+Keep the conversation history sent to the model under a token budget.
+
+Before every agent run the stored history is compacted in stages, stopping as
+soon as it fits the budget:
+
+1. Tool calls and tool returns of older turns are dropped; the user questions
+   and the assistant answers of those turns are kept.
+2. Older turns are rolled into a running summary (one LLM call), which is
+   stored in place of those turns so it is only computed once. The summary
+   is only an optimisation: if the call fails (timeout, 429, 5xx), the
+   oldest of those turns are dropped instead.
+3. Tool returns of the recent turns are truncated, then the oldest recent
+   turns are dropped. The last turn is always kept.
+
+The last `keep_turns` turns stay verbatim through stages 1 and 2.
+"""
+
+import os
+from typing import Awaitable, Callable, List, Optional
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 4000))
+DEFAULT_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", 4))
+SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+
+MAX_TOOL_RETURN_CHARS = 600
+SUMMARY_PREFIX = "Zusammenfassung des bisherigen Gesprächs:\n"
+
+# Rough token overhead of every message in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarizer = Callable[[str, List[ModelMessage]], Awaitable[str]]
+
+_encoding = None
+
+
+def count_text_tokens(text: str) -> int:
+    """
+    Count the tokens of text with tiktoken.
+
+    tiktoken downloads its encoding on first use; if that is not possible
+    (e.g. no network), fall back to a conservative estimate of 3 characters
+    per token.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 3 + 1
+
+
+def part_text(part) -> str:
+    """Return the text a message part contributes to the prompt."""
+    if part.part_kind == "tool-return":
+        return part.model_response_str()
+    if part.part_kind == "retry-prompt":
+        return part.model_response()
+    if part.part_kind == "tool-call":
+        return f"{part.tool_name}({part.args_as_json_str()})"
+    return part.content if isinstance(part.content, str) else str(part.content)
+
+
+def count_tokens(messages: List[ModelMessage]) -> int:
+    """Estimate the prompt tokens of a message history."""
+    return sum(
+        MESSAGE_OVERHEAD_TOKENS + count_text_tokens(part_text(part))
+        for message in messages
+        for part in message.parts
+    )
+
+
+def split_turns(messages: List[ModelMessage]) -> List[List[ModelMessage]]:
+    """Split a history into turns, each starting at a request with a user prompt."""
+    turns: List[List[ModelMessage]] = []
+    for message in messages:
+        starts_turn = isinstance(message, ModelRequest) and any(
+            isinstance(part, UserPromptPart) for part in message.parts
+        )
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def strip_tool_traffic(turn: List[ModelMessage]) -> List[ModelMessage]:
+    """Reduce a turn to the user prompt and the assistant's text answers."""
+    stripped: List[ModelMessage] = []
+    for message in turn:
+        if isinstance(message, ModelRequest):
+            parts = [part for part in message.parts if part.part_kind in ("system-prompt", "user-prompt")]
+            if parts:
+                stripped.append(ModelRequest(parts=parts))
+        else:
+            parts = [part for part in message.parts if isinstance(part, TextPart)]
+            if parts:
+                stripped.append(ModelResponse(parts=parts, timestamp=message.timestamp))
+    return stripped
+
+
+def truncate_tool_returns(turn: List[ModelMessage], max_chars: int = MAX_TOOL_RETURN_CHARS) -> List[ModelMessage]:
+    """Shorten long tool returns of a turn, keeping the tool call structure intact."""
+    truncated: List[ModelMessage] = []
+    for message in turn:
+        if isinstance(message, ModelRequest) and any(isinstance(part, ToolReturnPart) for part in message.parts):
+            parts = []
+            for part in message.parts:
+                if isinstance(part, ToolReturnPart):
+                    content = part.model_response_str()
+                    if len(content) > max_chars:
+                        part = ToolReturnPart(
+                            tool_name=part.tool_name,
+                            content=content[:max_chars] + " […gekürzt]",
+                            tool_call_id=part.tool_call_id,
+                            timestamp=part.timestamp,
+                        )
+                parts.append(part)
+            message = ModelRequest(parts=parts)
+        truncated.append(message)
+    return truncated
+
+
+def _split_system_parts(messages: List[ModelMessage]):
+    """Return (system prompt parts, previous summary, history without them)."""
+    first = messages[0]
+    if not isinstance(first, ModelRequest):
+        return [], "", messages
+
+    system_parts = []
+    summary = ""
+    other_parts = []
+    for part in first.parts:
+        if isinstance(part, SystemPromptPart) and part.content.startswith(SUMMARY_PREFIX):
+            summary = part.content[len(SUMMARY_PREFIX):]
+        elif isinstance(part, SystemPromptPart):
+            system_parts.append(part)
+        else:
+            other_parts.append(part)
+
+    rest = messages[1:]
+    if other_parts:
+        rest = [ModelRequest(parts=other_parts)] + rest
+    return system_parts, summary, rest
+
+
+def _join(system_parts, summary: str, turns: List[List[ModelMessage]]) -> List[ModelMessage]:
+    """Reassemble a history, putting system prompt and summary into the first request."""
+    messages = [message for turn in turns for message in turn]
+    head = list(system_parts)
+    if summary:
+        head.append(SystemPromptPart(content=SUMMARY_PREFIX + summary))
+    if not head:
+        return messages
+    if messages and isinstance(messages[0], ModelRequest):
+        return [ModelRequest(parts=head + list(messages[0].parts))] + messages[1:]
+    return [ModelRequest(parts=head)] + messages
+
+
+async def compact_history(
+    messages: List[ModelMessage],
+    summarize: Optional[Summarizer] = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    keep_turns: int = DEFAULT_KEEP_TURNS,
+) -> List[ModelMessage]:
+    """
+    Return messages compacted to fit token_budget (see the module docstring).
+
+    The system prompt is not counted against the budget since it is sent
+    with every request anyway. Returns the original list unchanged if it
+    already fits.
+    """
+    if not messages:
+        return messages
+
+    system_parts, summary, rest = _split_system_parts(messages)
+    system_tokens = count_tokens([ModelRequest(parts=system_parts)]) if system_parts else 0
+    if count_tokens(messages) - system_tokens <= token_budget:
+        return messages
+
+    def fits(turns, current_summary):
+        return count_tokens(_join([], current_summary, turns)) <= token_budget
+
+    turns = split_turns(rest)
+    split = max(len(turns) - keep_turns, 0)
+    older, recent = turns[:split], turns[split:]
+
+    # Stage 1: drop tool calls and returns of older turns
+    older = [stripped for stripped in (strip_tool_traffic(turn) for turn in older) if stripped]
+    if fits(older + recent, summary):
+        return _join(system_parts, summary, older + recent)
+
+    # Stage 2: roll older turns into the running summary (or drop them without a summarizer)
+    if older:
+        if summarize is not None:
+            try:
+                summary = await summarize(summary, [message for turn in older for message in turn])
+                older = []
+            except Exception as e:
+                print(f"⚠️  Could not summarize the history, dropping older turns instead: {e}")
+                while older and not fits(older + recent, summary):
+                    older = older[1:]
+        else:
+            older = []
+        if fits(older + recent, summary):
+            return _join(system_parts, summary, older + recent)
+
+    # Stage 3: shorten tool returns of recent turns, then drop the oldest of them
+    older = []
+    recent = [truncate_tool_returns(turn) for turn in recent]
+    while len(recent) > 1 and not fits(recent, summary):
+        recent = recent[1:]
+    return _join(system_parts, summary, recent)
+
+
+def format_transcript(messages: List[ModelMessage]) -> str:
+    """Render user questions and assistant answers as a plain transcript."""
+    lines = []
+    for message in messages:
+        for part in message.parts:
+            if part.part_kind == "user-prompt":
+                lines.append(f"Patient: {part.content}")
+            elif part.part_kind == "text":
+                lines.append(f"Assistent: {part.content}")
+    return "\n".join(lines)
+
+
+def openai_summarizer(openai_client, model: str = SUMMARY_MODEL) -> Summarizer:
+    """Create a summarizer that condenses older turns with a small OpenAI model."""
+
+    async def summarize(previous_summary: str, messages: List[ModelMessage]) -> str:
+        transcript = format_transcript(messages)
+        if previous_summary:
+            transcript = f"Bisherige Zusammenfassung:\n{previous_summary}\n\nWeiterer Verlauf:\n{transcript}"
+        response = await openai_client.chat.completions.create(
+            model=model,
+            temperature=0,
+            max_tokens=300,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Fasse das folgende Beratungsgespräch einer ästhetischen Praxis in wenigen Sätzen "
+                        "auf Deutsch zusammen. Behalte Anliegen, genannte Behandlungen, Preise und offene "
+                        "Fragen des Patienten bei. Keine neuen Informationen hinzufügen."
+                    ),
+                },
+                {"role": "user", "content": transcript},
+            ],
+        )
+        return response.choices[0].message.content.strip()
+
+    return summarize
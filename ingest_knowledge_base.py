@@ -0,0 +1,427 @@
+"""
+Offline ingestion of combined_database_newest.json into site_pages.
+
+Every treatment and page is split into chunks along its sections
+(description, mechanism, FAQs, page sections, ...). Long sections are split
+further into overlapping windows. Each chunk is identified by
+(url, chunk_number), the unique key of site_pages, with a synthetic url per
+document ("kb://treatment/<id>", "kb://page/<id>"), and carries
+
+    {"source": "hautlabor_kb", "type": "treatment" | "page", "id": ...,
+     "section": ..., "content_hash": ...}
+
+as metadata, which is what retrieval.py uses to map vector hits back to the
+knowledge base.
+
+Re-indexing is incremental: chunks whose content hash (text + embedding
+model) is unchanged are skipped, only new or changed chunks are embedded,
+in batches with a bounded number of concurrent requests, and written with
+bulk upserts. Chunks of removed documents, or beyond the new chunk count of
+a shortened document, are deleted.
+
+Targets:
+
+    python ingest_knowledge_base.py                  # local vector store (VECTOR_STORE_DIR)
+    python ingest_knowledge_base.py --supabase       # site_pages in Supabase/Postgres
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_cache import DEFAULT_EMBEDDING_MODEL, EmbeddingCache
+from retrieval import KNOWLEDGE_BASE_SOURCE
+from vector_store import DEFAULT_DIRECTORY, LocalVectorStore
+
+# Chunk size and overlap between consecutive windows of a long section, in characters
+MAX_CHUNK_CHARS = 1500
+CHUNK_OVERLAP_CHARS = 200
+
+# Texts per embeddings request and requests in flight at the same time
+EMBEDDING_BATCH_SIZE = 64
+MAX_CONCURRENT_REQUESTS = 4
+
+# Rows per upsert request and per page when reading existing hashes
+UPSERT_BATCH_SIZE = 200
+SELECT_PAGE_SIZE = 1000
+
+URL_PREFIX = "kb://"
+
+# Fields that are part of the title or identify a document rather than describe it
+_SKIPPED_FIELDS = {"id", "category", "treatment_name", "page_title", "tags", "content", "sections"}
+
+_SECTION_TITLES = {
+    "description": "Beschreibung",
+    "mechanism": "Funktionsweise",
+    "details": "Behandlungsdetails",
+    "procedure_steps": "Ablauf",
+    "doctor_citation": "Zitat",
+    "post_treatment_skin": "Nach der Behandlung",
+    "post_treatment_skin_effects": "Nach der Behandlung",
+    "faqs": "Häufige Fragen",
+    "faq": "Häufige Fragen",
+    "page_subtitle": "Einleitung",
+    "introduction": "Einleitung",
+    "doctor_quotes": "Zitate",
+    "team": "Team",
+    "values": "Werte",
+    "history": "Geschichte",
+    "call_to_action": "Beratung",
+}
+
+_FIELD_LABELS = {
+    "duration": "Dauer",
+    "downtime": "Ausfallzeit",
+    "durability": "Haltbarkeit",
+    "aftercare": "Nachsorge",
+    "base_price": "Preis ab (EUR)",
+    "note": "Hinweis",
+}
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+ChunkKey = Tuple[str, int]
+
+
+@dataclass
+class Chunk:
+    """One site_pages row before it is embedded."""
+
+    url: str
+    chunk_number: int
+    title: str
+    summary: str
+    content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> ChunkKey:
+        return (self.url, self.chunk_number)
+
+    @property
+    def content_hash(self) -> str:
+        return self.metadata["content_hash"]
+
+
+@dataclass
+class IngestStats:
+    """What a run did: chunks in the knowledge base, skipped, embedded and deleted."""
+
+    chunks: int = 0
+    unchanged: int = 0
+    embedded: int = 0
+    deleted: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+
+def content_hash(text: str, model: str = DEFAULT_EMBEDDING_MODEL) -> str:
+    """Hash of a chunk text and the model that embeds it; a new model re-embeds everything."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()[:16]
+
+
+def flatten(value: Any) -> str:
+    """Render a nested JSON value (lists of FAQs, team members, ...) as plain text lines."""
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        if "question" in value and "answer" in value:
+            return f"Frage: {value['question']}\nAntwort: {value['answer']}"
+        lines = []
+        for key, item in value.items():
+            text = flatten(item)
+            if text:
+                lines.append(text if isinstance(item, (dict, list)) else f"{_FIELD_LABELS.get(key, key)}: {text}")
+        return "\n".join(lines)
+    if isinstance(value, list):
+        return "\n".join(text for text in (flatten(item) for item in value) if text)
+    return str(value).strip()
+
+
+def split_text(text: str, max_chars: int = MAX_CHUNK_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
+    """
+    Split text into windows of at most max_chars, cut at sentence ends where
+    possible; consecutive windows share about `overlap` characters.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    sentences = [sentence for sentence in _SENTENCE_END_RE.split(text) if sentence]
+    # Sentences longer than a window are cut into pieces first
+    pieces = []
+    for sentence in sentences:
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars - overlap:]
+        pieces.append(sentence)
+
+    windows = []
+    current: List[str] = []
+    for piece in pieces:
+        if current and len(" ".join(current + [piece])) > max_chars:
+            windows.append(" ".join(current))
+            # Carry the trailing sentences of the previous window over as overlap
+            carried: List[str] = []
+            for previous in reversed(current):
+                if len(" ".join([previous] + carried)) > overlap:
+                    break
+                carried.insert(0, previous)
+            current = carried
+            if current and len(" ".join(current + [piece])) > max_chars:
+                current = []
+        current.append(piece)
+    if current:
+        windows.append(" ".join(current))
+    return windows
+
+
+def treatment_sections(treatment: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(section title, text) pairs of a treatment."""
+    tags = ", ".join(treatment.get("tags", []))
+    sections = [("Überblick", f"Kategorie: {treatment.get('category', '')}\nTags: {tags}")]
+    content = treatment.get("content", {})
+    if isinstance(content, dict):
+        for key, value in content.items():
+            text = flatten(value)
+            if text:
+                sections.append((_SECTION_TITLES.get(key, key), text))
+    elif content:
+        sections.append(("Beschreibung", flatten(content)))
+    return sections
+
+
+def page_sections(page: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(section title, text) pairs of a page: its sections plus every other content field."""
+    sections = []
+    for section in page.get("sections", []):
+        if not isinstance(section, dict):
+            continue
+        text = flatten([section.get("content"), section.get("sub_sections")])
+        if text:
+            sections.append((section.get("title") or page.get("page_title", ""), text))
+    for key, value in page.items():
+        if key in _SKIPPED_FIELDS:
+            continue
+        text = flatten(value)
+        if text:
+            sections.append((_SECTION_TITLES.get(key, key), text))
+    return sections
+
+
+def document_chunks(kind: str, document_id: str, title: str, sections: Sequence[Tuple[str, str]],
+                    model: str = DEFAULT_EMBEDDING_MODEL) -> List[Chunk]:
+    """Chunks of one document, numbered in order."""
+    url = f"{URL_PREFIX}{kind}/{document_id}"
+    chunks = []
+    for section_title, text in sections:
+        for window in split_text(text):
+            # The document and section title give every chunk context of its own
+            content = f"{title} – {section_title}\n{window}"
+            chunks.append(Chunk(
+                url=url,
+                chunk_number=len(chunks),
+                title=title,
+                summary=f"{title} – {section_title}",
+                content=content,
+                metadata={
+                    "source": KNOWLEDGE_BASE_SOURCE,
+                    "type": kind,
+                    "id": document_id,
+                    "section": section_title,
+                    "content_hash": content_hash(content, model),
+                },
+            ))
+    return chunks
+
+
+def knowledge_base_chunks(knowledge_base: Dict[str, Any], model: str = DEFAULT_EMBEDDING_MODEL) -> List[Chunk]:
+    """All chunks of the treatments and pages of a knowledge base."""
+    chunks = []
+    for treatment in knowledge_base.get("treatments", []):
+        if treatment.get("id"):
+            chunks.extend(document_chunks("treatment", treatment["id"], treatment.get("treatment_name", ""),
+                                          treatment_sections(treatment), model))
+    for page in knowledge_base.get("pages", []):
+        if page.get("id"):
+            chunks.extend(document_chunks("page", page["id"], page.get("page_title", ""), page_sections(page), model))
+    return chunks
+
+
+class LocalVectorStoreSink:
+    """
+    Writes chunks into the local vector store directory (vector_store.py).
+
+    Rows that did not come from the knowledge base are kept as they are.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv("VECTOR_STORE_DIR", DEFAULT_DIRECTORY)
+        self._rows: Dict[ChunkKey, Tuple[Dict[str, Any], np.ndarray]] = {}
+        try:
+            store = LocalVectorStore.load(self.directory)
+        except FileNotFoundError:
+            return
+        for row, embedding in zip(store.rows, np.asarray(store.embeddings)):
+            self._rows[(row["url"], row["chunk_number"])] = (row, embedding)
+
+    def existing_hashes(self) -> Dict[ChunkKey, str]:
+        return {
+            key: (row.get("metadata") or {}).get("content_hash", "")
+            for key, (row, _) in self._rows.items()
+            if (row.get("metadata") or {}).get("source") == KNOWLEDGE_BASE_SOURCE
+        }
+
+    def upsert(self, rows: Sequence[Dict[str, Any]]) -> None:
+        for row in rows:
+            embedding = np.asarray(row["embedding"], dtype=np.float32)
+            self._rows[(row["url"], row["chunk_number"])] = ({k: v for k, v in row.items() if k != "embedding"}, embedding)
+
+    def delete(self, url: str, from_chunk_number: int = 0) -> None:
+        for key in [key for key in self._rows if key[0] == url and key[1] >= from_chunk_number]:
+            del self._rows[key]
+
+    def flush(self) -> None:
+        """Write the store so the app can memory-map it."""
+        rows = []
+        for row_id, (row, embedding) in enumerate(self._rows.values(), 1):
+            rows.append({**row, "id": row_id, "embedding": embedding.tolist()})
+        LocalVectorStore.from_rows(rows).save(self.directory)
+
+
+class SupabaseSink:
+    """Writes chunks into the site_pages table of a Supabase (Postgres) project."""
+
+    def __init__(self, client, table: str = "site_pages", batch_size: int = UPSERT_BATCH_SIZE):
+        self.client = client
+        self.table = table
+        self.batch_size = batch_size
+
+    def existing_hashes(self) -> Dict[ChunkKey, str]:
+        hashes = {}
+        start = 0
+        while True:
+            rows = (self.client.table(self.table)
+                    .select("url,chunk_number,metadata")
+                    .contains("metadata", {"source": KNOWLEDGE_BASE_SOURCE})
+                    .order("id")
+                    .range(start, start + SELECT_PAGE_SIZE - 1)
+                    .execute().data)
+            for row in rows:
+                hashes[(row["url"], row["chunk_number"])] = (row.get("metadata") or {}).get("content_hash", "")
+            if len(rows) < SELECT_PAGE_SIZE:
+                return hashes
+            start += SELECT_PAGE_SIZE
+
+    def upsert(self, rows: Sequence[Dict[str, Any]]) -> None:
+        for start in range(0, len(rows), self.batch_size):
+            batch = list(rows[start:start + self.batch_size])
+            self.client.table(self.table).upsert(batch, on_conflict="url,chunk_number").execute()
+
+    def delete(self, url: str, from_chunk_number: int = 0) -> None:
+        self.client.table(self.table).delete().eq("url", url).gte("chunk_number", from_chunk_number).execute()
+
+    def flush(self) -> None:
+        pass
+
+
+async def embed_chunks(chunks: Sequence[Chunk], openai_client, embedding_cache: Optional[EmbeddingCache] = None,
+                       model: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE,
+                       max_concurrency: int = MAX_CONCURRENT_REQUESTS) -> List[List[float]]:
+    """
+    Embed chunk contents in batches of batch_size, with at most
+    max_concurrency batches in flight. With an embedding cache, texts
+    embedded before (e.g. by an earlier run) are not sent again.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def embed_batch(texts: List[str]) -> List[List[float]]:
+        async with semaphore:
+            if embedding_cache is not None:
+                return await embedding_cache.embed_many(openai_client, texts, model=model)
+            response = await openai_client.embeddings.create(model=model, input=texts)
+            return [item.embedding for item in response.data]
+
+    texts = [chunk.content for chunk in chunks]
+    batches = await asyncio.gather(*(embed_batch(texts[start:start + batch_size])
+                                     for start in range(0, len(texts), batch_size)))
+    return [embedding for batch in batches for embedding in batch]
+
+
+async def ingest(knowledge_base: Dict[str, Any], sink, openai_client, embedding_cache: Optional[EmbeddingCache] = None,
+                 model: str = DEFAULT_EMBEDDING_MODEL, force: bool = False) -> IngestStats:
+    """Bring the sink up to date with the knowledge base, embedding only new or changed chunks."""
+    started = time.perf_counter()
+    chunks = knowledge_base_chunks(knowledge_base, model)
+    existing = await asyncio.to_thread(sink.existing_hashes)
+
+    changed = [chunk for chunk in chunks if force or existing.get(chunk.key) != chunk.content_hash]
+    stats = IngestStats(chunks=len(chunks), unchanged=len(chunks) - len(changed))
+
+    if changed:
+        embeddings = await embed_chunks(changed, openai_client, embedding_cache, model)
+        stats.batches = -(-len(changed) // EMBEDDING_BATCH_SIZE)
+        rows = [
+            {"url": chunk.url, "chunk_number": chunk.chunk_number, "title": chunk.title, "summary": chunk.summary,
+             "content": chunk.content, "metadata": chunk.metadata, "embedding": list(embedding)}
+            for chunk, embedding in zip(changed, embeddings)
+        ]
+        await asyncio.to_thread(sink.upsert, rows)
+        stats.embedded = len(rows)
+
+    # Drop chunks of removed documents and the tail of documents that got shorter
+    chunk_counts: Dict[str, int] = {}
+    for chunk in chunks:
+        chunk_counts[chunk.url] = chunk.chunk_number + 1
+    stale: Dict[str, int] = {}
+    for url, chunk_number in existing:
+        if chunk_number >= chunk_counts.get(url, 0):
+            stale[url] = min(stale.get(url, chunk_number), chunk_number)
+            stats.deleted += 1
+    for url, from_chunk_number in stale.items():
+        await asyncio.to_thread(sink.delete, url, from_chunk_number)
+
+    await asyncio.to_thread(sink.flush)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def main(argv: Iterable[str]) -> None:
+    """Ingest a knowledge base file into the local vector store or Supabase."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", nargs="?", default="combined_database_newest.json")
+    parser.add_argument("--supabase", action="store_true", help="write to site_pages in Supabase instead of the local store")
+    parser.add_argument("--directory", help="local vector store directory (default: VECTOR_STORE_DIR or site_pages_index)")
+    parser.add_argument("--force", action="store_true", help="re-embed all chunks")
+    args = parser.parse_args(list(argv))
+
+    from dotenv import load_dotenv
+    from openai import AsyncOpenAI
+
+    load_dotenv()
+    with open(args.path, "r", encoding="utf-8") as f:
+        knowledge_base = json.load(f)
+
+    if args.supabase:
+        from supabase import create_client
+        sink = SupabaseSink(create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY")))
+    else:
+        sink = LocalVectorStoreSink(args.directory)
+
+    stats = asyncio.run(ingest(knowledge_base, sink, AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")),
+                               EmbeddingCache(), force=args.force))
+    print(f"✅ {stats.chunks} chunks: {stats.embedded} embedded ({stats.batches} batches), "
+          f"{stats.unchanged} unchanged, {stats.deleted} deleted in {stats.seconds:.1f} s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,117 @@
+"""
+Facet indexes over the treatments: category, tag and price.
+
+Built once per knowledge base so that combined queries such as "Gesicht +
+Narben under 500 EUR" are answered with set intersections instead of the
+model pulling whole categories and filtering them itself.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from german_text import fold, fold_spelled_umlauts, words
+from treatment_lookup import compact
+
+# Facet terms shorter than this only match tags exactly, not as part of longer tags
+MIN_PARTIAL_TAG_LENGTH = 4
+
+# German amounts with thousands separators ("1.500,00") before plain numbers ("250", "99,90")
+_PRICE_RE = re.compile(r"(?P<grouped>\d{1,3}(?:\.\d{3})+(?:,\d+)?)(?!\d)|\d+(?:[.,]\d+)?")
+
+
+def base_price(treatment: Dict[str, Any]) -> Optional[float]:
+    """Return the starting price of a treatment, from a cost object or free text like "ab 250€"."""
+    content = treatment.get("content", {})
+    details = content.get("details", {}) if isinstance(content, dict) else {}
+    cost = details.get("cost") if isinstance(details, dict) else None
+    if isinstance(cost, dict):
+        price = cost.get("base_price")
+        return float(price) if isinstance(price, (int, float)) else None
+    if isinstance(cost, str):
+        match = _PRICE_RE.search(cost)
+        if match:
+            amount = match.group()
+            if match.group("grouped"):
+                amount = amount.replace(".", "")
+            return float(amount.replace(",", "."))
+    return None
+
+
+class FacetIndex:
+    """Treatment ids (positions) by folded category, by tag term and sorted by base price."""
+
+    def __init__(self, treatments: List[Dict[str, Any]]):
+        self.treatments = treatments
+        self.categories: Dict[str, Set[int]] = defaultdict(set)
+        self.tags: Dict[str, Set[int]] = defaultdict(set)
+        self.prices: Dict[int, float] = {}
+
+        for index, treatment in enumerate(treatments):
+            self.categories[fold(treatment.get("category", ""))].add(index)
+            # Tags and the words of the name are both searchable facet terms
+            for tag in treatment.get("tags", []):
+                self.tags[compact(tag)].add(index)
+            for word in words(treatment.get("treatment_name", "")):
+                self.tags[word].add(index)
+
+            price = base_price(treatment)
+            if price is not None:
+                self.prices[index] = price
+
+        self.tags.pop("", None)
+        self._price_order: List[Tuple[float, int]] = sorted((price, index) for index, price in self.prices.items())
+        self._price_values = [price for price, _ in self._price_order]
+
+    def category_ids(self, category: str) -> Set[int]:
+        """Treatments of a category; "koerper", "Körper" and "körper" are the same category."""
+        category = category.strip()
+        ids = self.categories.get(fold(category)) or self.categories.get(fold_spelled_umlauts(category), ())
+        return set(ids)
+
+    def tag_ids(self, tag: str) -> Set[int]:
+        """Treatments with a tag (or name word) equal to, or containing, tag."""
+        term = compact(tag)
+        if not term:
+            return set()
+        ids = set(self.tags.get(term, ()))
+        if len(term) >= MIN_PARTIAL_TAG_LENGTH:
+            for key, key_ids in self.tags.items():
+                if term in key:
+                    ids |= key_ids
+        return ids
+
+    def price_ids(self, min_price: Optional[float] = None, max_price: Optional[float] = None) -> Set[int]:
+        """Treatments whose base price lies within [min_price, max_price]."""
+        start = bisect_left(self._price_values, min_price) if min_price is not None else 0
+        end = bisect_right(self._price_values, max_price) if max_price is not None else len(self._price_values)
+        return {index for _, index in self._price_order[start:end]}
+
+    def query(
+        self,
+        category: str = "",
+        tags: Iterable[str] = (),
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+    ) -> List[int]:
+        """
+        Treatments matching all given facets, in knowledge base order. Tags are
+        combined with AND; treatments without a price never match a price filter.
+        """
+        ids: Optional[Set[int]] = None
+        facet_sets = []
+        if category:
+            facet_sets.append(self.category_ids(category))
+        facet_sets.extend(self.tag_ids(tag) for tag in tags if tag.strip())
+        if min_price is not None or max_price is not None:
+            facet_sets.append(self.price_ids(min_price, max_price))
+
+        # Intersect the smallest sets first
+        for facet_ids in sorted(facet_sets, key=len):
+            ids = facet_ids if ids is None else ids & facet_ids
+            if not ids:
+                return []
+        if ids is None:
+            ids = set(range(len(self.treatments)))
+        return sorted(ids)
@@ -0,0 +1,243 @@
+"""
+Search indexes over the JSON knowledge base (combined_database_newest.json).
+
+The indexes are built once when the knowledge base is loaded so that the
+agent tools only touch the postings of the query terms instead of scanning
+every treatment and page on each call.
+"""
+
+import math
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from german_text import GermanAnalyzer, vocabulary_of_words, words
+from knowledge_facets import FacetIndex
+from knowledge_render import RenderedKnowledgeBase
+from treatment_lookup import TreatmentResolver
+
+# Field weights applied to term frequencies when scoring matches
+TREATMENT_FIELD_WEIGHTS = {
+    "treatment_name": 10,
+    "category": 5,
+    "tag": 3,
+    "description": 2,
+    "mechanism": 2,
+    "faq": 1,
+}
+
+PAGE_FIELD_WEIGHTS = {
+    "page_title": 10,
+    "page_subtitle": 5,
+    "section_title": 3,
+    "section_content": 2,
+}
+
+# Unknown query terms shorter than this are not expanded to indexed terms containing them
+MIN_EXPANSION_LENGTH = 3
+
+
+def treatment_fields(treatment: Dict[str, Any]) -> Iterable[Tuple[int, str]]:
+    """Yield (weight, text) pairs for every searchable field of a treatment."""
+    yield TREATMENT_FIELD_WEIGHTS["treatment_name"], treatment.get("treatment_name", "")
+    yield TREATMENT_FIELD_WEIGHTS["category"], treatment.get("category", "")
+
+    for tag in treatment.get("tags", []):
+        yield TREATMENT_FIELD_WEIGHTS["tag"], tag
+
+    content = treatment.get("content", {})
+    if isinstance(content, dict):
+        yield TREATMENT_FIELD_WEIGHTS["description"], content.get("description", "")
+        yield TREATMENT_FIELD_WEIGHTS["mechanism"], content.get("mechanism", "")
+
+        faqs = content.get("faq", []) or content.get("faqs", [])
+        for faq in faqs:
+            if isinstance(faq, dict):
+                text = f"{faq.get('question', '')}\n{faq.get('answer', '')}"
+                yield TREATMENT_FIELD_WEIGHTS["faq"], text
+
+
+def page_fields(page: Dict[str, Any]) -> Iterable[Tuple[int, str]]:
+    """Yield (weight, text) pairs for every searchable field of a page."""
+    yield PAGE_FIELD_WEIGHTS["page_title"], page.get("page_title", "")
+    yield PAGE_FIELD_WEIGHTS["page_subtitle"], page.get("page_subtitle", "")
+
+    for section in page.get("sections", []):
+        if isinstance(section, dict):
+            yield PAGE_FIELD_WEIGHTS["section_title"], section.get("title", "")
+            yield PAGE_FIELD_WEIGHTS["section_content"], section.get("content") or ""
+
+
+class InvertedIndex:
+    """
+    BM25 ranked inverted index over a list of documents.
+
+    Text is analyzed with german_text (umlaut folding, stopwords, stemming and
+    compound splitting against the corpus vocabulary). Term frequencies are
+    weighted by the field a term occurs in (name, category, tag, ...), so a hit
+    in the treatment name counts more than one in an FAQ (a simplified BM25F).
+    Query terms that are not indexed fall back to indexed terms containing
+    them, looked up in a sorted suffix table of the vocabulary.
+    """
+
+    def __init__(
+        self,
+        documents: List[Dict[str, Any]],
+        fields: Callable[[Dict[str, Any]], Iterable[Tuple[int, str]]],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+
+        # Every text is folded and split into words once, for the vocabulary and the postings
+        document_words = [[(weight, words(text)) for weight, text in fields(document)] for document in documents]
+        self.analyzer = GermanAnalyzer(vocabulary_of_words(folded for doc in document_words for _, folded in doc))
+
+        postings: Dict[str, Dict[int, float]] = defaultdict(lambda: defaultdict(float))
+        self._lengths: List[float] = []
+        for doc_id, doc in enumerate(document_words):
+            length = 0.0
+            for weight, folded in doc:
+                for term in self.analyzer.analyze_words(folded):
+                    postings[term][doc_id] += weight
+                    length += weight
+            self._lengths.append(length)
+
+        self._postings = {term: dict(docs) for term, docs in postings.items()}
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        self._idf = {term: self._compute_idf(len(docs)) for term, docs in self._postings.items()}
+        self._suffixes = sorted(
+            (term[start:], term) for term in self._postings for start in range(len(term))
+        )
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _compute_idf(self, document_frequency: int) -> float:
+        return math.log(1 + (len(self.documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def _expand(self, term: str) -> List[str]:
+        """Return the indexed terms containing term (used for unknown query terms)."""
+        if len(term) < MIN_EXPANSION_LENGTH:
+            return []
+        expanded = []
+        position = bisect_left(self._suffixes, (term, ""))
+        while position < len(self._suffixes):
+            suffix, indexed_term = self._suffixes[position]
+            if not suffix.startswith(term):
+                break
+            expanded.append(indexed_term)
+            position += 1
+        return expanded
+
+    def _postings_for(self, term: str) -> Tuple[Dict[int, float], float]:
+        """Return the (document -> weighted frequency) postings and idf for a query term."""
+        if term in self._postings:
+            return self._postings[term], self._idf[term]
+
+        merged: Dict[int, float] = defaultdict(float)
+        for indexed_term in set(self._expand(term)):
+            for doc_id, frequency in self._postings[indexed_term].items():
+                merged[doc_id] += frequency
+        return merged, self._compute_idf(len(merged))
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """Return a mapping of document id -> BM25 score for a query."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(self.analyzer.analyze(query)):
+            postings, idf = self._postings_for(term)
+            for doc_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / self._average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def search_ids(self, query: str, max_results: int = 5) -> List[int]:
+        """Return the ids (positions) of the best matching documents, highest score first."""
+        ranked = sorted(self.scores(query).items(), key=lambda item: (-item[1], item[0]))
+        return [doc_id for doc_id, score in ranked[:max_results]]
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """Return the best matching documents, highest score first."""
+        return [self.documents[doc_id] for doc_id in self.search_ids(query, max_results=max_results)]
+
+
+def document_keys(knowledge_base: Dict[str, Any]) -> Dict[Tuple[str, str], Tuple[str, int]]:
+    """Map ("treatment" | "page", id) to (type, position) for all entries with an id."""
+    keys = {}
+    for kind, collection in (("treatment", "treatments"), ("page", "pages")):
+        for position, entry in enumerate(knowledge_base.get(collection, [])):
+            if entry.get("id"):
+                keys[(kind, entry["id"])] = (kind, position)
+    return keys
+
+
+class KnowledgeBase(dict):
+    """
+    The parsed knowledge base together with the search indexes, the
+    pre-rendered tool outputs, the treatment name resolver and the facet
+    indexes built from it.
+
+    Behaves exactly like the plain dict returned by json.load, so existing code
+    using knowledge_base.get("treatments") keeps working. `version` identifies
+    the file content it was built from (see knowledge_manager.py).
+    """
+
+    def __init__(self, data: Dict[str, Any], version: str = ""):
+        super().__init__(data)
+        self.version = version
+        self.treatment_index = InvertedIndex(self.get("treatments", []), treatment_fields)
+        self.page_index = InvertedIndex(self.get("pages", []), page_fields)
+        self.rendered = RenderedKnowledgeBase(self)
+        self.treatment_resolver = TreatmentResolver(self.get("treatments", []))
+        self.facets = FacetIndex(self.get("treatments", []))
+        self.document_keys = document_keys(self)
+
+
+def get_treatment_index(knowledge_base: Dict[str, Any]) -> InvertedIndex:
+    """Return the prebuilt treatment index, building one for plain dicts."""
+    index = getattr(knowledge_base, "treatment_index", None)
+    if index is None:
+        index = InvertedIndex(knowledge_base.get("treatments", []), treatment_fields)
+    return index
+
+
+def get_page_index(knowledge_base: Dict[str, Any]) -> InvertedIndex:
+    """Return the prebuilt page index, building one for plain dicts."""
+    index = getattr(knowledge_base, "page_index", None)
+    if index is None:
+        index = InvertedIndex(knowledge_base.get("pages", []), page_fields)
+    return index
+
+
+def get_rendered(knowledge_base: Dict[str, Any]) -> RenderedKnowledgeBase:
+    """Return the pre-rendered tool outputs, rendering them for plain dicts."""
+    rendered = getattr(knowledge_base, "rendered", None)
+    if rendered is None:
+        rendered = RenderedKnowledgeBase(knowledge_base)
+    return rendered
+
+
+def get_treatment_resolver(knowledge_base: Dict[str, Any]) -> TreatmentResolver:
+    """Return the prebuilt treatment name resolver, building one for plain dicts."""
+    resolver = getattr(knowledge_base, "treatment_resolver", None)
+    if resolver is None:
+        resolver = TreatmentResolver(knowledge_base.get("treatments", []))
+    return resolver
+
+
+def get_facets(knowledge_base: Dict[str, Any]) -> FacetIndex:
+    """Return the prebuilt facet indexes, building them for plain dicts."""
+    facets = getattr(knowledge_base, "facets", None)
+    if facets is None:
+        facets = FacetIndex(knowledge_base.get("treatments", []))
+    return facets
+
+
+def get_document_keys(knowledge_base: Dict[str, Any]) -> Dict[Tuple[str, str], Tuple[str, int]]:
+    """Return the prebuilt id -> document key map, building it for plain dicts."""
+    keys = getattr(knowledge_base, "document_keys", None)
+    if keys is None:
+        keys = document_keys(knowledge_base)
+    return keys
@@ -0,0 +1,171 @@
+"""
+Hot reloading of the knowledge base without restarting the server.
+
+KnowledgeBaseManager holds the current KnowledgeBase snapshot. A background
+thread polls combined_database_newest.json (or reload() is called by an
+admin endpoint); a changed file is parsed and indexed in that thread, off
+the request path, and then swapped in with a single reference assignment.
+
+Requests take `manager.current` once and pass that snapshot to
+ClinicAIDeps, so an agent run keeps using one consistent version even if a
+reload happens while it is running. Snapshots are never modified after
+they are built.
+
+The local site_pages vector store (vector_store.py) is watched the same
+way: when the ingestion CLI replaces its files, the new store is loaded and
+swapped in as `manager.vector_store`. Runs that took the old store keep
+it, and with it the mapping of the old (already replaced) embedding file,
+until they finish and drop the last reference.
+"""
+
+import json
+import os
+import threading
+from typing import Optional
+
+from knowledge_index import KnowledgeBase
+from knowledge_snapshot import read_knowledge_base
+from vector_store import ROWS_FILE, LocalVectorStore, load_vector_store
+
+DEFAULT_POLL_SECONDS = float(os.getenv("KNOWLEDGE_BASE_POLL_SECONDS", 5))
+
+EMPTY_VERSION = "empty"
+
+
+def load_knowledge_base_file(path: str) -> KnowledgeBase:
+    """Like read_knowledge_base, but return an empty knowledge base if the file is missing or invalid."""
+    try:
+        return read_knowledge_base(path)
+    except FileNotFoundError:
+        print(f"⚠️  {path} not found")
+    except json.JSONDecodeError as e:
+        print(f"⚠️  Error parsing JSON: {e}")
+    except ValueError as e:
+        print(f"⚠️  Invalid knowledge base: {e}")
+    return KnowledgeBase({"treatments": [], "pages": []}, version=EMPTY_VERSION)
+
+
+class KnowledgeBaseManager:
+    """Owns the current knowledge base snapshot and replaces it when the file changes."""
+
+    def __init__(self, path: str, poll_seconds: float = DEFAULT_POLL_SECONDS, vector_store_dir: Optional[str] = None):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.vector_store_dir = vector_store_dir
+        self.reloads = 0
+        self.vector_store_reloads = 0
+
+        self._reload_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stat = self._file_stat()
+        self._current = load_knowledge_base_file(path)
+        self._vector_stat = self._vector_store_stat()
+        self._vector_store = load_vector_store(vector_store_dir) if vector_store_dir else None
+
+    @property
+    def current(self) -> KnowledgeBase:
+        """The current snapshot. Take it once per request and use it for the whole run."""
+        return self._current
+
+    @property
+    def version(self) -> str:
+        return self._current.version
+
+    @property
+    def vector_store(self) -> Optional[LocalVectorStore]:
+        """The current vector store (None if not configured or not built yet). Take it once per request."""
+        return self._vector_store
+
+    @staticmethod
+    def _stat_of(path: str):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return None
+
+    def _file_stat(self):
+        return self._stat_of(self.path)
+
+    def _vector_store_stat(self):
+        # save() replaces rows.json last, so its change marks a complete new store
+        return self._stat_of(os.path.join(self.vector_store_dir, ROWS_FILE)) if self.vector_store_dir else None
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Re-read the knowledge base file and the vector store and swap in
+        whatever changed. Returns True if anything new was installed.
+        """
+        reloaded = self.reload_knowledge_base(force)
+        return self.reload_vector_store(force) or reloaded
+
+    def reload_vector_store(self, force: bool = False) -> bool:
+        """
+        Load the vector store again if its files were replaced. If it is
+        missing or cannot be read, the current store is kept.
+        """
+        if not self.vector_store_dir:
+            return False
+        with self._reload_lock:
+            stat = self._vector_store_stat()
+            if stat is None or (not force and stat == self._vector_stat):
+                return False
+            self._vector_stat = stat
+            try:
+                store = LocalVectorStore.load(self.vector_store_dir)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Could not reload vector store, keeping the current one: {e}")
+                return False
+            self._vector_store = store
+            self.vector_store_reloads += 1
+            print(f"🔄 Vector store reloaded: {len(store)} chunks")
+            return True
+
+    def reload_knowledge_base(self, force: bool = False) -> bool:
+        """
+        Re-read the file and swap in a new snapshot if its content changed.
+
+        Returns True if a new version was installed. If the file is missing
+        or invalid, the current snapshot is kept.
+        """
+        with self._reload_lock:
+            stat = self._file_stat()
+            if not force and stat == self._stat:
+                return False
+            self._stat = stat
+
+            try:
+                snapshot = read_knowledge_base(self.path)
+            except (OSError, ValueError, TypeError) as e:
+                print(f"⚠️  Could not reload knowledge base, keeping version {self.version}: {e}")
+                return False
+
+            if snapshot.version == self.version:
+                return False
+
+            previous = self.version
+            self._current = snapshot
+            self.reloads += 1
+            print(f"🔄 Knowledge base reloaded: {previous} -> {snapshot.version} ({len(snapshot.get('treatments', []))} treatments)")
+            return True
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.poll_seconds):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"⚠️  Error while reloading knowledge base: {e}")
+
+    def start(self) -> "KnowledgeBaseManager":
+        """Start polling the file in a daemon thread."""
+        if self._thread is None and self.poll_seconds > 0:
+            self._thread = threading.Thread(target=self._watch, name="knowledge-base-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
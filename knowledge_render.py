@@ -0,0 +1,162 @@
+"""
+Markdown blocks returned by the agent tools, rendered once per knowledge base.
+
+The knowledge base does not change while it is loaded, so the treatment
+summaries (search_knowledge_base), the treatment detail pages
+(get_treatment_details) and the category listings
+(list_treatments_by_category) are rendered when it is loaded. A tool call is
+then only an index lookup plus a join. A reloaded knowledge base is a new
+KnowledgeBase object and renders its own blocks.
+"""
+
+from typing import Any, Dict, List
+
+DEFAULT_DOCTOR_NAME = "Dr. med. Lara Pfahl"
+
+# Number of page sections and FAQs included in the rendered blocks
+MAX_PAGE_SECTIONS = 2
+MAX_FAQS = 3
+
+
+def _details_lines(details: Dict[str, Any], bold: bool) -> List[str]:
+    label = "**{}:**" if bold else "{}:"
+    lines = [
+        f"- {label.format('Dauer')} {details.get('duration', 'Nicht spezifiziert')}",
+        f"- {label.format('Ausfallzeit')} {details.get('downtime', 'Nicht spezifiziert')}",
+        f"- {label.format('Haltbarkeit')} {details.get('durability', 'Nicht spezifiziert')}",
+    ]
+    cost = details.get("cost", {})
+    if isinstance(cost, str) and cost:
+        # Some treatments give the price as free text, e.g. "ab 250€"
+        lines.append(f"- {label.format('Kosten')} {cost}")
+    elif cost and cost.get("base_price"):
+        lines.append(f"- {label.format('Kosten')} ab {cost.get('base_price')} {cost.get('currency', 'EUR')}")
+    return lines
+
+
+def render_treatment_summary(treatment: Dict[str, Any]) -> str:
+    """Render the block search_knowledge_base returns for a matching treatment."""
+    content = treatment.get("content", {})
+    parts = [f"""
+## {treatment.get("treatment_name", "Behandlung")}
+**Kategorie:** {treatment.get("category", "Nicht spezifiziert")}
+**Tags:** {", ".join(treatment.get("tags", []))}
+
+**Beschreibung:**
+{content.get("description", "Keine Beschreibung verfügbar.")}
+
+**Funktionsweise:**
+{content.get("mechanism", "Keine Informationen zur Funktionsweise verfügbar.")}
+"""]
+
+    details = content.get("details", {})
+    if details:
+        parts.append("\n**Behandlungsdetails:**\n" + "".join(line + "\n" for line in _details_lines(details, bold=False)))
+
+    doctor_citation = content.get("doctor_citation")
+    quote = ""
+    doctor_name = DEFAULT_DOCTOR_NAME
+    if isinstance(doctor_citation, dict):
+        quote = doctor_citation.get("quote", "")
+        doctor_name = doctor_citation.get("doctor_name", DEFAULT_DOCTOR_NAME)
+    elif isinstance(doctor_citation, str):
+        quote = doctor_citation
+    if quote:
+        parts.append(f'\n> "{quote}" - {doctor_name}\n')
+
+    return "".join(parts)
+
+
+def render_page_summary(page: Dict[str, Any]) -> str:
+    """Render the block search_knowledge_base returns for a matching page."""
+    parts = [f"""
+## {page.get("page_title", "Seite")}
+{page.get("page_subtitle", "")}
+
+"""]
+    for section in page.get("sections", [])[:MAX_PAGE_SECTIONS]:
+        if isinstance(section, dict):
+            parts.append(f"**{section.get('title', '')}**\n")
+            if section.get("content"):
+                parts.append(f"{section.get('content')}\n\n")
+    return "".join(parts)
+
+
+def render_treatment_details(treatment: Dict[str, Any]) -> str:
+    """Render the full page get_treatment_details returns for a treatment."""
+    content = treatment.get("content", {})
+    parts = [f"""
+# {treatment.get("treatment_name")}
+
+**Kategorie:** {treatment.get("category")}
+**Behandlungsarten:** {", ".join(treatment.get("tags", []))}
+
+## Beschreibung
+{content.get("description", "Keine Beschreibung verfügbar.")}
+
+## Funktionsweise
+{content.get("mechanism", "Keine Informationen zur Funktionsweise verfügbar.")}
+"""]
+
+    details = content.get("details", {})
+    if details:
+        parts.append("\n## Behandlungsdetails\n" + "".join(line + "\n" for line in _details_lines(details, bold=True)))
+
+    procedure_steps = content.get("procedure_steps", [])
+    if procedure_steps:
+        parts.append("\n## Behandlungsablauf\n")
+        if isinstance(procedure_steps, list):
+            parts.extend(f"{i}. {step}\n" for i, step in enumerate(procedure_steps, 1))
+        else:
+            parts.append(procedure_steps)
+
+    faqs = content.get("faq", []) or content.get("faqs", [])
+    if faqs:
+        parts.append("\n## Häufig gestellte Fragen\n")
+        for faq in faqs[:MAX_FAQS]:
+            if isinstance(faq, dict):
+                parts.append(f"**{faq.get('question', '')}**\n{faq.get('answer', '')}\n\n")
+
+    return "".join(parts)
+
+
+def render_category_groups(treatments: List[Dict[str, Any]]) -> str:
+    """Render treatments grouped by category, as listed by list_treatments_by_category."""
+    categories: Dict[str, List[Dict[str, Any]]] = {}
+    for treatment in treatments:
+        categories.setdefault(treatment.get("category", "Sonstige"), []).append(treatment)
+
+    parts = []
+    for category, category_treatments in categories.items():
+        parts.append(f"### {category}\n")
+        for treatment in category_treatments:
+            name = treatment.get("treatment_name", "Unbekannte Behandlung")
+            tags = ", ".join(treatment.get("tags", []))
+            parts.append(f"- **{name}** ({tags})\n" if tags else f"- **{name}**\n")
+        parts.append("\n")
+    return "".join(parts)
+
+
+class RenderedKnowledgeBase:
+    """Pre-rendered tool output blocks of one knowledge base, keyed by document position."""
+
+    def __init__(self, knowledge_base: Dict[str, Any]):
+        treatments = knowledge_base.get("treatments", [])
+        self.treatment_summaries = [render_treatment_summary(treatment) for treatment in treatments]
+        self.treatment_details = [render_treatment_details(treatment) for treatment in treatments]
+        self.page_summaries = [render_page_summary(page) for page in knowledge_base.get("pages", [])]
+
+        # Category listings keyed by lower-cased category; "" lists all treatments
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for treatment in treatments:
+            by_category.setdefault(treatment.get("category", "").lower(), []).append(treatment)
+        self.category_listings = {category: render_category_groups(group) for category, group in by_category.items()}
+        if treatments:
+            self.category_listings[""] = render_category_groups(treatments)
+
+    def category_listing(self, category: str = "") -> str:
+        """Return the list_treatments_by_category output for a category (any case)."""
+        body = self.category_listings.get(category.lower())
+        if body is None:
+            return f"Keine Behandlungen gefunden{f' in der Kategorie {category}' if category else ''}."
+        return f"## Behandlungen{f' - {category}' if category else ''}\n\n" + body
@@ -0,0 +1,202 @@
+"""
+Prebuilt binary snapshot of the indexed knowledge base for fast startup.
+
+Building a KnowledgeBase means parsing the JSON file, analyzing every text
+field for the search indexes and rendering the tool outputs. Every gunicorn
+worker used to repeat that on boot. The snapshot stores the finished
+KnowledgeBase (data, indexes and rendered blocks) as a pickle, next to the
+JSON file:
+
+    combined_database_newest.json.snapshot
+
+It starts with a small header of (magic, schema hash, knowledge base
+version). A snapshot is only used if the schema hash matches the code that
+reads it and the version matches the current content of the JSON file;
+otherwise the knowledge base is built from JSON and the snapshot rewritten.
+
+Build it ahead of time (e.g. in the build step of the deployment) with:
+
+    python knowledge_snapshot.py [combined_database_newest.json]
+
+Snapshots are pickles, so only load snapshots written by this application.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+from typing import Any, List, Optional
+
+import german_text
+import knowledge_facets
+import knowledge_index
+import knowledge_render
+import treatment_lookup
+from knowledge_index import KnowledgeBase
+
+SNAPSHOT_MAGIC = b"hautlabor-kb"
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Strings up to this length are interned (names, categories, tags, dict keys)
+MAX_INTERNED_LENGTH = 80
+
+
+def _compute_schema_hash() -> str:
+    """Hash the code that defines the snapshot contents, so any change to it invalidates old snapshots."""
+    digest = hashlib.sha256()
+    for module in (german_text, knowledge_facets, knowledge_index, knowledge_render, treatment_lookup, sys.modules[__name__]):
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    digest.update(f"{sys.version_info[:2]}".encode())
+    return digest.hexdigest()[:16]
+
+
+SCHEMA_HASH = _compute_schema_hash()
+
+
+def content_version(data: bytes) -> str:
+    """Return the version id of a knowledge base file: a short hash of its content."""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def snapshot_path(json_path: str) -> str:
+    """Return where the snapshot of a knowledge base file is stored (KNOWLEDGE_SNAPSHOT_PATH overrides it)."""
+    return os.getenv("KNOWLEDGE_SNAPSHOT_PATH") or json_path + SNAPSHOT_SUFFIX
+
+
+def validate_knowledge_base(data: Any) -> List[str]:
+    """
+    Check the structure the indexes and tools rely on.
+
+    Raises ValueError if the knowledge base cannot be used at all and returns
+    a list of warnings for entries that will be skipped or rendered with
+    placeholders.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("The knowledge base must be a JSON object")
+
+    warnings = []
+    for key in ("treatments", "pages"):
+        entries = data.get(key, [])
+        if not isinstance(entries, list):
+            raise ValueError(f'"{key}" must be a list')
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                raise ValueError(f"{key}[{position}] must be an object")
+
+    for position, treatment in enumerate(data.get("treatments", [])):
+        name = treatment.get("treatment_name")
+        if not isinstance(name, str) or not name:
+            warnings.append(f"treatments[{position}] has no treatment_name")
+        if not isinstance(treatment.get("tags", []), list):
+            warnings.append(f"{name or position}: tags must be a list")
+        content = treatment.get("content", {})
+        if not isinstance(content, dict):
+            warnings.append(f"{name or position}: content must be an object")
+        elif not isinstance(content.get("details", {}), dict):
+            warnings.append(f"{name or position}: details must be an object")
+
+    return warnings
+
+
+def intern_strings(value: Any) -> Any:
+    """Return value with dict keys and short strings interned, so repeated values share one object."""
+    if isinstance(value, dict):
+        return {sys.intern(key) if isinstance(key, str) else key: intern_strings(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [intern_strings(item) for item in value]
+    if isinstance(value, str) and len(value) <= MAX_INTERNED_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+def build_knowledge_base(data: bytes) -> KnowledgeBase:
+    """Parse, validate and index the bytes of a knowledge base file."""
+    parsed = json.loads(data)
+    for warning in validate_knowledge_base(parsed):
+        print(f"⚠️  Knowledge base: {warning}")
+    return KnowledgeBase(intern_strings(parsed), version=content_version(data))
+
+
+def save_snapshot(knowledge_base: KnowledgeBase, path: str) -> None:
+    """Write a snapshot atomically, so concurrently starting workers never read a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix=".kb-snapshot-")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            pickle.dump((SNAPSHOT_MAGIC, SCHEMA_HASH, knowledge_base.version), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(knowledge_base, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def load_snapshot(path: str, version: Optional[str] = None) -> Optional[KnowledgeBase]:
+    """
+    Load a snapshot, or return None if it is missing, unreadable, written by
+    other code (schema hash) or for other content than `version`.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            if header[:2] != (SNAPSHOT_MAGIC, SCHEMA_HASH) or (version is not None and header[2] != version):
+                return None
+            knowledge_base = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️  Ignoring unreadable knowledge base snapshot {path}: {e}")
+        return None
+    return knowledge_base if isinstance(knowledge_base, KnowledgeBase) else None
+
+
+def read_knowledge_base(path: str, use_snapshot: bool = True) -> KnowledgeBase:
+    """
+    Load a knowledge base file, from its snapshot if that is up to date.
+
+    A missing or outdated snapshot is rebuilt from the JSON file and written
+    for the next process. Raises if the JSON file cannot be read or parsed.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not use_snapshot:
+        return build_knowledge_base(data)
+
+    version = content_version(data)
+    cached_path = snapshot_path(path)
+    knowledge_base = load_snapshot(cached_path, version)
+    if knowledge_base is None:
+        knowledge_base = build_knowledge_base(data)
+        try:
+            save_snapshot(knowledge_base, cached_path)
+        except OSError as e:
+            print(f"⚠️  Could not write knowledge base snapshot {cached_path}: {e}")
+    return knowledge_base
+
+
+def main(argv: List[str]) -> None:
+    """Build the snapshot of a knowledge base file and compare load times."""
+    path = argv[1] if len(argv) > 1 else "combined_database_newest.json"
+
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        knowledge_base = build_knowledge_base(f.read())
+    build_seconds = time.perf_counter() - started
+
+    cached_path = snapshot_path(path)
+    save_snapshot(knowledge_base, cached_path)
+
+    started = time.perf_counter()
+    load_snapshot(cached_path, knowledge_base.version)
+    load_seconds = time.perf_counter() - started
+
+    print(f"✅ Snapshot written to {cached_path} ({os.path.getsize(cached_path) / 1024:.0f} KB, version {knowledge_base.version})")
+    print(f"   Build from JSON: {build_seconds * 1000:.1f} ms, load snapshot: {load_seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Load generator for the chat API of app.py.
+
+Simulates concurrent visitors: every session sends a few turns to
+/api/chat (or /api/chat/stream with --stream), one after another, keeping
+the session id issued by the server. Reports throughput, latency
+percentiles (and the time to the first streamed delta), the error rate and
+the memory growth of the app process.
+
+Run it offline against the stub LLM server (stub_llm_server.py). --spawn
+starts the stub and app.py as child processes:
+
+    python load_test.py --spawn --sessions 50 --turns 3 --stream [--output results.json]
+
+or against an app that is already running (pass its PID for memory):
+
+    python load_test.py --url http://localhost:8080 --app-pid 12345 --stub-url http://localhost:8090
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from stub_llm_server import DEFAULT_PORT as DEFAULT_STUB_PORT
+
+DEFAULT_URL = "http://localhost:8080"
+DEFAULT_SESSIONS = 20
+DEFAULT_TURNS = 3
+REQUEST_TIMEOUT = 120  # seconds
+MEMORY_SAMPLE_SECONDS = 0.5
+STARTUP_TIMEOUT = 120  # seconds
+
+QUESTIONS = [
+    "Was kostet Botox?",
+    "Wie lange hält das Ergebnis?",
+    "Gibt es eine Ausfallzeit?",
+    "Was hilft gegen Falten auf der Stirn?",
+    "Wie läuft eine Morpheus8-Behandlung ab?",
+    "Welche Behandlungen gibt es für Männer?",
+    "Was kostet eine HydraFacial-Behandlung?",
+    "Kann ich danach arbeiten gehen?",
+]
+
+
+@dataclass
+class RequestResult:
+    session: int
+    turn: int
+    ok: bool
+    seconds: float
+    first_delta_seconds: Optional[float] = None
+    error: str = ""
+
+
+@dataclass
+class MemorySampler:
+    """Samples the resident set size of a process from /proc while the test runs."""
+
+    pid: Optional[int]
+    samples: List[float] = field(default_factory=list)
+
+    def rss_mb(self) -> Optional[float]:
+        if not self.pid:
+            return None
+        try:
+            with open(f"/proc/{self.pid}/status", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    async def run(self) -> None:
+        while True:
+            rss = self.rss_mb()
+            if rss is not None:
+                self.samples.append(rss)
+            await asyncio.sleep(MEMORY_SAMPLE_SECONDS)
+
+
+async def send_message(client: httpx.AsyncClient, url: str, message: str, session_id: Optional[str],
+                       stream: bool) -> tuple:
+    """Send one chat message; returns (session id, time to the first delta or None)."""
+    headers = {"X-Session-ID": session_id} if session_id else {}
+    started = time.perf_counter()
+    if not stream:
+        response = await client.post(f"{url}/api/chat", json={"message": message}, headers=headers)
+        response.raise_for_status()
+        return response.headers.get("X-Session-ID", session_id), None
+
+    first_delta = None
+    event = None
+    async with client.stream("POST", f"{url}/api/chat/stream", json={"message": message}, headers=headers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+                if event == "delta" and first_delta is None:
+                    first_delta = time.perf_counter() - started
+                elif event == "error":
+                    raise RuntimeError("error event")
+        if event != "done":
+            raise RuntimeError(f"stream ended with {event!r}")
+        return response.headers.get("X-Session-ID", session_id), first_delta
+
+
+async def run_session(client: httpx.AsyncClient, url: str, session: int, turns: int, stream: bool,
+                      unique: bool, results: List[RequestResult]) -> None:
+    """One visitor: `turns` consecutive messages in the same session."""
+    session_id = None
+    for turn in range(turns):
+        message = QUESTIONS[(session + turn) % len(QUESTIONS)]
+        if unique:
+            # Different wording per session, so first turns are not answered from the response cache
+            message = f"{message} (Sitzung {session})"
+        started = time.perf_counter()
+        try:
+            session_id, first_delta = await send_message(client, url, message, session_id, stream)
+            results.append(RequestResult(session, turn, True, time.perf_counter() - started, first_delta))
+        except Exception as e:
+            results.append(RequestResult(session, turn, False, time.perf_counter() - started, error=str(e) or type(e).__name__))
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 in milliseconds."""
+    if not values:
+        return {}
+    if len(values) == 1:
+        return {"p50_ms": values[0] * 1000, "p95_ms": values[0] * 1000, "p99_ms": values[0] * 1000}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50_ms": cuts[49] * 1000, "p95_ms": cuts[94] * 1000, "p99_ms": cuts[98] * 1000}
+
+
+def summarize(results: List[RequestResult], seconds: float, memory: MemorySampler) -> Dict[str, Any]:
+    """Throughput, latencies, errors and memory growth of a finished run."""
+    succeeded = [result for result in results if result.ok]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if not result.ok:
+            errors[result.error] = errors.get(result.error, 0) + 1
+    first_deltas = [result.first_delta_seconds for result in succeeded if result.first_delta_seconds is not None]
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "error_rate": (len(results) - len(succeeded)) / len(results) if results else 0.0,
+        "error_messages": errors,
+        "seconds": seconds,
+        "throughput_rps": len(succeeded) / seconds if seconds else 0.0,
+        "latency": percentiles([result.seconds for result in succeeded]),
+        "first_delta": percentiles(first_deltas),
+    }
+    if memory.samples:
+        summary["memory"] = {
+            "rss_start_mb": memory.samples[0],
+            "rss_end_mb": memory.samples[-1],
+            "rss_peak_mb": max(memory.samples),
+            "rss_growth_mb": memory.samples[-1] - memory.samples[0],
+        }
+    return summary
+
+
+async def run_load_test(url: str, sessions: int, turns: int, stream: bool = False, unique: bool = False,
+                        app_pid: Optional[int] = None) -> Dict[str, Any]:
+    """Run all sessions concurrently against the app at url."""
+    results: List[RequestResult] = []
+    memory = MemorySampler(app_pid)
+    sampler = asyncio.create_task(memory.run())
+    limits = httpx.Limits(max_connections=sessions, max_keepalive_connections=sessions)
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=limits) as client:
+            await asyncio.gather(*(run_session(client, url, session, turns, stream, unique, results)
+                                   for session in range(sessions)))
+    finally:
+        seconds = time.perf_counter() - started
+        # One last sample after the run, then stop sampling
+        rss = memory.rss_mb()
+        if rss is not None:
+            memory.samples.append(rss)
+        sampler.cancel()
+    return summarize(results, seconds, memory)
+
+
+def wait_until_up(url: str, timeout: float = STARTUP_TIMEOUT) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn(args, state_dir: str) -> List[subprocess.Popen]:
+    """
+    Start the stub LLM server and app.py pointing at it. The app keeps its
+    files (embedding cache, sessions, knowledge base snapshot) in state_dir,
+    so the stub's random vectors never reach the real embedding cache.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(here, "stub_llm_server.py"), "--port", str(args.stub_port),
+         "--ttft-ms", str(args.ttft_ms), "--token-ms", str(args.token_ms), "--tokens", str(args.tokens)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.stub_port}/v1",
+        OPENAI_API_KEY="sk-stub",
+        PORT=str(args.app_port),
+        SESSION_STORE="memory",
+        SESSION_DB_PATH=os.path.join(state_dir, "sessions.sqlite3"),
+        EMBEDDING_CACHE_PATH=os.path.join(state_dir, "embedding_cache.sqlite3"),
+        KNOWLEDGE_SNAPSHOT_PATH=os.path.join(state_dir, "knowledge_base.snapshot"),
+    )
+    app = subprocess.Popen([sys.executable, os.path.join(here, "app.py")], env=env, cwd=here,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    processes = [stub, app]
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.stub_port}/stats")
+        wait_until_up(f"http://127.0.0.1:{args.app_port}/health")
+    except Exception:
+        for process in processes:
+            process.terminate()
+        raise
+    return processes
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="Concurrent chat sessions against app.py")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="messages per session")
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/stream")
+    parser.add_argument("--unique", action="store_true", help="vary the questions per session to bypass the response cache")
+    parser.add_argument("--app-pid", type=int, help="PID of app.py for the memory samples")
+    parser.add_argument("--stub-url", help="stub LLM server to read the model request counters from")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--spawn", action="store_true", help="start the stub LLM server and app.py")
+    parser.add_argument("--app-port", type=int, default=8081)
+    parser.add_argument("--stub-port", type=int, default=DEFAULT_STUB_PORT)
+    parser.add_argument("--ttft-ms", type=float, default=300, help="stub time to the first token (--spawn)")
+    parser.add_argument("--token-ms", type=float, default=20, help="stub latency per token (--spawn)")
+    parser.add_argument("--tokens", type=int, default=120, help="stub tokens per answer (--spawn)")
+    args = parser.parse_args(argv)
+
+    processes = []
+    state_dir = None
+    if args.spawn:
+        state_dir = tempfile.TemporaryDirectory(prefix="load_test_")
+        processes = spawn(args, state_dir.name)
+        args.url = f"http://127.0.0.1:{args.app_port}"
+        args.app_pid = processes[1].pid
+        args.stub_url = f"http://127.0.0.1:{args.stub_port}"
+        print(f"🚀 Started stub LLM server and app.py (PID {args.app_pid})")
+
+    try:
+        print(f"🏋️ {args.sessions} sessions x {args.turns} turns against {args.url}{' (stream)' if args.stream else ''}")
+        results = asyncio.run(run_load_test(args.url, args.sessions, args.turns, args.stream, args.unique, args.app_pid))
+        if args.stub_url:
+            results["model"] = httpx.get(f"{args.stub_url}/stats", timeout=5).json()
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        if state_dir:
+            state_dir.cleanup()
+
+    latency = results["latency"]
+    print(f"\n✅ {results['requests']} requests in {results['seconds']:.1f}s: {results['throughput_rps']:.1f} req/s, "
+          f"{results['error_rate']:.1%} errors")
+    if latency:
+        print(f"   Latency p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms, p99 {latency['p99_ms']:.0f} ms")
+    if results["first_delta"]:
+        print(f"   First delta p50 {results['first_delta']['p50_ms']:.0f} ms, p95 {results['first_delta']['p95_ms']:.0f} ms")
+    if "memory" in results:
+        memory = results["memory"]
+        print(f"   RSS {memory['rss_start_mb']:.0f} -> {memory['rss_end_mb']:.0f} MB "
+              f"(peak {memory['rss_peak_mb']:.0f} MB, {memory['rss_growth_mb']:+.1f} MB)")
+    if "model" in results:
+        print(f"   Model requests: {results['model']['chat_completions']} chat completions, "
+              f"{results['model']['embeddings']} embeddings, up to {results['model']['max_in_flight']} in flight")
+    for error, count in results["error_messages"].items():
+        print(f"⚠️  {count}x {error}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
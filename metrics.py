@@ -0,0 +1,211 @@
+"""
+Hot-path timings as Prometheus-style metrics and logfire spans.
+
+Every chat request is one logfire span (opened on the agent event loop, so
+the pydantic-ai run, model request and tool spans nest under it) carrying
+the queue wait and token counts. The same timings feed counters and
+histograms rendered in the Prometheus text format by GET /metrics:
+
+- chat_requests_total / chat_request_seconds: per endpoint and status
+- agent_queue_wait_seconds: from the request thread to the agent event loop
+- agent_run_seconds: the pydantic-ai run (run or stream)
+- tool_calls_total / tool_call_seconds: per tool (timed_tool)
+- model_requests_total / model_request_seconds: OpenAI HTTP round trips per
+  endpoint, until the response headers arrive, i.e. the time to the first
+  token for streamed responses (instrumented_http_client)
+- llm_tokens_total: prompt, completion and cached prompt tokens
+
+prometheus_client is not a dependency; the few metric types needed are
+implemented here.
+"""
+
+import functools
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import logfire
+from openai import DefaultAsyncHttpxClient
+
+# Latency buckets in seconds, from cached tool calls to slow LLM runs
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    """Observations counted into cumulative buckets per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label combination: bucket counts (not cumulative), sum and count
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0, 0]))
+            counts[index] += 1
+            total[0] += value
+            total[1] += 1
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(tuple(str(labels.get(name, "")) for name in self.labels))
+        return int(entry[1][1]) if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), list(total))) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, (total, count)) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {int(count)}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of this process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+chat_requests = registry.counter("chat_requests_total", "Chat requests by endpoint and status", ["endpoint", "status"])
+chat_request_seconds = registry.histogram("chat_request_seconds", "Chat request duration", ["endpoint"])
+queue_wait_seconds = registry.histogram("agent_queue_wait_seconds", "Wait until a request runs on the agent event loop")
+agent_run_seconds = registry.histogram("agent_run_seconds", "Duration of pydantic-ai agent runs", ["mode"])
+response_cache_hits = registry.counter("response_cache_hits_total", "First-turn questions answered from the response cache")
+tool_calls = registry.counter("tool_calls_total", "Agent tool calls by tool and status", ["tool", "status"])
+tool_call_seconds = registry.histogram("tool_call_seconds", "Duration of agent tool calls", ["tool"])
+model_requests = registry.counter("model_requests_total", "OpenAI API requests by endpoint and status", ["endpoint", "status"])
+model_request_seconds = registry.histogram("model_request_seconds", "OpenAI API round trips until the response headers", ["endpoint"])
+llm_tokens = registry.counter("llm_tokens_total", "LLM tokens by kind (prompt, completion, cached)", ["kind"])
+
+
+def timed_tool(function: Callable) -> Callable:
+    """Wrap an async agent tool in a span and record its duration and outcome."""
+    name = function.__name__
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        status = "ok"
+        started = time.perf_counter()
+        with logfire.span("tool {tool}", tool=name):
+            try:
+                return await function(*args, **kwargs)
+            except BaseException:
+                status = "error"
+                raise
+            finally:
+                tool_call_seconds.observe(time.perf_counter() - started, tool=name)
+                tool_calls.inc(tool=name, status=status)
+
+    return wrapper
+
+
+def record_tokens(usage) -> None:
+    """Add the token counts of a pydantic-ai Usage."""
+    llm_tokens.inc(usage.request_tokens or 0, kind="prompt")
+    llm_tokens.inc(usage.response_tokens or 0, kind="completion")
+    llm_tokens.inc((usage.details or {}).get("cached_tokens", 0), kind="cached")
+
+
+def _endpoint(path: str) -> str:
+    # "/v1/chat/completions" -> "chat/completions"
+    return path.split("/v1/", 1)[-1].strip("/") or path
+
+
+async def _on_request(request) -> None:
+    request.extensions["metrics_started"] = time.perf_counter()
+
+
+async def _on_response(response) -> None:
+    started = response.request.extensions.get("metrics_started")
+    if started is None:
+        return
+    endpoint = _endpoint(response.request.url.path)
+    model_request_seconds.observe(time.perf_counter() - started, endpoint=endpoint)
+    model_requests.inc(endpoint=endpoint, status=str(response.status_code))
+
+
+def instrumented_http_client(**kwargs) -> DefaultAsyncHttpxClient:
+    """The OpenAI SDK's default HTTP client, timing every API round trip."""
+    return DefaultAsyncHttpxClient(event_hooks={"request": [_on_request], "response": [_on_response]}, **kwargs)
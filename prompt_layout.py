@@ -0,0 +1,88 @@
+"""
+Keep the start of every model request byte-identical so the provider's
+prompt cache can reuse it.
+
+OpenAI caches the longest previously seen prefix of a request (from 1024
+tokens on, in 128 token steps). A chat request is laid out as
+
+    tools (the JSON schemas of the agent tools)
+    system: system_prompt.txt                      <- static, cacheable prefix
+    system: summary of older turns (if any)        <- volatile, after the prefix
+    user / assistant / tool messages ...
+
+The tools and the system prompt are fixed at import, so they only stay a
+shared prefix if every request puts the current system prompt first. Stored
+histories, however, carry the system prompt of the turn they started with
+(e.g. before a deployment changed system_prompt.txt) and the history
+summary is another system message. with_static_prefix() puts the current
+system prompt first and everything volatile after it.
+
+PromptCacheStats records how many prompt tokens the API reported as cached.
+"""
+
+import threading
+from typing import Dict, List
+
+from pydantic_ai.messages import ModelMessage, ModelRequest, SystemPromptPart
+from pydantic_ai.usage import Usage
+
+from history_compaction import SUMMARY_PREFIX
+
+
+def _is_prompt(part) -> bool:
+    """A static system prompt part (not the history summary or a dynamic part re-evaluated every run)."""
+    return (isinstance(part, SystemPromptPart) and part.dynamic_ref is None
+            and not part.content.startswith(SUMMARY_PREFIX))
+
+
+def with_static_prefix(messages: List[ModelMessage], system_prompt: str) -> List[ModelMessage]:
+    """
+    Return a history whose first message starts with exactly system_prompt.
+
+    Outdated system prompts are replaced; the history summary, dynamic
+    prompt parts and all other parts keep their order after it. An empty history is returned as is (the
+    agent adds the system prompt itself).
+    """
+    if not messages or not system_prompt:
+        return messages
+    first = messages[0]
+    if not isinstance(first, ModelRequest):
+        return [ModelRequest(parts=[SystemPromptPart(content=system_prompt)])] + list(messages)
+
+    head, others = (first.parts[0], first.parts[1:]) if first.parts else (None, [])
+    if isinstance(head, SystemPromptPart) and head.content == system_prompt and not any(map(_is_prompt, others)):
+        return messages
+    rest = [part for part in first.parts if not _is_prompt(part)]
+    return [ModelRequest(parts=[SystemPromptPart(content=system_prompt)] + rest)] + list(messages[1:])
+
+
+class PromptCacheStats:
+    """Prompt and cached prompt token counters, summed over agent runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, usage: Usage) -> int:
+        """Add the usage of one agent run and return its cached prompt tokens."""
+        cached = (usage.details or {}).get("cached_tokens", 0)
+        with self._lock:
+            self.runs += 1
+            self.requests += usage.requests
+            self.prompt_tokens += usage.request_tokens or 0
+            self.cached_tokens += cached
+        return cached
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            }
@@ -0,0 +1,160 @@
+"""
+Split system_prompt.txt into a core prompt and topic sections retrieved on demand.
+
+Most of system_prompt.txt is sent with every request although a single
+question only needs a small part of it: the treatment quick reference
+(durations, downtimes and prices of ~30 treatments, which duplicate the
+knowledge base), the social media links and the imprint/team details. In
+the compact prompt mode (SYSTEM_PROMPT_MODE=compact)
+
+- the core (persona, rules, length control, formatting, ...) is the static
+  system prompt, and
+- the topic sections are indexed with the same BM25 index as the knowledge
+  base, and the few sections matching the current question are added after
+  the core as a dynamic system prompt part.
+
+The core stays the byte-identical cacheable prefix (see prompt_layout.py);
+the retrieved sections are volatile content after it.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+
+from knowledge_index import InvertedIndex
+
+# Numbered top-level sections that are retrieved on demand instead of being part of the core
+TOPIC_SECTIONS = ("TREATMENT QUICK REFERENCE", "IMPRESSUM & TEAM")
+
+# Top-level bullets ("- **Title:** ...") of core sections that are retrieved on demand
+TOPIC_BULLETS = ("Social Media Accounts", "Topic-Specific Social Media Links")
+
+# German search terms for topics whose text is English or uses other words than patients do
+TOPIC_KEYWORDS = {
+    "IMPRESSUM & TEAM": "Kontakt Adresse Anschrift Standort Telefon telefonisch anrufen E-Mail Team Mitarbeiter Ärztin",
+    "Social Media Accounts": "Social Media Instagram Facebook TikTok Video Kanal Profil",
+}
+
+# Topic sections added to the prompt per question, and the share of the best score they need
+MAX_TOPIC_SECTIONS = 3
+MIN_RELATIVE_SCORE = 0.5
+
+# Index weights of the topic title and text
+TITLE_WEIGHT = 10
+TEXT_WEIGHT = 1
+
+_HEADING_RE = re.compile(r"^(?:## .+|\d+\.\s+[A-ZÄÖÜ][A-ZÄÖÜ &()]+)$")
+_BULLET_RE = re.compile(r"^- \*\*([^*:]+):\*\*")
+_ENTRY_NAME_RE = re.compile(r"^(.+?) — ")
+
+
+@dataclass
+class PromptSection:
+    """A part of the system prompt; `group` is the heading shown once before the sections of a group."""
+
+    title: str
+    text: str
+    group: str = ""
+    keywords: str = ""
+
+
+def split_headings(text: str) -> List[Tuple[str, str]]:
+    """Split a prompt into (heading, body) pairs; text before the first heading has an empty heading."""
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for line in text.splitlines():
+        if _HEADING_RE.match(line.strip()):
+            sections.append((line.strip(), []))
+        else:
+            sections[-1][1].append(line)
+    return [(heading, "\n".join(lines).strip("\n")) for heading, lines in sections if heading or "".join(lines).strip()]
+
+
+def split_bullets(body: str) -> List[Tuple[str, str]]:
+    """Split a section body into top-level bullets (title, text); indented lines belong to the bullet above."""
+    bullets: List[Tuple[str, List[str]]] = [("", [])]
+    for line in body.splitlines():
+        match = _BULLET_RE.match(line)
+        if match:
+            bullets.append((match.group(1).strip(), [line]))
+        else:
+            bullets[-1][1].append(line)
+    return [(title, "\n".join(lines).strip("\n")) for title, lines in bullets if title or "".join(lines).strip()]
+
+
+def split_entries(body: str) -> Tuple[str, List[PromptSection]]:
+    """Split the quick reference into its intro and one section per treatment paragraph."""
+    paragraphs = [paragraph.strip() for paragraph in re.split(r"\n\s*\n", body) if paragraph.strip()]
+    intro, entries = [], []
+    for paragraph in paragraphs:
+        match = _ENTRY_NAME_RE.match(paragraph)
+        if match:
+            entries.append(PromptSection(title=match.group(1), text=paragraph))
+        elif entries:
+            entries[-1].text += "\n" + paragraph
+        else:
+            intro.append(paragraph)
+    return "\n\n".join(intro), entries
+
+
+def _topic_fields(section: PromptSection) -> Iterable[Tuple[int, str]]:
+    yield TITLE_WEIGHT, section.title
+    yield TITLE_WEIGHT, section.keywords
+    yield TEXT_WEIGHT, section.text
+
+
+class PromptSections:
+    """The core of a system prompt and an index over its topic sections."""
+
+    def __init__(self, text: str):
+        self.text = text
+        core: List[str] = []
+        self.topics: List[PromptSection] = []
+
+        for heading, body in split_headings(text):
+            if any(topic in heading for topic in TOPIC_SECTIONS):
+                if "QUICK REFERENCE" in heading:
+                    intro, entries = split_entries(body)
+                    for entry in entries:
+                        entry.group = f"{heading}\n{intro}".strip()
+                    self.topics.extend(entries)
+                else:
+                    self.topics.append(PromptSection(title=heading, text=f"{heading}\n\n{body}"))
+                continue
+
+            # The topic bullets of one section form one topic section
+            kept, topic_titles, topic_bullets = [], [], []
+            for title, bullet in split_bullets(body):
+                if title in TOPIC_BULLETS:
+                    topic_titles.append(title)
+                    topic_bullets.append(bullet)
+                else:
+                    kept.append(bullet)
+            if topic_bullets:
+                self.topics.append(PromptSection(title=" / ".join(topic_titles), text="\n\n".join(topic_bullets)))
+            core.append("\n".join(filter(None, [heading] + kept)))
+
+        for section in self.topics:
+            section.keywords = " ".join(words for topic, words in TOPIC_KEYWORDS.items() if topic in section.title)
+        self.core = "\n\n".join(core).strip() + "\n"
+        self.index = InvertedIndex(self.topics, _topic_fields)
+
+    def relevant(self, question: str, max_sections: int = MAX_TOPIC_SECTIONS) -> List[PromptSection]:
+        """The topic sections matching a question, best first."""
+        scores = self.index.scores(question)
+        if not scores:
+            return []
+        best = max(scores.values())
+        ranked = sorted((i for i, score in scores.items() if score >= MIN_RELATIVE_SCORE * best),
+                        key=lambda i: (-scores[i], i))
+        return [self.topics[i] for i in ranked[:max_sections]]
+
+    def render(self, question: str, max_sections: int = MAX_TOPIC_SECTIONS) -> str:
+        """The matching topic sections as prompt text, each group heading once (empty if none match)."""
+        parts = []
+        groups = set()
+        for section in self.relevant(question, max_sections):
+            if section.group and section.group not in groups:
+                groups.add(section.group)
+                parts.append(section.group)
+            parts.append(section.text)
+        return "\n\n".join(parts)
@@ -13,25 +13,53 @@ from pydantic_ai import Agent, ModelRetry, RunContext
 from pydantic_ai.models.openai import OpenAIModel
 from openai import AsyncOpenAI
 
+from knowledge_index import get_facets, get_page_index, get_rendered, get_treatment_index, get_treatment_resolver
+from knowledge_manager import load_knowledge_base_file
+from knowledge_snapshot import content_version
+from retrieval import PREFETCHED_DETAILS, HybridRetriever
+from vector_store import LocalVectorStore
+from embedding_cache import EmbeddingCache
+from web_search_cache import WebSearchCache
+from prompt_sections import PromptSections
+from metrics import instrumented_http_client, timed_tool
+
 load_dotenv()
 
 llm = os.getenv('LLM_MODEL', 'gpt-4o-mini')
-model = OpenAIModel(llm)
+# The one OpenAI client (and connection pool) of the process, shared by the agent and
+# the app (summaries, embeddings, web search); its round trips are timed for /metrics
+openai_client = AsyncOpenAI(http_client=instrumented_http_client())
+model = OpenAIModel(llm, openai_client=openai_client)
 
 logfire.configure(send_to_logfire='if-token-present')
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Absolute paths, so the same canonical files are used whatever the working directory
+KNOWLEDGE_BASE_FILE = os.getenv('KNOWLEDGE_BASE_PATH') or os.path.join(BASE_DIR, 'combined_database_newest.json')
+SYSTEM_PROMPT_FILE = os.getenv('SYSTEM_PROMPT_PATH') or os.path.join(BASE_DIR, 'system_prompt.txt')
+
+# "full": all of system_prompt.txt in every request; "compact": its core plus the topic sections
+# matching the question (see prompt_sections.py)
+SYSTEM_PROMPT_MODE = os.getenv('SYSTEM_PROMPT_MODE', 'full')
+
 @dataclass
 class ClinicAIDeps:
     knowledge_base: Dict[str, Any]
     openai_client: AsyncOpenAI
+    # Optional vector search over site_pages, fused with the knowledge base search
+    vector_store: Optional[LocalVectorStore] = None
+    embedding_cache: Optional[EmbeddingCache] = None
+    # Shared across requests so repeated web searches are answered from the cache
+    web_search_cache: Optional[WebSearchCache] = None
 
 def load_system_prompt():
     """Load system prompt from external file."""
     try:
-        with open('system_prompt.txt', 'r', encoding='utf-8') as f:
+        with open(SYSTEM_PROMPT_FILE, 'r', encoding='utf-8') as f:
             return f.read()
     except FileNotFoundError:
-        print("⚠️  system_prompt.txt not found, using default prompt")
+        print(f"⚠️  {SYSTEM_PROMPT_FILE} not found, using default prompt")
         return """
 You are the official AI assistant for Hautlabor, the practice of Dr. med. Lara Pfahl in Oldenburg. 
 Your primary source of truth for all information related to treatments, procedures, and the practice itself 
@@ -62,18 +90,15 @@ Always respond in German using formal "Sie" address.
 """
 
 def load_knowledge_base():
-    """Load knowledge base from JSON file."""
-    try:
-        with open('combined_database_newest.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("⚠️  combined_database_newest.json not found")
-        return {"treatments": [], "pages": []}
-    except json.JSONDecodeError as e:
-        print(f"⚠️  Error parsing JSON: {e}")
-        return {"treatments": [], "pages": []}
+    """Load knowledge base from JSON file and build its search indexes."""
+    return load_knowledge_base_file(KNOWLEDGE_BASE_FILE)
 
-system_prompt = load_system_prompt()
+full_system_prompt = load_system_prompt()
+prompt_sections = PromptSections(full_system_prompt)
+# The static system prompt, sent first in every request
+system_prompt = prompt_sections.core if SYSTEM_PROMPT_MODE == 'compact' else full_system_prompt
+# Identifies the prompt an answer was generated with (see the response cache in app.py)
+system_prompt_version = content_version(f"{SYSTEM_PROMPT_MODE}\n{full_system_prompt}".encode("utf-8"))
 
 clinic_ai_expert = Agent(
     model,
@@ -82,94 +107,28 @@ clinic_ai_expert = Agent(
     retries=2
 )
 
+if SYSTEM_PROMPT_MODE == 'compact':
+    @clinic_ai_expert.system_prompt(dynamic=True)
+    def topic_sections(ctx: RunContext[ClinicAIDeps]) -> str:
+        """Topic sections of system_prompt.txt matching the current question, re-evaluated every run."""
+        return prompt_sections.render(ctx.prompt)
+
 def search_treatments(knowledge_base: Dict[str, Any], query: str, max_results: int = 5) -> List[Dict[str, Any]]:
     """Search treatments in the knowledge base based on query."""
-    query_lower = query.lower()
-    treatments = knowledge_base.get("treatments", [])
-    results = []
-    
-    for treatment in treatments:
-        score = 0
-        
-        # Check treatment name
-        if query_lower in treatment.get("treatment_name", "").lower():
-            score += 10
-            
-        # Check category
-        if query_lower in treatment.get("category", "").lower():
-            score += 5
-            
-        # Check tags
-        for tag in treatment.get("tags", []):
-            if query_lower in tag.lower():
-                score += 3
-                
-        # Check content description
-        content = treatment.get("content", {})
-        if isinstance(content, dict):
-            description = content.get("description", "")
-            if query_lower in description.lower():
-                score += 2
-                
-            # Check mechanism
-            mechanism = content.get("mechanism", "")
-            if query_lower in mechanism.lower():
-                score += 2
-                
-            # Check FAQs
-            faqs = content.get("faq", []) or content.get("faqs", [])
-            for faq in faqs:
-                if isinstance(faq, dict):
-                    question = faq.get("question", "")
-                    answer = faq.get("answer", "")
-                    if query_lower in question.lower() or query_lower in answer.lower():
-                        score += 1
-        
-        if score > 0:
-            results.append((score, treatment))
-    
-    # Sort by score and return top results
-    results.sort(key=lambda x: x[0], reverse=True)
-    return [treatment for score, treatment in results[:max_results]]
+    return get_treatment_index(knowledge_base).search(query, max_results=max_results)
 
 def search_pages(knowledge_base: Dict[str, Any], query: str, max_results: int = 3) -> List[Dict[str, Any]]:
     """Search pages in the knowledge base based on query."""
-    query_lower = query.lower()
-    pages = knowledge_base.get("pages", [])
-    results = []
-    
-    for page in pages:
-        score = 0
-        
-        # Check page title
-        if query_lower in page.get("page_title", "").lower():
-            score += 10
-            
-        # Check page subtitle
-        if query_lower in page.get("page_subtitle", "").lower():
-            score += 5
-            
-        # Check sections
-        for section in page.get("sections", []):
-            if isinstance(section, dict):
-                title = section.get("title", "")
-                content = section.get("content", "")
-                if query_lower in title.lower():
-                    score += 3
-                if content and query_lower in content.lower():
-                    score += 2
-        
-        if score > 0:
-            results.append((score, page))
-    
-    # Sort by score and return top results
-    results.sort(key=lambda x: x[0], reverse=True)
-    return [page for score, page in results[:max_results]]
+    return get_page_index(knowledge_base).search(query, max_results=max_results)
 
 @clinic_ai_expert.tool
+@timed_tool
 async def search_knowledge_base(ctx: RunContext[ClinicAIDeps], user_query: str) -> str:
     """
     Search the knowledge base for relevant information about treatments, procedures, and clinic information.
+    The best matching treatments are returned with their full details (procedure, costs, FAQ), so
+    get_treatment_details is not needed for them. Independent tools (e.g. find_treatments, web_search)
+    can be called in the same step.
     
     Args:
         ctx: The context containing the knowledge base
@@ -179,88 +138,33 @@ async def search_knowledge_base(ctx: RunContext[ClinicAIDeps], user_query: str)
         A formatted string containing the most relevant information from the knowledge base
     """
     try:
-        knowledge_base = ctx.deps.knowledge_base
+        deps = ctx.deps
+        retriever = HybridRetriever(
+            deps.knowledge_base,
+            vector_store=deps.vector_store,
+            embedding_cache=deps.embedding_cache,
+            openai_client=deps.openai_client
+        )
         
-        # Search treatments and pages
-        treatment_results = search_treatments(knowledge_base, user_query, max_results=3)
-        page_results = search_pages(knowledge_base, user_query, max_results=2)
+        # BM25 over treatments and pages plus vector search over site_pages, fused into one top 5;
+        # the best treatment hits come with their details to save a get_treatment_details round trip
+        hits = await retriever.search(user_query, top_k=5, detailed_treatments=PREFETCHED_DETAILS)
         
-        if not treatment_results and not page_results:
+        if not hits:
             return "Ich konnte keine spezifischen Informationen zu Ihrer Anfrage in unserer Wissensdatenbank finden. Für eine individuelle Beratung empfehle ich Ihnen ein persönliches Gespräch mit Dr. med. Lara Pfahl."
         
-        formatted_results = []
-        
-        # Format treatment results
-        for treatment in treatment_results:
-            content = treatment.get("content", {})
-            result = f"""
-## {treatment.get("treatment_name", "Behandlung")}
-**Kategorie:** {treatment.get("category", "Nicht spezifiziert")}
-**Tags:** {", ".join(treatment.get("tags", []))}
-
-**Beschreibung:**
-{content.get("description", "Keine Beschreibung verfügbar.")}
-
-**Funktionsweise:**
-{content.get("mechanism", "Keine Informationen zur Funktionsweise verfügbar.")}
-"""
-            
-            # Add details if available
-            details = content.get("details", {})
-            if details:
-                result += f"""
-**Behandlungsdetails:**
-- Dauer: {details.get("duration", "Nicht spezifiziert")}
-- Ausfallzeit: {details.get("downtime", "Nicht spezifiziert")}
-- Haltbarkeit: {details.get("durability", "Nicht spezifiziert")}
-"""
-                
-                # Add cost information if available
-                cost = details.get("cost", {})
-                if cost and cost.get("base_price"):
-                    result += f"- Kosten: ab {cost.get('base_price')} {cost.get('currency', 'EUR')}\n"
-            
-            # Add doctor citation if available
-            doctor_citation = content.get("doctor_citation")
-            if doctor_citation:
-                if isinstance(doctor_citation, dict):
-                    quote = doctor_citation.get("quote", "")
-                    doctor_name = doctor_citation.get("doctor_name", "Dr. med. Lara Pfahl")
-                elif isinstance(doctor_citation, str):
-                    quote = doctor_citation
-                    doctor_name = "Dr. med. Lara Pfahl"
-                
-                if quote:
-                    result += f'\n> "{quote}" - {doctor_name}\n'
-            
-            formatted_results.append(result)
-        
-        # Format page results
-        for page in page_results:
-            result = f"""
-## {page.get("page_title", "Seite")}
-{page.get("page_subtitle", "")}
-
-"""
-            # Add relevant sections
-            for section in page.get("sections", [])[:2]:  # Limit to first 2 sections
-                if isinstance(section, dict):
-                    result += f"**{section.get('title', '')}**\n"
-                    if section.get('content'):
-                        result += f"{section.get('content')}\n\n"
-            
-            formatted_results.append(result)
-        
-        return "\n\n---\n\n".join(formatted_results)
+        return "\n\n---\n\n".join(hit.text for hit in hits)
         
     except Exception as e:
         print(f"Error searching knowledge base: {e}")
         return "Es gab einen Fehler beim Durchsuchen der Wissensdatenbank. Bitte kontaktieren Sie uns direkt für weitere Informationen."
 
 @clinic_ai_expert.tool
+@timed_tool
 async def get_treatment_details(ctx: RunContext[ClinicAIDeps], treatment_name: str) -> str:
     """
     Get detailed information about a specific treatment.
+    Not needed for treatments search_knowledge_base already returned with full details.
     
     Args:
         ctx: The context containing the knowledge base
@@ -273,65 +177,18 @@ async def get_treatment_details(ctx: RunContext[ClinicAIDeps], treatment_name: s
         knowledge_base = ctx.deps.knowledge_base
         treatments = knowledge_base.get("treatments", [])
         
-        # Find the treatment
-        target_treatment = None
-        for treatment in treatments:
-            if treatment_name.lower() in treatment.get("treatment_name", "").lower():
-                target_treatment = treatment
-                break
+        # Resolve the name via exact name, aliases (tags, id) and fuzzy matching
+        match = get_treatment_resolver(knowledge_base).resolve(treatment_name)
+        names = [treatments[i].get("treatment_name", "") for i in match.candidates]
         
-        if not target_treatment:
+        if match.index is None:
+            if names:
+                return f"Ich konnte keine Behandlung '{treatment_name}' finden. Meinten Sie: {', '.join(names)}?"
             return f"Ich konnte keine Informationen zur Behandlung '{treatment_name}' finden. Bitte überprüfen Sie den Namen oder fragen Sie nach einer ähnlichen Behandlung."
         
-        content = target_treatment.get("content", {})
-        
-        result = f"""
-# {target_treatment.get("treatment_name")}
-
-**Kategorie:** {target_treatment.get("category")}
-**Behandlungsarten:** {", ".join(target_treatment.get("tags", []))}
-
-## Beschreibung
-{content.get("description", "Keine Beschreibung verfügbar.")}
-
-## Funktionsweise
-{content.get("mechanism", "Keine Informationen zur Funktionsweise verfügbar.")}
-"""
-        
-        # Add details
-        details = content.get("details", {})
-        if details:
-            result += f"""
-## Behandlungsdetails
-- **Dauer:** {details.get("duration", "Nicht spezifiziert")}
-- **Ausfallzeit:** {details.get("downtime", "Nicht spezifiziert")}
-- **Haltbarkeit:** {details.get("durability", "Nicht spezifiziert")}
-"""
-            
-            cost = details.get("cost", {})
-            if cost and cost.get("base_price"):
-                result += f"- **Kosten:** ab {cost.get('base_price')} {cost.get('currency', 'EUR')}\n"
-        
-        # Add procedure steps
-        procedure_steps = content.get("procedure_steps", [])
-        if procedure_steps:
-            result += "\n## Behandlungsablauf\n"
-            if isinstance(procedure_steps, list):
-                for i, step in enumerate(procedure_steps, 1):
-                    result += f"{i}. {step}\n"
-            else:
-                result += procedure_steps
-        
-        # Add FAQ
-        faqs = content.get("faq", []) or content.get("faqs", [])
-        if faqs:
-            result += "\n## Häufig gestellte Fragen\n"
-            for faq in faqs[:3]:  # Limit to first 3 FAQs
-                if isinstance(faq, dict):
-                    question = faq.get("question", "")
-                    answer = faq.get("answer", "")
-                    result += f"**{question}**\n{answer}\n\n"
-        
+        result = get_rendered(knowledge_base).treatment_details[match.index]
+        if match.ambiguous:
+            result += f"\n**Weitere passende Behandlungen:** {', '.join(names[1:])}\n"
         return result
         
     except Exception as e:
@@ -339,6 +196,7 @@ async def get_treatment_details(ctx: RunContext[ClinicAIDeps], treatment_name: s
         return "Es gab einen Fehler beim Abrufen der Behandlungsdetails."
 
 @clinic_ai_expert.tool
+@timed_tool
 async def list_treatments_by_category(ctx: RunContext[ClinicAIDeps], category: str = "") -> str:
     """
     List all treatments, optionally filtered by category.
@@ -351,67 +209,101 @@ async def list_treatments_by_category(ctx: RunContext[ClinicAIDeps], category: s
         List of treatments in the specified category or all treatments
     """
     try:
-        knowledge_base = ctx.deps.knowledge_base
-        treatments = knowledge_base.get("treatments", [])
-        
-        if category:
-            treatments = [t for t in treatments if t.get("category", "").lower() == category.lower()]
-        
-        if not treatments:
-            return f"Keine Behandlungen gefunden{f' in der Kategorie {category}' if category else ''}."
-        
-        result = f"## Behandlungen{f' - {category}' if category else ''}\n\n"
-        
-        # Group by category
-        categories = {}
-        for treatment in treatments:
-            cat = treatment.get("category", "Sonstige")
-            if cat not in categories:
-                categories[cat] = []
-            categories[cat].append(treatment)
-        
-        for cat, cat_treatments in categories.items():
-            result += f"### {cat}\n"
-            for treatment in cat_treatments:
-                name = treatment.get("treatment_name", "Unbekannte Behandlung")
-                tags = ", ".join(treatment.get("tags", []))
-                result += f"- **{name}**"
-                if tags:
-                    result += f" ({tags})"
-                result += "\n"
-            result += "\n"
-        
-        return result
+        return get_rendered(ctx.deps.knowledge_base).category_listing(category)
         
     except Exception as e:
         print(f"Error listing treatments: {e}")
         return "Es gab einen Fehler beim Abrufen der Behandlungsliste."
 
 @clinic_ai_expert.tool
+@timed_tool
+async def find_treatments(
+    ctx: RunContext[ClinicAIDeps],
+    category: str = "",
+    tags: Optional[List[str]] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> str:
+    """
+    Find treatments matching all given criteria at once, e.g. face treatments for scars under 500 EUR.
+    
+    Args:
+        ctx: The context containing the knowledge base
+        category: Optional category ("Gesicht", "Körper", "Männer")
+        tags: Optional concerns or methods that must all apply, e.g. ["Narben", "Laser"]
+        min_price: Optional minimum starting price in EUR
+        max_price: Optional maximum starting price in EUR
+        
+    Returns:
+        A short list of the matching treatments with their starting prices
+    """
+    try:
+        knowledge_base = ctx.deps.knowledge_base
+        facets = get_facets(knowledge_base)
+        treatments = knowledge_base.get("treatments", [])
+        tags = tags or []
+        
+        criteria = [category] if category else []
+        criteria += tags
+        if min_price is not None:
+            criteria.append(f"ab {min_price:g} EUR")
+        if max_price is not None:
+            criteria.append(f"bis {max_price:g} EUR")
+        description = ", ".join(criteria) or "alle"
+        
+        ids = facets.query(category=category, tags=tags, min_price=min_price, max_price=max_price)
+        if not ids:
+            categories = ", ".join(sorted({t.get("category", "") for t in treatments if t.get("category")}))
+            return f"Keine Behandlungen gefunden für: {description}. Verfügbare Kategorien: {categories}."
+        
+        lines = [f"## Passende Behandlungen ({description})\n"]
+        for i in ids:
+            treatment = treatments[i]
+            price = facets.prices.get(i)
+            price_text = f" – ab {price:g} EUR" if price is not None else ""
+            lines.append(f"- **{treatment.get('treatment_name', 'Unbekannte Behandlung')}** ({treatment.get('category', '')}){price_text}")
+        return "\n".join(lines) + "\n"
+        
+    except Exception as e:
+        print(f"Error finding treatments: {e}")
+        return "Es gab einen Fehler bei der Suche nach passenden Behandlungen."
+
+async def fetch_web_results(client: AsyncOpenAI, user_query: str) -> str:
+    """Run one web search through the Responses API and return its output text."""
+    response = await client.responses.create(
+        model="gpt-4.1-mini",
+        tools=[{"type": "web_search_preview"}],
+        input=user_query
+    )
+
+    # Correctly extract the output text from the response
+    if hasattr(response, "output_text"):
+        return response.output_text
+    
+    # If output_text is not directly available, parse the message content
+    for item in getattr(response, "output", []):
+        if item.get("type") == "message":
+            for content_item in item.get("content", []):
+                if content_item.get("type") == "output_text":
+                    return content_item.get("text", "Keine Web-Ergebnisse gefunden.")
+    
+    return "Keine Web-Ergebnisse gefunden."
+
+@clinic_ai_expert.tool
+@timed_tool
 async def web_search(ctx: RunContext[ClinicAIDeps], user_query: str) -> str:
     """
     Search the web for up-to-date information using OpenAI's web search tool.
     """
     try:
         client = ctx.deps.openai_client
-        response = await client.responses.create(
-            model="gpt-4.1-mini",
-            tools=[{"type": "web_search_preview"}],
-            input=user_query
-        )
-
-        # Correctly extract the output text from the response
-        if hasattr(response, "output_text"):
-            return response.output_text
-        
-        # If output_text is not directly available, parse the message content
-        for item in getattr(response, "output", []):
-            if item.get("type") == "message":
-                for content_item in item.get("content", []):
-                    if content_item.get("type") == "output_text":
-                        return content_item.get("text", "Keine Web-Ergebnisse gefunden.")
-        
-        return "Keine Web-Ergebnisse gefunden."
+        cache = ctx.deps.web_search_cache
+        if cache is None:
+            return await fetch_web_results(client, user_query)
+        return await cache.search(user_query, lambda query: fetch_web_results(client, query))
+    except asyncio.TimeoutError:
+        print(f"Web Search Timeout: {user_query}")
+        return "Die Websuche hat zu lange gedauert. Bitte beantworte die Frage mit den Informationen aus der Wissensdatenbank."
     except Exception as e:
         print(f"Web Search Error: {str(e)}")
         return f"Es gab einen Fehler bei der Websuche: {str(e)}"
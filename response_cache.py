@@ -0,0 +1,193 @@
+"""
+Response cache in front of clinic_ai_expert for first-turn questions.
+
+Many conversations start with the same few questions (prices, Morpheus8,
+HydraFacial, booking an appointment). Their answers do not depend on any
+history, so a cached answer can be returned instead of a full agent run:
+
+- exact tier: keyed by the normalized question text,
+- semantic tier: the cached question whose embedding is most similar to the
+  new question, if the cosine similarity is above a threshold.
+
+Entries expire after a TTL. Every entry is tagged with the version of the
+knowledge base snapshot and system prompt that produced it (see
+answer_version in app.py); a lookup only matches entries of the version it
+is answered with. An answer from a snapshot that is being replaced can
+thus never be served for the new one, however the swap and the cache
+writes interleave.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic_ai.messages import ModelRequest, UserPromptPart
+
+from embedding_cache import DEFAULT_EMBEDDING_MODEL, EmbeddingCache, normalize_text
+
+DEFAULT_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 6 * 60 * 60))
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.93))
+DEFAULT_MAX_ENTRIES = 1000
+
+
+@dataclass
+class CachedResponse:
+    """A cached agent answer and the messages of the run that produced it."""
+
+    question: str
+    answer: str
+    messages: List[Any]
+    latency: float
+    created_at: float
+    version: str = ""
+    embedding: Optional[np.ndarray] = None
+    hits: int = field(default=0)
+
+    def messages_for(self, question: str) -> List[Any]:
+        """Return the cached messages with the user prompt replaced by question (for semantic hits)."""
+        if question == self.question:
+            return list(self.messages)
+        messages = []
+        for message in self.messages:
+            if isinstance(message, ModelRequest) and any(isinstance(part, UserPromptPart) for part in message.parts):
+                message = ModelRequest(parts=[
+                    UserPromptPart(content=question, timestamp=part.timestamp) if isinstance(part, UserPromptPart) else part
+                    for part in message.parts
+                ])
+            messages.append(message)
+        return messages
+
+
+class ResponseCache:
+    """Exact + semantic cache of first-turn answers with TTL and version-tagged entries."""
+
+    def __init__(
+        self,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        openai_client=None,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    ):
+        self.embedding_cache = embedding_cache
+        self.openai_client = openai_client
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.embedding_model = embedding_model
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.embedding_cache is not None and self.openai_client is not None
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, hit rate and the agent time saved by hits."""
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "lookups": lookups,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "invalidations": self.invalidations,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _expire(self, now: float) -> None:
+        # Entries are in insertion order, so expired ones are at the front
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if now - entry.created_at <= self.ttl_seconds and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def _record_hit(self, entry: CachedResponse, semantic: bool) -> CachedResponse:
+        entry.hits += 1
+        if semantic:
+            self.semantic_hits += 1
+        else:
+            self.exact_hits += 1
+        self.saved_seconds += entry.latency
+        return entry
+
+    async def _embed(self, question: str) -> Optional[np.ndarray]:
+        if not self.semantic_enabled:
+            return None
+        try:
+            embedding = await self.embedding_cache.embed(self.openai_client, question, model=self.embedding_model)
+        except Exception as e:
+            print(f"⚠️  Could not embed question for the response cache: {e}")
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def get(self, question: str, version: str = "") -> Optional[CachedResponse]:
+        """Return the cached response for a first-turn question answered with `version`, or None."""
+        key = normalize_text(question)
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.version == version:
+                    return self._record_hit(entry, semantic=False)
+                # Answered with another knowledge base or prompt: never served again
+                self._entries.pop(key)
+                self.invalidations += 1
+            candidates = [entry for entry in self._entries.values()
+                          if entry.embedding is not None and entry.version == version]
+
+        if candidates:
+            embedding = await self._embed(question)
+            if embedding is not None:
+                similarities = np.stack([entry.embedding for entry in candidates]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    with self._lock:
+                        return self._record_hit(candidates[best], semantic=True)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def put(self, question: str, answer: str, messages: List[Any], latency: float, version: str = "") -> None:
+        """Cache the answer and messages of an agent run for a first-turn question answered with `version`."""
+        if not answer:
+            return
+        embedding = await self._embed(question)
+        now = time.time()
+        with self._lock:
+            key = normalize_text(question)
+            self._entries.pop(key, None)
+            self._entries[key] = CachedResponse(
+                question=question,
+                answer=answer,
+                messages=list(messages),
+                latency=latency,
+                created_at=now,
+                embedding=embedding,
+                version=version,
+            )
+            self._expire(now)
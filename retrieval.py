@@ -0,0 +1,152 @@
+"""
+Hybrid retrieval for search_knowledge_base: BM25 + vector search, fused.
+
+The lexical indexes over the JSON knowledge base (knowledge_index.py) and
+the embedding search over site_pages (vector_store.py) find different
+things: BM25 is precise for treatment names and tags, embeddings catch
+paraphrases ("Schlupflider" -> Lidstraffung). Treatment and page hits form
+one lexical ranking, ordered by BM25 score, so a weak page match never
+ranks level with the best treatment. Lexical and vector search run
+concurrently and their rankings are merged with reciprocal rank fusion
+(RRF):
+
+    score(doc) = sum over rankings of 1 / (RRF_K + rank)
+
+Vector hits whose metadata points at a knowledge base treatment or page
+({"source": "hautlabor_kb", "type": "treatment", "id": ...}) are
+deduplicated with the lexical hits of the same document; other site_pages
+chunks are deduplicated by URL.
+
+Without a vector store, or if the query cannot be embedded, the lexical
+ranking is used on its own.
+
+The best treatment hits can be rendered with their full details page (the
+get_treatment_details output) instead of the summary, which saves the model
+the extra round trip of asking for the details of what it just found.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from knowledge_index import get_document_keys, get_page_index, get_rendered, get_treatment_index
+
+# Standard RRF constant; damps the influence of the very first ranks
+RRF_K = 60
+
+# Candidates taken from each ranking before fusion
+CANDIDATES_PER_RANKING = 10
+
+# Vector hits below this cosine similarity are ignored
+MIN_VECTOR_SIMILARITY = 0.3
+
+# Characters of a site_pages chunk shown when it has no summary
+MAX_CHUNK_CHARS = 800
+
+# Number of top treatment hits search_knowledge_base returns with their full details
+PREFETCHED_DETAILS = 2
+
+# Metadata "source" of site_pages rows that were ingested from the knowledge base
+KNOWLEDGE_BASE_SOURCE = "hautlabor_kb"
+
+DocumentKey = Tuple[str, Any]
+
+
+@dataclass
+class RetrievalHit:
+    """A fused search result: ("treatment", index), ("page", index) or ("url", url)."""
+
+    key: DocumentKey
+    score: float
+    text: str
+    detailed: bool = False
+
+
+def reciprocal_rank_fusion(rankings: List[List[DocumentKey]], k: int = RRF_K) -> Dict[DocumentKey, float]:
+    """Fuse several rankings (best first) into one RRF score per document."""
+    scores: Dict[DocumentKey, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def render_chunk(row: Dict[str, Any]) -> str:
+    """Render a site_pages chunk like the other search results."""
+    text = row.get("summary") or (row.get("content") or "")[:MAX_CHUNK_CHARS]
+    return f"\n## {row.get('title') or 'Seite'}\n{text}\n\nQuelle: {row.get('url', '')}\n"
+
+
+class HybridRetriever:
+    """Runs lexical and vector retrieval for one knowledge base snapshot and fuses them."""
+
+    def __init__(self, knowledge_base: Dict[str, Any], vector_store=None, embedding_cache=None, openai_client=None):
+        self.knowledge_base = knowledge_base
+        self.vector_store = vector_store
+        self.embedding_cache = embedding_cache
+        self.openai_client = openai_client
+
+    def lexical_ranking(self, query: str) -> List[DocumentKey]:
+        """Treatments and pages in one ranking by BM25 score (treatments first on ties)."""
+        scored = [(score, 0, ("treatment", i)) for i, score in get_treatment_index(self.knowledge_base).scores(query).items()]
+        scored += [(score, 1, ("page", i)) for i, score in get_page_index(self.knowledge_base).scores(query).items()]
+        scored.sort(key=lambda item: (-item[0], item[1], item[2][1]))
+        return [key for _, _, key in scored[:CANDIDATES_PER_RANKING]]
+
+    async def vector_ranking(self, query: str) -> Tuple[List[DocumentKey], Dict[DocumentKey, str]]:
+        """Vector ranking over site_pages plus the rendered text of chunks outside the knowledge base."""
+        if self.vector_store is None or self.embedding_cache is None or self.openai_client is None:
+            return [], {}
+        try:
+            embedding = await self.embedding_cache.embed(self.openai_client, query)
+        except Exception as e:
+            print(f"⚠️  Could not embed query for vector search: {e}")
+            return [], {}
+        rows = await asyncio.to_thread(self.vector_store.match_site_pages, embedding, CANDIDATES_PER_RANKING)
+
+        document_keys = get_document_keys(self.knowledge_base)
+        ranking: List[DocumentKey] = []
+        chunk_texts: Dict[DocumentKey, str] = {}
+        for row in rows:
+            if row["similarity"] < MIN_VECTOR_SIMILARITY:
+                continue
+            metadata = row.get("metadata") or {}
+            key = None
+            if metadata.get("source") == KNOWLEDGE_BASE_SOURCE:
+                key = document_keys.get((metadata.get("type"), metadata.get("id")))
+            if key is None:
+                key = ("url", row.get("url"))
+                chunk_texts.setdefault(key, render_chunk(row))
+            # Several chunks of one document count once, at the rank of the best chunk
+            if key not in ranking:
+                ranking.append(key)
+        return ranking, chunk_texts
+
+    async def search(self, query: str, top_k: int = 5, detailed_treatments: int = 0) -> List[RetrievalHit]:
+        """
+        Return the top_k fused results for a query, best first. The first
+        detailed_treatments treatment hits carry their full details page.
+        """
+        lexical, (vector, chunk_texts) = await asyncio.gather(
+            asyncio.to_thread(self.lexical_ranking, query),
+            self.vector_ranking(query),
+        )
+        scores = reciprocal_rank_fusion([lexical, vector])
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+
+        rendered = get_rendered(self.knowledge_base)
+        hits = []
+        for key, score in ranked:
+            kind, position = key
+            detailed = kind == "treatment" and detailed_treatments > 0
+            if detailed:
+                text = rendered.treatment_details[position]
+                detailed_treatments -= 1
+            elif kind == "treatment":
+                text = rendered.treatment_summaries[position]
+            elif kind == "page":
+                text = rendered.page_summaries[position]
+            else:
+                text = chunk_texts[key]
+            hits.append(RetrievalHit(key=key, score=score, text=text, detailed=detailed))
+        return hits
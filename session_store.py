@@ -0,0 +1,280 @@
+"""
+Bounded storage for per-session conversation history.
+
+Two interchangeable backends are provided:
+
+- MemorySessionStore: LRU + TTL eviction inside one process.
+- SQLiteSessionStore: a local SQLite file, so sessions survive restarts and
+  are shared by all gunicorn workers on the same machine.
+
+Both cap the number of messages kept per session. Histories are trimmed at
+user turns only, and the system prompt parts of the first message are
+carried over, because pydantic-ai only sends the system prompt as part of
+the first message of a history.
+"""
+
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    SystemPromptPart,
+    UserPromptPart,
+)
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_MESSAGES = 40
+DEFAULT_MAX_SESSIONS = 10_000
+DEFAULT_SQLITE_PATH = "sessions.sqlite3"
+
+# How many writes happen between sweeps of expired sessions in SQLite
+SWEEP_INTERVAL = 500
+
+
+def _starts_user_turn(message: ModelMessage) -> bool:
+    return isinstance(message, ModelRequest) and any(isinstance(part, UserPromptPart) for part in message.parts)
+
+
+def trim_history(messages: List[ModelMessage], max_messages: int) -> List[ModelMessage]:
+    """
+    Keep at most max_messages of the most recent history.
+
+    The kept history always starts at a user prompt (never in the middle of a
+    tool call exchange) and keeps the system prompt parts of the original
+    first message. If the latest user turn alone is longer than max_messages,
+    that whole turn is kept.
+    """
+    if len(messages) <= max_messages:
+        return messages
+
+    start = next(
+        (index for index in range(len(messages) - max_messages, len(messages)) if _starts_user_turn(messages[index])),
+        None,
+    )
+    if start is None:
+        start = next((index for index in range(len(messages) - max_messages - 1, -1, -1)
+                      if _starts_user_turn(messages[index])), None)
+        if start is None:
+            return []
+
+    system_parts = [part for part in messages[0].parts if isinstance(part, SystemPromptPart)]
+    first = messages[start]
+    if system_parts and not any(isinstance(part, SystemPromptPart) for part in first.parts):
+        first = ModelRequest(parts=system_parts + list(first.parts))
+    return [first] + messages[start + 1:]
+
+
+def serialize_messages(messages: List[ModelMessage]) -> bytes:
+    """Serialize a message history to compressed JSON."""
+    return zlib.compress(ModelMessagesTypeAdapter.dump_json(messages), 1)
+
+
+def deserialize_messages(data: bytes) -> List[ModelMessage]:
+    """Inverse of serialize_messages."""
+    return ModelMessagesTypeAdapter.validate_json(zlib.decompress(data))
+
+
+class SessionStore(ABC):
+    """Interface of the conversation history stores."""
+
+    @abstractmethod
+    def load(self, session_id: str) -> List[ModelMessage]:
+        """Return the history of a session (empty for unknown or expired sessions)."""
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[ModelMessage]) -> None:
+        """Append new messages to a session, trimming it to the message cap."""
+
+    @abstractmethod
+    def replace(self, session_id: str, messages: List[ModelMessage],
+                expected: Optional[List[ModelMessage]] = None) -> bool:
+        """
+        Overwrite the history of a session, e.g. with a compacted version of it.
+        With `expected` (the history the new one was derived from), nothing is
+        written if the session changed meanwhile, so concurrent appends are
+        never lost. Returns whether the history was written.
+        """
+
+    @abstractmethod
+    def reset(self, session_id: str) -> None:
+        """Forget a session."""
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with LRU eviction, idle TTL and a per-session message cap."""
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_messages: int = DEFAULT_MAX_MESSAGES,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, Tuple[float, List[ModelMessage]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, now: float) -> None:
+        # Sessions are ordered by last access, so expired ones are at the front
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.pop(session_id)
+
+    def load(self, session_id: str) -> List[ModelMessage]:
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def append(self, session_id: str, messages: List[ModelMessage]) -> None:
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            history = (entry[1] if entry else []) + list(messages)
+            self._sessions[session_id] = (now, trim_history(history, self.max_messages))
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+    def replace(self, session_id: str, messages: List[ModelMessage],
+                expected: Optional[List[ModelMessage]] = None) -> bool:
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if expected is not None and (entry[1] if entry else []) != expected:
+                return False
+            self._sessions[session_id] = (now, trim_history(list(messages), self.max_messages))
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return True
+
+    def reset(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store backed by a local SQLite file, shared by all processes using the same path."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_SQLITE_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_messages: int = DEFAULT_MAX_MESSAGES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._connection.execute("pragma journal_mode=wal")
+        self._connection.execute(
+            """
+            create table if not exists sessions (
+                session_id text primary key,
+                messages blob not null,
+                updated_at real not null
+            )
+            """
+        )
+        self._connection.execute("create index if not exists idx_sessions_updated_at on sessions (updated_at)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("select count(*) from sessions").fetchone()[0]
+
+    def _load(self, session_id: str, now: float) -> List[ModelMessage]:
+        row = self._connection.execute(
+            "select messages from sessions where session_id = ? and updated_at >= ?",
+            (session_id, now - self.ttl_seconds),
+        ).fetchone()
+        return deserialize_messages(row[0]) if row else []
+
+    def load(self, session_id: str) -> List[ModelMessage]:
+        with self._lock:
+            return self._load(session_id, time.time())
+
+    def append(self, session_id: str, messages: List[ModelMessage]) -> None:
+        now = time.time()
+        with self._lock:
+            # "begin immediate" takes the write lock up front, so concurrent workers cannot interleave
+            self._connection.execute("begin immediate")
+            try:
+                history = trim_history(self._load(session_id, now) + list(messages), self.max_messages)
+                self._connection.execute(
+                    "insert or replace into sessions (session_id, messages, updated_at) values (?, ?, ?)",
+                    (session_id, serialize_messages(history), now),
+                )
+                self._writes += 1
+                if self._writes % SWEEP_INTERVAL == 0:
+                    self._connection.execute("delete from sessions where updated_at < ?", (now - self.ttl_seconds,))
+                self._connection.execute("commit")
+            except Exception:
+                self._connection.execute("rollback")
+                raise
+
+    def replace(self, session_id: str, messages: List[ModelMessage],
+                expected: Optional[List[ModelMessage]] = None) -> bool:
+        history = trim_history(list(messages), self.max_messages)
+        now = time.time()
+        with self._lock:
+            # Compare and write under the write lock, like append
+            self._connection.execute("begin immediate")
+            try:
+                if expected is not None and self._load(session_id, now) != expected:
+                    self._connection.execute("rollback")
+                    return False
+                self._connection.execute(
+                    "insert or replace into sessions (session_id, messages, updated_at) values (?, ?, ?)",
+                    (session_id, serialize_messages(history), now),
+                )
+                self._connection.execute("commit")
+                return True
+            except Exception:
+                self._connection.execute("rollback")
+                raise
+
+    def reset(self, session_id: str) -> None:
+        with self._lock:
+            self._connection.execute("delete from sessions where session_id = ?", (session_id,))
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    """
+    Create the session store configured through the environment:
+    SESSION_STORE (sqlite|memory), SESSION_DB_PATH, SESSION_TTL_SECONDS,
+    SESSION_MAX_MESSAGES and SESSION_MAX_SESSIONS (memory only).
+    """
+    backend = backend or os.getenv("SESSION_STORE", "sqlite")
+    ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    max_messages = int(os.getenv("SESSION_MAX_MESSAGES", DEFAULT_MAX_MESSAGES))
+
+    if backend == "memory":
+        max_sessions = int(os.getenv("SESSION_MAX_SESSIONS", DEFAULT_MAX_SESSIONS))
+        return MemorySessionStore(max_sessions=max_sessions, ttl_seconds=ttl_seconds, max_messages=max_messages)
+    if backend == "sqlite":
+        path = os.getenv("SESSION_DB_PATH", DEFAULT_SQLITE_PATH)
+        return SQLiteSessionStore(path, ttl_seconds=ttl_seconds, max_messages=max_messages)
+    raise ValueError(f"Unknown session store backend: {backend}")
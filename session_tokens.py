@@ -0,0 +1,54 @@
+"""
+Server-issued, signed session ids.
+
+The chat widget stores the session id it receives in the X-Session-ID
+response header and sends it back with every request. Ids are random and
+carry an HMAC signature, so clients cannot pick (or guess) the id of
+another visitor's session: a missing, malformed or forged id gets a fresh
+session instead of a shared or foreign history.
+
+The signing key is SESSION_SECRET. Without it a random key is generated
+per process, which means sessions do not survive a restart.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Optional
+
+SESSION_ID_BYTES = 16
+SIGNATURE_BYTES = 16
+
+
+def _sign(secret: bytes, session_id: str) -> str:
+    digest = hmac.new(secret, session_id.encode("ascii"), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+class SessionTokens:
+    """Issue and verify signed session ids of the form "<id>.<signature>"."""
+
+    def __init__(self, secret: Optional[str] = None):
+        secret = secret or os.getenv("SESSION_SECRET")
+        if not secret:
+            print("⚠️  SESSION_SECRET is not set, sessions will not survive a restart")
+            secret = secrets.token_hex(32)
+        self._secret = secret.encode("utf-8")
+
+    def issue(self) -> str:
+        """A new, signed session id."""
+        session_id = secrets.token_hex(SESSION_ID_BYTES)
+        return f"{session_id}.{_sign(self._secret, session_id)}"
+
+    def verify(self, token: Optional[str]) -> Optional[str]:
+        """Return the token if it was issued with our secret, else None."""
+        if not token or token.count(".") != 1:
+            return None
+        session_id, signature = token.split(".")
+        if len(session_id) != 2 * SESSION_ID_BYTES or not all(c in "0123456789abcdef" for c in session_id):
+            return None
+        if not hmac.compare_digest(signature, _sign(self._secret, session_id)):
+            return None
+        return token
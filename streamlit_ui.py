@@ -1,10 +1,9 @@
 from __future__ import annotations
-from typing import Literal, TypedDict
-import asyncio
-import os
+from typing import Callable, List, Literal, Optional, Tuple, TypedDict
+import queue
+from datetime import datetime
 
 import streamlit as st
-import json
 import logfire
 
 # Configure Streamlit page
@@ -14,33 +13,29 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
-from supabase import Client
 from openai import AsyncOpenAI
 
 # Import all the message part classes
 from pydantic_ai.messages import (
     ModelMessage,
-    ModelRequest,
     ModelResponse,
-    SystemPromptPart,
-    UserPromptPart,
     TextPart,
-    ToolCallPart,
-    ToolReturnPart,
-    RetryPromptPart,
-    ModelMessagesTypeAdapter
 )
-from pydantic_ai_expert import clinic_ai_expert, ClinicAIDeps
+from pydantic_ai_expert import clinic_ai_expert, ClinicAIDeps, KNOWLEDGE_BASE_FILE, openai_client, system_prompt
+from knowledge_manager import KnowledgeBaseManager
+from event_loop import BackgroundEventLoop, get_event_loop
+from history_compaction import compact_history, openai_summarizer
+from prompt_layout import with_static_prefix
+from embedding_cache import EmbeddingCache
+from vector_store import vector_store_directory
+from web_search_cache import WebSearchCache
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-supabase: Client = Client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_KEY")
-)
+AGENT_TIMEOUT = 60  # seconds
+MAX_VISIBLE_MESSAGES = 20  # transcript entries redrawn on every rerun
 
 # Configure logfire to suppress warnings (optional)
 logfire.configure(send_to_logfire='never')
@@ -53,84 +48,138 @@ class ChatMessage(TypedDict):
     content: str
 
 
-def display_message_part(part):
-    """
-    Display a single part of a message in the Streamlit UI.
-    Customize how you display system prompts, user prompts,
-    tool calls, tool returns, etc.
-    """
-    # system-prompt
-    if part.part_kind == 'system-prompt':
-        with st.chat_message("system"):
-            st.markdown(f"**System**: {part.content}")
-    # user-prompt
-    elif part.part_kind == 'user-prompt':
-        with st.chat_message("user"):
-            st.markdown(part.content)
-    # text
-    elif part.part_kind == 'text':
-        with st.chat_message("assistant"):
-            st.markdown(part.content)          
+# Process-wide resources: created on the first script run and shared by all
+# reruns and browser sessions, instead of being rebuilt on every rerun.
+
+def get_openai_client() -> AsyncOpenAI:
+    # The agent's client, so all OpenAI calls share one connection pool
+    return openai_client
+
+
+@st.cache_resource
+def get_summarizer() -> Callable:
+    return openai_summarizer(get_openai_client())
+
+
+@st.cache_resource
+def get_knowledge_base_manager() -> KnowledgeBaseManager:
+    # The knowledge base, its indexes and the vector store are built once and hot-reloaded when their files change
+    return KnowledgeBaseManager(KNOWLEDGE_BASE_FILE, vector_store_dir=vector_store_directory()).start()
+
+
+@st.cache_resource
+def get_agent_loop() -> BackgroundEventLoop:
+    # All agent runs share one long-lived event loop (and with it the OpenAI connection pools)
+    return get_event_loop()
+
 
+@st.cache_resource
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache()
 
-async def run_agent_with_streaming(user_input: str):
+
+@st.cache_resource
+def get_web_search_cache() -> WebSearchCache:
+    return WebSearchCache()
+
+
+def chat_message(role: Literal['user', 'model'], content: str) -> ChatMessage:
+    return ChatMessage(role=role, timestamp=datetime.now().isoformat(), content=content)
+
+
+def display_message(message: ChatMessage):
+    """Display one transcript entry in the Streamlit UI."""
+    with st.chat_message("user" if message['role'] == 'user' else "assistant"):
+        st.markdown(message['content'])
+
+
+async def stream_agent(user_input: str, history: List[ModelMessage], deps: ClinicAIDeps,
+                       summarize: Callable, deltas: "queue.Queue[str]") -> Tuple[List[ModelMessage], str]:
     """
-    Run the agent with streaming text for the user_input prompt,
-    while maintaining the entire conversation in `st.session_state.messages`.
+    Stream the answer to user_input into the deltas queue.
+
+    Runs on the shared event loop, so it gets the history as an argument
+    instead of reading st.session_state. Returns the new history (compacted,
+    plus this turn) and the full answer.
     """
-    # Prepare dependencies
-    deps = ClinicAIDeps(
-        supabase=supabase,
-        openai_client=openai_client
-    )
+    # Older turns are summarized once here and the compacted history is kept, not recomputed every turn
+    history = await compact_history(history, summarize=summarize)
 
-    # Run the agent in a stream
     async with clinic_ai_expert.run_stream(
         user_input,
         deps=deps,
-        message_history= st.session_state.messages[:-1],  # pass entire conversation so far
+        message_history=with_static_prefix(history, system_prompt),
     ) as result:
-        # We'll gather partial text to show incrementally
-        partial_text = ""
-        message_placeholder = st.empty()
+        response_text = ""
+        async for delta in result.stream_text(delta=True):
+            response_text += delta
+            deltas.put(delta)
+
+        # stream_text(delta=True) does not record the final response, so add it ourselves
+        new_messages = result.new_messages() + [ModelResponse(parts=[TextPart(content=response_text)])]
 
-        # Render partial text as it arrives
-        async for chunk in result.stream_text(delta=True):
-            partial_text += chunk
+    return history + new_messages, response_text
+
+
+def run_agent_with_streaming(user_input: str) -> str:
+    """
+    Run the agent on the shared event loop and render its answer as it
+    arrives; the conversation is kept in `st.session_state.messages`.
+    """
+    # One knowledge base snapshot for the whole run, even if a reload happens meanwhile
+    deps = ClinicAIDeps(
+        knowledge_base=get_knowledge_base_manager().current,
+        openai_client=get_openai_client(),
+        vector_store=get_knowledge_base_manager().vector_store,
+        embedding_cache=get_embedding_cache(),
+        web_search_cache=get_web_search_cache()
+    )
+
+    deltas = queue.Queue()
+    future = get_agent_loop().submit(stream_agent(user_input, st.session_state.messages, deps, get_summarizer(), deltas))
+    future.add_done_callback(lambda _: deltas.put(None))
+
+    # Elements can only be updated from the script thread, so the deltas are rendered here
+    partial_text = ""
+    message_placeholder = st.empty()
+    try:
+        while (delta := deltas.get(timeout=AGENT_TIMEOUT)) is not None:
+            partial_text += delta
             message_placeholder.markdown(partial_text)
+    except queue.Empty:
+        future.cancel()
+        message_placeholder.error("Zeitüberschreitung bei der Verarbeitung Ihrer Anfrage.")
+        return ""
 
-        # Now that the stream is finished, we have a final result.
-        # Add new messages from this run, excluding user-prompt messages
-        filtered_messages = [msg for msg in result.new_messages() 
-                            if not (hasattr(msg, 'parts') and 
-                                    any(part.part_kind == 'user-prompt' for part in msg.parts))]
-        st.session_state.messages.extend(filtered_messages)
+    if future.cancelled() or future.exception():
+        print(f"Error in agent run: {future.exception() if not future.cancelled() else 'cancelled'}")
+        message_placeholder.error("Entschuldigung, es gab einen Fehler bei der Verarbeitung Ihrer Anfrage. Bitte versuchen Sie es erneut.")
+        return ""
 
-        # Add the final response to the messages
-        st.session_state.messages.append(
-            ModelResponse(parts=[TextPart(content=partial_text)])
-        )
+    st.session_state.messages, response_text = future.result()
+    message_placeholder.markdown(response_text)
+    return response_text
 
 
-async def main():
+def main():
     st.title("🏥 Haut Labor Oldenburg - AI Consultant")
     st.write("Ask me anything about aesthetic treatments, procedures, and services at Haut Labor Oldenburg clinic in Germany.")
-    
+
     # Sidebar with clinic information
     with st.sidebar:
         st.header("📍 Clinic Information")
         st.write("**Haut Labor Oldenburg**")
         st.write("Dr. Larisa Pfahl - Gynecologist")
         st.write("Specialized in minimally invasive aesthetic treatments")
-        
+
         st.divider()
-        
+
         st.header("📞 Contact")
         st.write("**Phone:** +49 (0) 157 834 488 90")
         st.write("**Email:** info@haut-labor.de")
-        
+
         st.divider()
-        
+
         st.header("💡 Example Questions")
         example_questions = [
             "What treatments are available for wrinkle reduction?",
@@ -142,31 +191,36 @@ async def main():
             "How do I book an appointment?",
             "What are the laser hair removal options?"
         ]
-        
+
         for question in example_questions:
             if st.button(question, key=f"example_{hash(question)}"):
                 st.session_state.example_question = question
                 st.rerun()
-                
+
         st.divider()
-        
+
         # Clear chat button
         if st.button("🗑️ Clear Chat", key="clear_chat"):
             st.session_state.messages = []
+            st.session_state.transcript = []
             st.rerun()
 
-    # Initialize chat history in session state if not present
+    # The agent history (pydantic-ai messages) and the rendered transcript are kept
+    # separately: the transcript holds one markdown entry per visible message, so a
+    # rerun never walks or filters the message parts of the whole conversation.
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    
+    if "transcript" not in st.session_state:
+        st.session_state.transcript = []
+
     # Show welcome message if no messages yet
-    if len(st.session_state.messages) == 0:
+    if len(st.session_state.transcript) == 0:
         st.info("👋 Welcome to Haut Labor Oldenburg! I'm here to help you learn about our aesthetic treatments and services. Feel free to ask me anything or click on the example questions in the sidebar.")
-        
+
         # Display treatment categories
         st.subheader("🎆 Our Treatment Categories")
         col1, col2, col3 = st.columns(3)
-        
+
         with col1:
             st.write("**💆 Facial Treatments**")
             st.write("• Botox/Faltenrelaxan")
@@ -174,14 +228,14 @@ async def main():
             st.write("• HydraFacial")
             st.write("• Morpheus8")
             st.write("• Ultherapy")
-            
+
         with col2:
             st.write("**✨ Laser Treatments**")
             st.write("• CO2 Laser")
             st.write("• LaseMD")
             st.write("• Lumecca")
             st.write("• Hair Removal")
-            
+
         with col3:
             st.write("**👨 Specialized Services**")
             st.write("• Treatments for Men")
@@ -189,13 +243,16 @@ async def main():
             st.write("• Aesthetic Gynecology")
             st.write("• Skin Analysis")
 
-    # Display all messages from the conversation so far
-    # Each message is either a ModelRequest or ModelResponse.
-    # We iterate over their parts to decide how to display them.
-    for msg in st.session_state.messages:
-        if isinstance(msg, ModelRequest) or isinstance(msg, ModelResponse):
-            for part in msg.parts:
-                display_message_part(part)
+    # Display the latest turns of the conversation from the prerendered transcript.
+    # Streamlit redraws every element on each rerun, so the visible history is capped
+    # to keep a rerun equally cheap in long conversations; the agent still gets the
+    # full (compacted) history.
+    transcript = st.session_state.transcript
+    hidden = len(transcript) - MAX_VISIBLE_MESSAGES
+    if hidden > 0:
+        st.caption(f"{hidden} earlier messages are not shown.")
+    for message in transcript[-MAX_VISIBLE_MESSAGES:]:
+        display_message(message)
 
     # Check if an example question was clicked
     if "example_question" in st.session_state:
@@ -206,20 +263,18 @@ async def main():
         user_input = st.chat_input("What questions do you have about our aesthetic treatments?")
 
     if user_input:
-        # We append a new request to the conversation explicitly
-        st.session_state.messages.append(
-            ModelRequest(parts=[UserPromptPart(content=user_input)])
-        )
-        
         # Display user prompt in the UI
-        with st.chat_message("user"):
-            st.markdown(user_input)
+        user_message = chat_message('user', user_input)
+        display_message(user_message)
 
         # Display the assistant's partial response while streaming
         with st.chat_message("assistant"):
-            # Actually run the agent now, streaming the text
-            await run_agent_with_streaming(user_input)
+            response_text = run_agent_with_streaming(user_input)
+
+        # Only the new turn is added; earlier entries are not touched
+        if response_text:
+            st.session_state.transcript.extend([user_message, chat_message('model', response_text)])
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+A local OpenAI-compatible stub server for offline load tests.
+
+Serves the endpoints the chatbot uses, without cost or rate limits:
+
+- POST /v1/chat/completions: answers follow a script of steps, e.g. first a
+  search_knowledge_base tool call, then a German text answer. Both plain
+  and streamed (SSE) responses are supported, with a configurable time to
+  the first token and per-token latency.
+- POST /v1/embeddings: deterministic pseudo-random unit vectors per text.
+- POST /v1/responses: a canned web search result.
+- GET /stats: request counters.
+
+Point the app (and with it clinic_ai_expert) at the stub through the
+environment variables read by the OpenAI client:
+
+    python stub_llm_server.py --port 8090 --ttft-ms 300 --token-ms 20 [--script script.json]
+    OPENAI_BASE_URL=http://localhost:8090/v1 OPENAI_API_KEY=sk-stub python app.py
+
+A script is a JSON list of steps. The step used for a request is the
+number of assistant messages since the last user message, so a turn walks
+through the steps in order (the last step repeats). A step is either
+{"text": "..."} or {"tool_calls": [{"name": ..., "arguments": {...}}]};
+"{prompt}" in a text or argument is replaced by the user's message. Tool
+calls to tools the request does not offer (e.g. the summarizer) fall
+back to a text answer.
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from flask import Flask, Response, jsonify, request
+
+DEFAULT_PORT = 8090
+DEFAULT_TTFT_MS = 300
+DEFAULT_TOKEN_MS = 20
+DEFAULT_COMPLETION_TOKENS = 120
+EMBEDDING_DIMENSIONS = 1536
+
+DEFAULT_ANSWER = (
+    "Vielen Dank für Ihre Frage: {prompt} Gerne gebe ich Ihnen einen Überblick über die passende Behandlung, "
+    "den Ablauf, die Kosten und die Ausfallzeit. Für eine individuelle Beratung vereinbaren Sie bitte einen "
+    "Termin bei Dr. med. Lara Pfahl im Hautlabor Oldenburg."
+)
+
+DEFAULT_SCRIPT = [
+    {"tool_calls": [{"name": "search_knowledge_base", "arguments": {"user_query": "{prompt}"}}]},
+    {"text": DEFAULT_ANSWER},
+]
+
+WEB_SEARCH_RESULT = "Aktuelle Ergebnisse der Websuche (Stub): keine neuen Entwicklungen gefunden."
+
+
+@dataclass
+class StubConfig:
+    ttft_seconds: float = DEFAULT_TTFT_MS / 1000
+    token_seconds: float = DEFAULT_TOKEN_MS / 1000
+    completion_tokens: int = DEFAULT_COMPLETION_TOKENS
+    script: List[Dict[str, Any]] = field(default_factory=lambda: list(DEFAULT_SCRIPT))
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """The text of a chat message, whose content is a string or a list of parts."""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(message_text(message)) for message in messages) // 4
+
+
+def answer_tokens(template: str, prompt: str, count: int) -> List[str]:
+    """The answer as `count` word tokens, repeating the template as needed."""
+    words = template.replace("{prompt}", prompt).split()
+    return [words[i % len(words)] + " " for i in range(count)]
+
+
+def fill_prompt(value: Any, prompt: str) -> Any:
+    if isinstance(value, str):
+        return value.replace("{prompt}", prompt)
+    if isinstance(value, dict):
+        return {key: fill_prompt(item, prompt) for key, item in value.items()}
+    return value
+
+
+def embedding(text: str) -> List[float]:
+    """A deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS)
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+
+class StubLLM:
+    """The scripted model behind the endpoints, with request counters."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self.counters = {"chat_completions": 0, "streamed": 0, "tool_calls": 0, "embeddings": 0, "responses": 0,
+                         "in_flight": 0, "max_in_flight": 0}
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.counters["in_flight"])
+
+    def step(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """The script step for a chat completion request, with the prompt filled in."""
+        messages = body.get("messages", [])
+        last_user = max((i for i, message in enumerate(messages) if message.get("role") == "user"), default=-1)
+        prompt = message_text(messages[last_user]) if last_user >= 0 else ""
+        done = sum(1 for message in messages[last_user + 1:] if message.get("role") == "assistant")
+        step = self.config.script[min(done, len(self.config.script) - 1)]
+
+        offered = {tool.get("function", {}).get("name") for tool in body.get("tools") or []}
+        tool_calls = [call for call in step.get("tool_calls", []) if call["name"] in offered]
+        if tool_calls:
+            return {"tool_calls": [
+                {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                 "function": {"name": call["name"], "arguments": json.dumps(fill_prompt(call.get("arguments", {}), prompt), ensure_ascii=False)}}
+                for call in tool_calls
+            ]}
+        return {"tokens": answer_tokens(step.get("text", DEFAULT_ANSWER), prompt, self.config.completion_tokens)}
+
+    def usage(self, body: Dict[str, Any], completion_tokens: int) -> Dict[str, Any]:
+        prompt_tokens = estimate_tokens(body.get("messages", []))
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0}}
+
+    def completion(self, body: Dict[str, Any], step: Dict[str, Any]) -> Dict[str, Any]:
+        """A complete (non-streamed) chat completion, after the simulated generation time."""
+        tokens = step.get("tokens", [])
+        time.sleep(self.config.ttft_seconds + self.config.token_seconds * len(tokens))
+        message: Dict[str, Any] = {"role": "assistant", "content": "".join(tokens).strip() or None}
+        if "tool_calls" in step:
+            message["tool_calls"] = step["tool_calls"]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if "tool_calls" in step else "stop"}],
+            "usage": self.usage(body, len(tokens) or len(step.get("tool_calls", []))),
+        }
+
+    def stream(self, body: Dict[str, Any], step: Dict[str, Any]) -> Iterator[str]:
+        """A streamed chat completion as Server-Sent Events, one token per chunk."""
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, usage=None) -> str:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+                    "usage": usage}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        tokens = step.get("tokens", [])
+        time.sleep(self.config.ttft_seconds)
+        if "tool_calls" in step:
+            for index, call in enumerate(step["tool_calls"]):
+                yield chunk({"role": "assistant", "tool_calls": [dict(call, index=index)]})
+            yield chunk({}, "tool_calls")
+        else:
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(self.config.token_seconds)
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield chunk({}, usage=self.usage(body, len(tokens) or len(step.get("tool_calls", []))))
+        yield "data: [DONE]\n\n"
+
+
+def create_app(config: Optional[StubConfig] = None) -> Flask:
+    """The Flask app of the stub server."""
+    stub = StubLLM(config or StubConfig())
+    app = Flask(__name__)
+    app.config["stub"] = stub
+
+    @app.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        body = request.get_json(force=True)
+        step = stub.step(body)
+        stub.count("chat_completions")
+        stub.count("tool_calls", len(step.get("tool_calls", [])))
+        if not body.get("stream"):
+            stub.count("in_flight")
+            try:
+                return jsonify(stub.completion(body, step))
+            finally:
+                stub.count("in_flight", -1)
+
+        stub.count("streamed")
+
+        def generate():
+            stub.count("in_flight")
+            try:
+                yield from stub.stream(body, step)
+            finally:
+                stub.count("in_flight", -1)
+
+        return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @app.route("/v1/embeddings", methods=["POST"])
+    def embeddings():
+        body = request.get_json(force=True)
+        texts = body.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        stub.count("embeddings")
+        return jsonify({
+            "object": "list",
+            "model": body.get("model", "stub"),
+            "data": [{"object": "embedding", "index": i, "embedding": embedding(text)} for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": sum(len(text) for text in texts) // 4, "total_tokens": sum(len(text) for text in texts) // 4},
+        })
+
+    @app.route("/v1/responses", methods=["POST"])
+    def responses():
+        body = request.get_json(force=True)
+        stub.count("responses")
+        time.sleep(stub.config.ttft_seconds)
+        return jsonify({
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": body.get("model", "stub"),
+            "status": "completed",
+            "output": [{"type": "message", "id": f"msg_{uuid.uuid4().hex}", "role": "assistant", "status": "completed",
+                        "content": [{"type": "output_text", "text": WEB_SEARCH_RESULT, "annotations": []}]}],
+        })
+
+    @app.route("/stats")
+    def stats():
+        return jsonify(stub.counters)
+
+    return app
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server for offline load tests")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ttft-ms", type=float, default=DEFAULT_TTFT_MS, help="time to the first token")
+    parser.add_argument("--token-ms", type=float, default=DEFAULT_TOKEN_MS, help="latency per generated token")
+    parser.add_argument("--tokens", type=int, default=DEFAULT_COMPLETION_TOKENS, help="tokens per text answer")
+    parser.add_argument("--script", help="JSON file with the response steps (default: search_knowledge_base, then text)")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(ttft_seconds=args.ttft_ms / 1000, token_seconds=args.token_ms / 1000, completion_tokens=args.tokens)
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            config.script = json.load(f)
+
+    print(f"🤖 Stub LLM server on http://localhost:{args.port}/v1 "
+          f"(TTFT {args.ttft_ms:g} ms, {args.token_ms:g} ms/token, {args.tokens} tokens)")
+    create_app(config).run(host="0.0.0.0", port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline tool benchmark
+"""
+
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-test")
+
+from benchmark_tools import compare_results, percentile, run_benchmark, scale_knowledge_base
+from pydantic_ai_expert import KNOWLEDGE_BASE_FILE
+
+
+def load_data():
+    with open(KNOWLEDGE_BASE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_scale_knowledge_base():
+    """Scaled copies get unique ids and names and leave the pages alone"""
+    data = load_data()
+    scaled = scale_knowledge_base(data, 3)
+    treatments = scaled["treatments"]
+    assert len(treatments) == 3 * len(data["treatments"])
+    assert len({t["id"] for t in treatments}) == len(treatments)
+    assert len({t["treatment_name"] for t in treatments}) == len(treatments)
+    assert treatments[0] == data["treatments"][0]
+    assert scaled["pages"] == data["pages"]
+    print(f"✅ Knowledge base scaled to {len(treatments)} treatments")
+
+
+def test_percentile():
+    """Nearest-rank percentiles"""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([7.0], 0.99) == 7.0
+    print("✅ Percentiles")
+
+
+def test_run_benchmark_and_compare():
+    """Every tool is measured per scale, and slower p95 latencies are reported as regressions"""
+    results = {"scales": run_benchmark(load_data(), [1, 2], repeats=1)}
+    assert set(results["scales"]) == {"1", "2"}
+    tools = results["scales"]["2"]["tools"]
+    assert set(tools) == {"search_treatments", "search_pages", "search_knowledge_base",
+                          "get_treatment_details", "list_treatments_by_category"}
+    for stats in tools.values():
+        assert 0 < stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+        assert "peak_rss_mb" not in stats
+    assert results["scales"]["1"]["peak_rss_mb"] > 0
+
+    faster = json.loads(json.dumps(results))
+    for stats in faster["scales"]["1"]["tools"].values():
+        stats["p95_ms"] /= 10
+    assert compare_results(results, results) == []
+    assert len(compare_results(faster, results)) == len(tools)
+    print("✅ Benchmark run and compared")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Tool Benchmark")
+    print("=" * 50)
+
+    test_scale_knowledge_base()
+    test_percentile()
+    test_run_benchmark_and_compare()
+
+    print("\n🎉 All benchmark tests passed!")
+
+
+if __name__ == "__main__":
+    main()
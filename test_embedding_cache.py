@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for the embedding cache
+Uses a fake embeddings client, so no OpenAI key is needed.
+"""
+
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+import embedding_cache
+from embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+
+
+class FakeEmbeddingsClient:
+    """Stands in for AsyncOpenAI and records every embeddings.create call"""
+
+    def __init__(self):
+        self.calls = []
+        self.embeddings = self
+
+    async def create(self, model, input):
+        self.calls.append(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text)), 1.0, 0.5]) for text in input])
+
+
+def test_repeat_queries_hit_cache():
+    """Repeated and trivially different questions are embedded once"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(os.path.join(directory, "cache.sqlite3"))
+        client = FakeEmbeddingsClient()
+
+        first = asyncio.run(cache.embed(client, "Was kostet Botox?"))
+        second = asyncio.run(cache.embed(client, "  was kostet   BOTOX? "))
+
+        assert first == second == [17.0, 1.0, 0.5]
+        assert len(client.calls) == 1
+        assert cache.stats["memory_hits"] == 1
+        cache.close()
+    print("✅ Repeat queries served from cache")
+
+
+def test_batch_only_embeds_missing_texts():
+    """A batch sends only uncached, deduplicated texts to the API"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(os.path.join(directory, "cache.sqlite3"))
+        client = FakeEmbeddingsClient()
+
+        asyncio.run(cache.embed(client, "Morpheus8"))
+        results = asyncio.run(cache.embed_many(client, ["Morpheus8", "HydraFacial", "hydrafacial"]))
+
+        assert client.calls == [["Morpheus8"], ["HydraFacial"]]
+        assert results[1] == results[2]
+        cache.close()
+    print("✅ Batches only embed missing texts")
+
+
+def test_persistence_and_eviction():
+    """Entries survive a restart and the disk tier stays bounded"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite3")
+        cache = EmbeddingCache(path, memory_entries=2, disk_entries=3)
+        cache.put_many([f"text {i}" for i in range(5)], [[float(i)] for i in range(5)])
+        assert cache.stats["memory_size"] == 2
+        assert cache.stats["disk_size"] == 3
+        cache.close()
+
+        reopened = EmbeddingCache(path)
+        assert reopened.get("text 4") == [4.0]
+        assert reopened.get("text 0") is None
+        assert reopened.stats["disk_hits"] == 1
+        assert reopened.stats["misses"] == 1
+        assert reopened.get("text 4", model="other-model") is None
+        reopened.close()
+
+        # All lookups of a batch in one call: memory, disk and misses
+        batched = EmbeddingCache(path)
+        batched.get("text 4")
+        assert batched.get_many(["text 4", "text 3", "text 0", "TEXT 3"]) == [[4.0], [3.0], None, [3.0]]
+        assert (batched.stats["memory_hits"], batched.stats["disk_hits"], batched.stats["misses"]) == (1, 3, 1)
+        batched.close()
+
+        # Eviction runs once enough embeddings were written, not on every write
+        bounded = EmbeddingCache(os.path.join(directory, "bounded.sqlite3"), disk_entries=10)
+        for batch in range(3):
+            bounded.put_many([f"batch {batch} text {i}" for i in range(4)], [[float(i)] for i in range(4)])
+            assert bounded.stats["disk_size"] == (4, 8, 10)[batch]
+        bounded.close()
+
+    # The default file does not depend on the working directory
+    assert os.path.dirname(DEFAULT_CACHE_PATH) == os.path.dirname(os.path.abspath(embedding_cache.__file__))
+    print("✅ Persistence and bounded eviction")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Embedding Cache")
+    print("=" * 50)
+
+    test_repeat_queries_hit_cache()
+    test_batch_only_embeds_missing_texts()
+    test_persistence_and_eviction()
+
+    print("\n🎉 All embedding cache tests passed!")
+
+
+if __name__ == "__main__":
+    main()
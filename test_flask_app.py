@@ -4,7 +4,11 @@ Test script for the Flask application endpoints
 """
 
 import requests
+import atexit
 import json
+import os
+import shutil
+import tempfile
 import time
 
 def test_health_endpoint():
@@ -69,6 +73,65 @@ def test_chat_endpoint():
         print(f"❌ Chat endpoint error: {e}")
         return False
 
+def parse_sse(body):
+    """Split a Server-Sent Events body into (event, data) pairs"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = block.split("\n")
+        assert lines[0].startswith("event: ") and lines[1].startswith("data: "), block
+        events.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return events
+
+def test_chat_stream_endpoint():
+    """The SSE route streams deltas and a done event (or an error event) and stores the session; runs offline"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline-test")
+    os.environ.setdefault("SESSION_STORE", "memory")
+    state_dir = tempfile.mkdtemp(prefix="test_flask_app_")
+    atexit.register(shutil.rmtree, state_dir, True)
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(state_dir, "embedding_cache.sqlite3"))
+    os.environ.setdefault("KNOWLEDGE_SNAPSHOT_PATH", os.path.join(state_dir, "knowledge_base.snapshot"))
+    import app as app_module
+    from pydantic_ai.models.function import FunctionModel
+
+    # No embeddings from the OpenAI API for the response cache
+    app_module.response_cache.openai_client = None
+
+    async def stream_answer(messages, info):
+        for delta in ["HydraFacial ", "kostet ", "ab 150 €."]:
+            yield delta
+
+    async def stream_error(messages, info):
+        yield "Hydra"
+        raise RuntimeError("Modell nicht erreichbar")
+
+    client = app_module.app.test_client()
+    with app_module.clinic_ai_expert.override(model=FunctionModel(stream_function=stream_answer)):
+        response = client.post("/api/chat/stream", json={"message": "Was kostet eine HydraFacial-Behandlung?"})
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+        events = parse_sse(response.get_data(as_text=True))
+
+    # pydantic-ai may group chunks that arrive together into one delta
+    assert {event for event, _ in events[:-1]} == {"delta"} and events[-1][0] == "done"
+    assert "".join(data["delta"] for event, data in events if event == "delta") == "HydraFacial kostet ab 150 €."
+    assert events[-1][1]["message"] == "HydraFacial kostet ab 150 €."
+
+    # The turn is stored once the stream is done
+    session_id = response.headers["X-Session-ID"]
+    history = app_module.session_store.load(session_id)
+    assert history[0].parts[-1].content == "Was kostet eine HydraFacial-Behandlung?"
+    assert history[-1].parts[0].content == "HydraFacial kostet ab 150 €."
+
+    with app_module.clinic_ai_expert.override(model=FunctionModel(stream_function=stream_error)):
+        response = client.post("/api/chat/stream", json={"message": "Und Morpheus8?"},
+                               headers={"X-Session-ID": session_id})
+        events = parse_sse(response.get_data(as_text=True))
+    assert events[-1][0] == "error" and "Fehler" in events[-1][1]["message"]
+    assert "done" not in [event for event, _ in events]
+    # A failed run leaves the stored history as it was
+    assert len(app_module.session_store.load(session_id)) == len(history)
+    print("✅ Chat stream endpoint")
+
 def main():
     """Run all tests"""
     print("🏥 Testing Haut Labor Chatbot Flask Application")
@@ -80,15 +143,20 @@ def main():
     tests = [
         test_health_endpoint,
         test_main_page,
-        test_chat_endpoint
+        test_chat_endpoint,
+        test_chat_stream_endpoint
     ]
     
     passed = 0
     total = len(tests)
     
     for test in tests:
-        if test():
-            passed += 1
+        # The live server tests return False on failure, the offline ones raise
+        try:
+            if test() is not False:
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
     
     print("\n" + "=" * 50)
     print(f"Test Results: {passed}/{total} tests passed")
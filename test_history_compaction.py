@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for token-budgeted history compaction
+Runs offline with a fake summarizer instead of the OpenAI API.
+"""
+
+import asyncio
+
+from pydantic_ai.messages import (
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from history_compaction import SUMMARY_PREFIX, compact_history, count_tokens
+
+SYSTEM_PROMPT = "Sie sind der Hautlabor Assistent. " * 200
+TOOL_OUTPUT = "## Botox-Behandlung\n**Kategorie:** Gesicht\n" * 100
+
+
+def make_conversation(turns):
+    """Build a history where every turn calls get_treatment_details"""
+    messages = []
+    for i in range(turns):
+        parts = [SystemPromptPart(content=SYSTEM_PROMPT)] if i == 0 else []
+        messages.append(ModelRequest(parts=parts + [UserPromptPart(content=f"Frage {i}")]))
+        messages.append(ModelResponse(parts=[ToolCallPart.from_raw_args("get_treatment_details", {"treatment_name": "Botox"})]))
+        messages.append(ModelRequest(parts=[ToolReturnPart(tool_name="get_treatment_details", content=TOOL_OUTPUT)]))
+        messages.append(ModelResponse(parts=[TextPart(content=f"Antwort {i}")]))
+    return messages
+
+
+class FakeSummarizer:
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+
+    async def __call__(self, previous_summary, messages):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        questions = [part.content for message in messages for part in message.parts if part.part_kind == "user-prompt"]
+        return (previous_summary + " " if previous_summary else "") + "Gefragt: " + ", ".join(questions)
+
+
+def system_parts(messages):
+    return [part for part in messages[0].parts if isinstance(part, SystemPromptPart)]
+
+
+def test_short_history_untouched():
+    """Histories under the budget are returned as they are"""
+    history = make_conversation(1)
+    assert asyncio.run(compact_history(history, token_budget=100_000)) is history
+    print("✅ Short history untouched")
+
+
+def test_old_tool_returns_dropped():
+    """Older turns lose their tool traffic but keep questions and answers"""
+    history = make_conversation(6)
+    compacted = asyncio.run(compact_history(history, token_budget=2000, keep_turns=1))
+
+    tool_returns = [part for message in compacted for part in message.parts if part.part_kind == "tool-return"]
+    assert len(tool_returns) == 1
+    assert compacted[0].parts[0].content == SYSTEM_PROMPT
+    assert "Antwort 0" in [part.content for message in compacted for part in message.parts if part.part_kind == "text"]
+    print(f"✅ Old tool returns dropped: {count_tokens(history)} -> {count_tokens(compacted)} tokens")
+
+
+def test_summary_rolls_over_and_is_reused():
+    """Older turns are summarized once; the summary is carried in the system prompt"""
+    summarizer = FakeSummarizer()
+    budget = 1500
+    compacted = asyncio.run(compact_history(make_conversation(30), summarize=summarizer, token_budget=budget, keep_turns=2))
+
+    summaries = [part.content for part in system_parts(compacted) if part.content.startswith(SUMMARY_PREFIX)]
+    assert summarizer.calls == 1
+    assert summaries and "Frage 0" in summaries[0]
+    assert count_tokens(compacted) - count_tokens([ModelRequest(parts=[SystemPromptPart(content=SYSTEM_PROMPT)])]) <= budget
+
+    # The stored compacted history fits, so the next run does not summarize again
+    again = asyncio.run(compact_history(compacted, summarize=summarizer, token_budget=budget, keep_turns=2))
+    assert again is compacted
+    assert summarizer.calls == 1
+    print("✅ Older turns rolled into a reusable summary")
+
+
+def test_failing_summarizer_drops_older_turns():
+    """A failing summary call (timeout, 429, 5xx) does not fail the request; the oldest turns are dropped instead"""
+    summarizer = FakeSummarizer(error=TimeoutError("Request timed out."))
+    budget = 1500
+    compacted = asyncio.run(compact_history(make_conversation(30), summarize=summarizer, token_budget=budget, keep_turns=2))
+
+    assert summarizer.calls == 1
+    assert not [part for part in system_parts(compacted) if part.content.startswith(SUMMARY_PREFIX)]
+    assert compacted[0].parts[0].content == SYSTEM_PROMPT
+    questions = [part.content for message in compacted for part in message.parts if part.part_kind == "user-prompt"]
+    assert "Frage 0" not in questions and questions[-1] == "Frage 29"
+    assert count_tokens(compacted) - count_tokens([ModelRequest(parts=[SystemPromptPart(content=SYSTEM_PROMPT)])]) <= budget
+    print("✅ Failing summarizer drops older turns")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing History Compaction")
+    print("=" * 50)
+
+    test_short_history_untouched()
+    test_old_tool_returns_dropped()
+    test_summary_rolls_over_and_is_reused()
+    test_failing_summarizer_drops_older_turns()
+
+    print("\n🎉 All history compaction tests passed!")
+
+
+if __name__ == "__main__":
+    main()
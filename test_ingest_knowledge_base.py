@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test script for the knowledge base ingestion into site_pages
+Runs against the local vector store as in-process stand-in for Postgres.
+"""
+
+import asyncio
+import copy
+import hashlib
+import tempfile
+from types import SimpleNamespace
+
+from ingest_knowledge_base import LocalVectorStoreSink, embed_chunks, ingest, knowledge_base_chunks, split_text
+from vector_store import LocalVectorStore
+
+KNOWLEDGE_BASE = {
+    "treatments": [
+        {
+            "id": "gesicht-botox-01",
+            "treatment_name": "Botox",
+            "category": "Gesicht",
+            "tags": ["Falten"],
+            "content": {
+                "description": "Botox glättet mimische Falten. " * 80,
+                "mechanism": "Der Wirkstoff entspannt die Muskulatur.",
+                "details": {"duration": "15 Minuten", "cost": {"base_price": 250}},
+                "faqs": [{"question": "Tut es weh?", "answer": "Kaum."}],
+            },
+        },
+        {
+            "id": "gesicht-laser-02",
+            "treatment_name": "CO₂-Laser",
+            "category": "Gesicht",
+            "tags": ["Narben"],
+            "content": {"description": "Der Laser erneuert die Haut.", "mechanism": "Lichtimpulse."},
+        },
+    ],
+    "pages": [{"id": "ueber-uns", "page_title": "Über uns", "introduction": "Hautlabor in Oldenburg.", "sections": []}],
+}
+
+
+class FakeEmbeddingsClient:
+    """Deterministic embeddings; records how many texts were sent per request."""
+
+    def __init__(self):
+        self.embeddings = self
+        self.requests = []
+
+    async def create(self, model, input):
+        self.requests.append(len(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[b / 255 for b in hashlib.sha256(text.encode()).digest()[:8]])
+                                     for text in input])
+
+
+def run(knowledge_base, directory, client):
+    return asyncio.run(ingest(knowledge_base, LocalVectorStoreSink(directory), client))
+
+
+def test_split_text():
+    """Long texts are split at sentence ends into overlapping windows"""
+    windows = split_text("Ein kurzer Satz. " * 100, max_chars=200, overlap=40)
+    assert len(windows) > 1
+    assert all(len(window) <= 200 for window in windows)
+    # The end of one window reappears at the start of the next
+    assert windows[0][-30:] in windows[1]
+    assert split_text("  ") == []
+    print("✅ Split text")
+
+
+def test_chunks_carry_knowledge_base_metadata():
+    """Every chunk is keyed by (url, chunk_number) and points back at its document"""
+    chunks = knowledge_base_chunks(KNOWLEDGE_BASE)
+    keys = [chunk.key for chunk in chunks]
+    assert len(keys) == len(set(keys))
+    botox = [chunk for chunk in chunks if chunk.metadata["id"] == "gesicht-botox-01"]
+    assert [chunk.chunk_number for chunk in botox] == list(range(len(botox)))
+    assert {chunk.metadata["section"] for chunk in botox} >= {"Beschreibung", "Funktionsweise", "Häufige Fragen"}
+    assert all(chunk.metadata["source"] == "hautlabor_kb" and chunk.metadata["type"] == "treatment" for chunk in botox)
+    assert any("Dauer: 15 Minuten" in chunk.content for chunk in botox)
+    print("✅ Chunks carry knowledge base metadata")
+
+
+def test_incremental_ingestion():
+    """A second run embeds nothing; an edit re-embeds only the changed chunks"""
+    with tempfile.TemporaryDirectory() as directory:
+        client = FakeEmbeddingsClient()
+        first = run(KNOWLEDGE_BASE, directory, client)
+        assert first.embedded == first.chunks and first.unchanged == 0
+        store = LocalVectorStore.load(directory)
+        assert len(store) == first.chunks
+
+        client = FakeEmbeddingsClient()
+        second = run(KNOWLEDGE_BASE, directory, client)
+        assert second.embedded == 0 and second.unchanged == second.chunks
+        assert client.requests == []
+
+        edited = copy.deepcopy(KNOWLEDGE_BASE)
+        edited["treatments"][1]["content"]["mechanism"] = "Fraktionierte Lichtimpulse."
+        third = run(edited, directory, client)
+        assert third.embedded == 1 and client.requests == [1]
+
+        # The edited chunk is found by its new embedding
+        query = asyncio.run(FakeEmbeddingsClient().create("", ["CO₂-Laser – Funktionsweise\nFraktionierte Lichtimpulse."])).data[0].embedding
+        best = LocalVectorStore.load(directory).match_site_pages(query, match_count=1)[0]
+        assert best["metadata"]["id"] == "gesicht-laser-02" and best["similarity"] > 0.99
+    print("✅ Incremental ingestion")
+
+
+def test_removed_content_is_deleted():
+    """Chunks of removed documents and of shortened sections are deleted"""
+    with tempfile.TemporaryDirectory() as directory:
+        run(KNOWLEDGE_BASE, directory, FakeEmbeddingsClient())
+
+        edited = copy.deepcopy(KNOWLEDGE_BASE)
+        edited["pages"] = []
+        edited["treatments"][0]["content"]["description"] = "Botox glättet mimische Falten."
+        stats = run(edited, directory, FakeEmbeddingsClient())
+        assert stats.deleted > 1
+
+        rows = LocalVectorStore.load(directory).rows
+        assert len(rows) == stats.chunks
+        assert not any(row["metadata"]["type"] == "page" for row in rows)
+    print("✅ Removed content is deleted")
+
+
+def test_embedding_batches_are_bounded():
+    """Changed chunks are embedded in batches of the configured size"""
+    client = FakeEmbeddingsClient()
+    chunks = knowledge_base_chunks(KNOWLEDGE_BASE)
+    embeddings = asyncio.run(embed_chunks(chunks, client, batch_size=3, max_concurrency=2))
+    assert len(embeddings) == len(chunks)
+    assert max(client.requests) <= 3 and sum(client.requests) == len(chunks)
+    print("✅ Embedding batches are bounded")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Knowledge Base Ingestion")
+    print("=" * 50)
+
+    test_split_text()
+    test_chunks_carry_knowledge_base_metadata()
+    test_incremental_ingestion()
+    test_removed_content_is_deleted()
+    test_embedding_batches_are_bounded()
+
+    print("\n🎉 All ingestion tests passed!")
+
+
+if __name__ == "__main__":
+    main()
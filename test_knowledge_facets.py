@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script for the category, tag and price facet indexes
+"""
+
+from knowledge_facets import FacetIndex, base_price
+
+TREATMENTS = [
+    {"treatment_name": "CO₂-Laserbehandlung (Gesicht)", "category": "Gesicht", "tags": ["Aknenarben", "Laser"],
+     "content": {"details": {"cost": {"base_price": 400}}}},
+    {"treatment_name": "SkinPen Microneedling", "category": "Gesicht", "tags": ["Narben", "Poren"],
+     "content": {"details": {"cost": "ab 250€"}}},
+    {"treatment_name": "CO2-Laser-Behandlung", "category": "Körper", "tags": ["Narbenkorrektur", "Laser"],
+     "content": {"details": {"cost": {"base_price": 600}}}},
+    {"treatment_name": "Vampirlifting", "category": "Gesicht", "tags": ["Eigenblut"], "content": {}},
+]
+
+facets = FacetIndex(TREATMENTS)
+
+
+def test_base_price():
+    """Prices are read from cost objects and from free text"""
+    assert [base_price(treatment) for treatment in TREATMENTS] == [400.0, 250.0, 600.0, None]
+    # German thousands separators and decimal commas in free text
+    for cost, price in (("ab 1.200€", 1200.0), ("1.500,00 €", 1500.0), ("99,90 €", 99.9), ("ab 12.000 €", 12000.0)):
+        assert base_price({"content": {"details": {"cost": cost}}}) == price
+    print("✅ Base price")
+
+
+def test_single_facets():
+    """Categories fold umlauts, tags also match as part of longer tags"""
+    assert facets.category_ids("koerper") == {2}
+    assert facets.tag_ids("Narben") == {0, 1, 2}
+    assert facets.tag_ids("laser") == {0, 2}
+    assert facets.price_ids(max_price=400) == {0, 1}
+    assert facets.price_ids(min_price=300, max_price=600) == {0, 2}
+    print("✅ Single facets")
+
+
+def test_combined_query():
+    """Facets are intersected; treatments without price never match a price filter"""
+    assert facets.query(category="Gesicht", tags=["Narben"], max_price=500) == [0, 1]
+    assert facets.query(category="Gesicht", tags=["Narben", "Laser"]) == [0]
+    assert facets.query(category="Männer") == []
+    assert facets.query(max_price=10_000) == [0, 1, 2]
+    assert facets.query() == [0, 1, 2, 3]
+    print("✅ Combined query")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Facet Indexes")
+    print("=" * 50)
+
+    test_base_price()
+    test_single_facets()
+    test_combined_query()
+
+    print("\n🎉 All facet tests passed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for the knowledge base search indexes
+Runs fully offline against combined_database_newest.json.
+"""
+
+import json
+
+from knowledge_index import KnowledgeBase, InvertedIndex, treatment_fields
+
+
+def load_test_knowledge_base():
+    with open('combined_database_newest.json', 'r', encoding='utf-8') as f:
+        return KnowledgeBase(json.load(f))
+
+
+def test_field_weights():
+    """Name matches outrank tag matches, which outrank FAQ matches"""
+    treatments = [
+        {"treatment_name": "Other", "category": "Gesicht", "tags": [],
+         "content": {"faq": [{"question": "Hilft Botox?", "answer": "Ja"}]}},
+        {"treatment_name": "Other", "category": "Gesicht", "tags": ["Botox"], "content": {}},
+        {"treatment_name": "Botox", "category": "Gesicht", "tags": [], "content": {}},
+    ]
+    index = InvertedIndex(treatments, treatment_fields)
+
+    scores = index.scores("botox")
+    assert scores[2] > scores[1] > scores[0] > 0
+    assert [t["tags"] for t in index.search("botox")] == [[], ["Botox"], []]
+    print("✅ Field weights applied")
+
+
+def test_substring_matching():
+    """Query terms match inside compound words like the old substring search"""
+    knowledge_base = load_test_knowledge_base()
+    results = knowledge_base.treatment_index.search("narben", max_results=30)
+
+    assert any("Aknenarben" in t.get("tags", []) for t in results)
+    print(f"✅ Substring matching: {len(results)} treatments for 'narben'")
+
+
+def test_multi_word_query():
+    """Multi-word questions rank documents matching most of the words first"""
+    knowledge_base = load_test_knowledge_base()
+    results = knowledge_base.treatment_index.search("Kosten Botox Stirn")
+
+    assert results
+    assert "Botox" in results[0]["treatment_name"]
+    assert knowledge_base.treatment_index.search("Botox Xylophon")
+    assert knowledge_base.treatment_index.search("Xylophon") == []
+    print(f"✅ Multi-word query: {results[0]['treatment_name']}")
+
+
+def test_german_analysis():
+    """Umlauts are folded, stopwords dropped, words stemmed and compounds split"""
+    from german_text import GermanAnalyzer, fold, vocabulary_of, vocabulary_of_words, words
+
+    assert fold("Männer") == fold("Manner") == "manner"
+    # Spelled-out ae/oe/ue are not umlauts in ordinary words
+    assert fold("Aktuell") == "aktuell" and fold("Feuer") == "feuer" and fold("Poesie") == "poesie"
+    assert fold("CO₂-Laser") == "co2-laser"
+
+    analyzer = GermanAnalyzer({"falt", "behandlung"})
+    assert analyzer.analyze("Quelle") != analyzer.analyze("Qulle")
+    assert analyzer.analyze("aktuelle Angebote")[0] == "aktuell"
+    assert analyzer.analyze("Feuer") == ["feuer"]
+    assert analyzer.analyze("die Kosten") == analyzer.analyze("kostet")
+    assert analyzer.analyze("Faltenbehandlung") == ["faltenbehandlung", "falt", "behandlung"]
+    assert analyzer.analyze_words(words("Faltenbehandlung")) == analyzer.analyze("Faltenbehandlung")
+    assert vocabulary_of(["Falten", "die Behandlung"]) == vocabulary_of_words([words("Falten"), words("die Behandlung")]) == {"falt", "behandlung"}
+    print("✅ German analysis")
+
+
+def test_plain_dict_still_supported():
+    """Plain dicts without prebuilt indexes are indexed on the fly"""
+    from knowledge_index import get_page_index, get_treatment_index
+
+    knowledge_base = load_test_knowledge_base()
+    plain = dict(knowledge_base)
+
+    assert get_treatment_index(plain).search("laser") == knowledge_base.treatment_index.search("laser")
+    assert get_page_index(plain).search("oldenburg") == knowledge_base.page_index.search("oldenburg")
+    print("✅ Plain dict knowledge base supported")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Haut Labor Knowledge Base Index")
+    print("=" * 50)
+
+    test_field_weights()
+    test_substring_matching()
+    test_multi_word_query()
+    test_german_analysis()
+    test_plain_dict_still_supported()
+
+    print("\n🎉 All index tests passed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script for the hot-reloading knowledge base manager
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from knowledge_manager import EMPTY_VERSION, KnowledgeBaseManager
+from vector_store import LocalVectorStore
+
+
+def write_knowledge_base(path, treatment_names):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"treatments": [{"treatment_name": name, "category": "Gesicht"} for name in treatment_names], "pages": []}, f)
+
+
+def make_row(url, embedding):
+    return {"url": url, "chunk_number": 0, "title": url, "content": "...", "metadata": {}, "embedding": embedding}
+
+
+def test_reload_swaps_snapshot():
+    """A changed file produces a new version while held snapshots stay unchanged"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "kb.json")
+        write_knowledge_base(path, ["Botox"])
+        manager = KnowledgeBaseManager(path, poll_seconds=0)
+
+        in_flight = manager.current
+        first_version = manager.version
+        assert not manager.reload()
+
+        write_knowledge_base(path, ["Botox", "Morpheus8"])
+        assert manager.reload()
+        assert manager.version != first_version
+        assert manager.current.treatment_index.search("Morpheus8")[0]["treatment_name"] == "Morpheus8"
+
+        # The snapshot taken before the reload is untouched
+        assert in_flight.version == first_version
+        assert len(in_flight["treatments"]) == 1
+        assert not in_flight.treatment_index.search("Morpheus8")
+    print("✅ Reload swaps snapshot")
+
+
+def test_invalid_file_keeps_current_version():
+    """Broken or missing files never replace a working snapshot"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "kb.json")
+        write_knowledge_base(path, ["Botox"])
+        manager = KnowledgeBaseManager(path, poll_seconds=0)
+        version = manager.version
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{ kaputt")
+        assert not manager.reload()
+        os.remove(path)
+        assert not manager.reload(force=True)
+        assert manager.version == version
+
+        assert KnowledgeBaseManager(path, poll_seconds=0).version == EMPTY_VERSION
+    print("✅ Invalid file keeps current version")
+
+
+def test_background_watcher():
+    """The watcher thread picks up a changed file without an explicit reload"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "kb.json")
+        write_knowledge_base(path, ["Botox"])
+        manager = KnowledgeBaseManager(path, poll_seconds=0.02).start()
+        try:
+            write_knowledge_base(path, ["Botox", "HydraFacial"])
+            deadline = time.monotonic() + 2
+            while manager.reloads == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(manager.current["treatments"]) == 2
+        finally:
+            manager.stop()
+    print("✅ Background watcher")
+
+
+def test_reload_swaps_vector_store():
+    """A re-ingested vector store is picked up; runs holding the old store keep reading it"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "kb.json")
+        write_knowledge_base(path, ["Botox"])
+        store_dir = os.path.join(directory, "site_pages_index")
+        manager = KnowledgeBaseManager(path, poll_seconds=0, vector_store_dir=store_dir)
+        assert manager.vector_store is None
+
+        LocalVectorStore.from_rows([make_row("https://hautlabor.de/botox", [1.0, 0.0])]).save(store_dir)
+        assert manager.reload()
+        in_flight = manager.vector_store
+        assert len(in_flight) == 1
+        assert not manager.reload_vector_store()
+
+        LocalVectorStore.from_rows([make_row("https://hautlabor.de/botox", [1.0, 0.0]),
+                                    make_row("https://hautlabor.de/morpheus8", [0.0, 1.0])]).save(store_dir)
+        assert manager.reload_vector_store()
+        assert len(manager.vector_store) == 2
+        assert in_flight.match_site_pages([1.0, 0.0], 5)[0]["url"] == "https://hautlabor.de/botox"
+        assert manager.vector_store_reloads == 2
+    print("✅ Reload swaps vector store")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Knowledge Base Manager")
+    print("=" * 50)
+
+    test_reload_swaps_snapshot()
+    test_invalid_file_keeps_current_version()
+    test_background_watcher()
+    test_reload_swaps_vector_store()
+
+    print("\n🎉 All knowledge base manager tests passed!")
+
+
+if __name__ == "__main__":
+    main()
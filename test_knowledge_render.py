@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test script for the pre-rendered tool outputs
+"""
+
+from knowledge_index import KnowledgeBase, get_rendered
+from knowledge_render import render_treatment_details, render_treatment_summary
+
+KNOWLEDGE_BASE = {
+    "treatments": [
+        {
+            "treatment_name": "Botox",
+            "category": "Gesicht",
+            "tags": ["Falten"],
+            "content": {
+                "description": "Glättet mimische Falten.",
+                "details": {"duration": "15 Minuten", "cost": {"base_price": 250}},
+                "doctor_citation": {"quote": "Natürlich bleiben.", "doctor_name": "Dr. Test"},
+                "procedure_steps": ["Beratung", "Injektion"],
+            },
+        },
+        {
+            "treatment_name": "Vampirlifting",
+            "category": "Gesicht",
+            "tags": [],
+            "content": {"details": {"cost": "ab 380€"}},
+        },
+        {"treatment_name": "Lipolyse", "category": "Körper", "tags": ["Fett"], "content": {}},
+    ],
+    "pages": [{"page_title": "Über uns", "sections": [{"title": "Team", "content": "Dr. med. Lara Pfahl"}]}],
+}
+
+
+def test_blocks_rendered_at_load():
+    """Every treatment and page is rendered once when the knowledge base is built"""
+    knowledge_base = KnowledgeBase(KNOWLEDGE_BASE)
+    rendered = knowledge_base.rendered
+
+    assert rendered.treatment_summaries[0] == render_treatment_summary(KNOWLEDGE_BASE["treatments"][0])
+    assert "- Kosten: ab 250 EUR" in rendered.treatment_summaries[0]
+    assert '> "Natürlich bleiben." - Dr. Test' in rendered.treatment_summaries[0]
+    assert "1. Beratung\n2. Injektion\n" in rendered.treatment_details[0]
+    assert "## Über uns" in rendered.page_summaries[0]
+    assert get_rendered(knowledge_base) is rendered
+    print("✅ Blocks rendered at load")
+
+
+def test_free_text_cost():
+    """Prices given as free text are rendered instead of failing"""
+    details = render_treatment_details(KNOWLEDGE_BASE["treatments"][1])
+    assert "- **Kosten:** ab 380€" in details
+    print("✅ Free text cost")
+
+
+def test_category_listings():
+    """Category listings are case-insensitive and keep the requested name in the heading"""
+    rendered = get_rendered(KNOWLEDGE_BASE)
+
+    listing = rendered.category_listing("gesicht")
+    assert listing.startswith("## Behandlungen - gesicht\n\n### Gesicht\n")
+    assert "- **Botox** (Falten)\n- **Vampirlifting**\n" in listing
+    assert "Lipolyse" not in listing
+
+    everything = rendered.category_listing()
+    assert "### Gesicht" in everything and "### Körper" in everything
+    assert rendered.category_listing("Haare") == "Keine Behandlungen gefunden in der Kategorie Haare."
+    print("✅ Category listings")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Rendered Tool Outputs")
+    print("=" * 50)
+
+    test_blocks_rendered_at_load()
+    test_free_text_cost()
+    test_category_listings()
+
+    print("\n🎉 All rendering tests passed!")
+
+
+if __name__ == "__main__":
+    main()
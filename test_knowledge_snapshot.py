@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary knowledge base snapshot
+"""
+
+import json
+import os
+import pickle
+import tempfile
+
+import knowledge_snapshot
+from knowledge_snapshot import (
+    SNAPSHOT_MAGIC,
+    load_snapshot,
+    read_knowledge_base,
+    snapshot_path,
+    validate_knowledge_base,
+)
+
+KNOWLEDGE_BASE = {
+    "treatments": [
+        {"treatment_name": "Botox", "category": "Gesicht", "tags": ["Falten"], "content": {"description": "Glättet Falten."}},
+        {"treatment_name": "Morpheus8", "category": "Gesicht", "tags": ["Hautstraffung"], "content": {}},
+    ],
+    "pages": [],
+}
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def test_snapshot_round_trip():
+    """The first load writes a snapshot that later loads return unchanged"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "kb.json")
+        write_json(path, KNOWLEDGE_BASE)
+
+        built = read_knowledge_base(path)
+        assert os.path.exists(snapshot_path(path))
+
+        loaded = load_snapshot(snapshot_path(path), built.version)
+        assert loaded == built and loaded.version == built.version
+        assert loaded.treatment_index.search("Falten")[0]["treatment_name"] == "Botox"
+        assert loaded.rendered.treatment_summaries == built.rendered.treatment_summaries
+        assert loaded["treatments"][0]["category"] is loaded["treatments"][1]["category"]
+    print("✅ Snapshot round trip")
+
+
+def test_outdated_snapshot_is_rebuilt():
+    """A snapshot of older content or another schema is never used"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "kb.json")
+        write_json(path, KNOWLEDGE_BASE)
+        old_version = read_knowledge_base(path).version
+
+        write_json(path, {"treatments": KNOWLEDGE_BASE["treatments"][:1], "pages": []})
+        assert load_snapshot(snapshot_path(path), "0" * 12) is None
+        rebuilt = read_knowledge_base(path)
+        assert rebuilt.version != old_version and len(rebuilt["treatments"]) == 1
+
+        with open(snapshot_path(path), "wb") as f:
+            pickle.dump((SNAPSHOT_MAGIC, "other-schema", rebuilt.version), f)
+            pickle.dump(rebuilt, f)
+        assert load_snapshot(snapshot_path(path), rebuilt.version) is None
+
+        with open(snapshot_path(path), "wb") as f:
+            f.write(b"kaputt")
+        assert read_knowledge_base(path).version == rebuilt.version
+    print("✅ Outdated snapshot is rebuilt")
+
+
+def test_validation():
+    """Structural problems are rejected, missing fields reported"""
+    for invalid in ([], {"treatments": {}}, {"treatments": ["Botox"]}):
+        try:
+            validate_knowledge_base(invalid)
+        except ValueError:
+            continue
+        raise AssertionError(f"{invalid!r} was accepted")
+
+    warnings = validate_knowledge_base({"treatments": [{"content": {"details": "ab 250€"}}]})
+    assert len(warnings) == 2
+    assert validate_knowledge_base(KNOWLEDGE_BASE) == []
+    assert knowledge_snapshot.SCHEMA_HASH
+    print("✅ Validation")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Knowledge Base Snapshot")
+    print("=" * 50)
+
+    test_snapshot_round_trip()
+    test_outdated_snapshot_is_rebuilt()
+    test_validation()
+
+    print("\n🎉 All snapshot tests passed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script for the hot-path metrics
+"""
+
+import asyncio
+import inspect
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-test")
+
+import httpx
+from pydantic_ai.usage import Usage
+
+from metrics import (
+    MetricsRegistry,
+    instrumented_http_client,
+    llm_tokens,
+    model_request_seconds,
+    model_requests,
+    record_tokens,
+    timed_tool,
+    tool_call_seconds,
+    tool_calls,
+)
+from pydantic_ai_expert import clinic_ai_expert, get_treatment_details, model, openai_client
+
+
+def test_render_prometheus_text():
+    """Counters and histograms in the Prometheus text format, with cumulative buckets"""
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["endpoint"])
+    latency = registry.histogram("latency_seconds", "Latency", ["endpoint"], buckets=[0.1, 1])
+    requests.inc(endpoint="chat")
+    requests.inc(2, endpoint="chat")
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, endpoint="chat")
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{endpoint="chat"} 3' in text
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{endpoint="chat",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{endpoint="chat",le="1"} 2' in text
+    assert 'latency_seconds_bucket{endpoint="chat",le="+Inf"} 3' in text
+    assert 'latency_seconds_sum{endpoint="chat"} 5.55' in text
+    assert 'latency_seconds_count{endpoint="chat"} 3' in text
+    print("✅ Prometheus text format")
+
+
+def test_timed_tool():
+    """Timed tools keep their schema and record duration and errors"""
+    tool = clinic_ai_expert._function_tools["get_treatment_details"]
+    assert list(tool._parameters_json_schema["properties"]) == ["treatment_name"]
+    assert tool.description.startswith("Get detailed information")
+    assert "treatment_name" in inspect.signature(get_treatment_details).parameters
+    # The benchmark calls the undecorated tool
+    assert "treatment_name" in inspect.signature(get_treatment_details.__wrapped__).parameters
+
+    @timed_tool
+    async def failing_tool(ctx, query: str) -> str:
+        raise ValueError(query)
+
+    calls = tool_call_seconds.count(tool="failing_tool")
+    try:
+        asyncio.run(failing_tool(None, "Botox"))
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+    assert tool_call_seconds.count(tool="failing_tool") == calls + 1
+    assert tool_calls.value(tool="failing_tool", status="error") == 1
+    print("✅ Timed tool")
+
+
+def test_model_round_trips_and_tokens():
+    """OpenAI API round trips are timed per endpoint, token counts are summed"""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+
+    async def send():
+        async with instrumented_http_client(transport=transport) as client:
+            await client.post("https://api.openai.com/v1/chat/completions", json={})
+            await client.post("https://api.openai.com/v1/embeddings", json={})
+
+    # The agent and the app share one instrumented client
+    assert model.client is openai_client
+    assert openai_client._client.event_hooks["response"]
+
+    before = model_request_seconds.count(endpoint="chat/completions")
+    asyncio.run(send())
+    assert model_request_seconds.count(endpoint="chat/completions") == before + 1
+    assert model_requests.value(endpoint="embeddings", status="200") >= 1
+
+    prompt = llm_tokens.value(kind="prompt")
+    record_tokens(Usage(requests=2, request_tokens=5000, response_tokens=40, details={"cached_tokens": 4608}))
+    assert llm_tokens.value(kind="prompt") == prompt + 5000
+    assert llm_tokens.value(kind="cached") >= 4608
+    print("✅ Model round trips and tokens")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Metrics")
+    print("=" * 50)
+
+    test_render_prometheus_text()
+    test_timed_tool()
+    test_model_round_trips_and_tokens()
+
+    print("\n🎉 All metrics tests passed!")
+
+
+if __name__ == "__main__":
+    main()
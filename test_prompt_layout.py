@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for the cacheable prompt prefix
+Captures the chat completion requests of the real agent with a fake OpenAI client, fully offline.
+"""
+
+import asyncio
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-test")
+
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.completion_usage import CompletionUsage, PromptTokensDetails
+from pydantic_ai.messages import ModelRequest, SystemPromptPart, UserPromptPart
+from pydantic_ai.models.openai import OpenAIModel
+
+from history_compaction import SUMMARY_PREFIX
+from knowledge_index import KnowledgeBase
+from prompt_layout import PromptCacheStats, with_static_prefix
+from pydantic_ai_expert import ClinicAIDeps, clinic_ai_expert, system_prompt
+
+
+class FakeOpenAIClient:
+    """Records the keyword arguments of every chat completion request."""
+
+    def __init__(self):
+        self.chat = self
+        self.completions = self
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return ChatCompletion(
+            id="chatcmpl-test",
+            object="chat.completion",
+            created=0,
+            model=kwargs["model"],
+            choices=[Choice(index=0, finish_reason="stop",
+                            message=ChatCompletionMessage(role="assistant", content="Gerne helfe ich Ihnen."))],
+            usage=CompletionUsage(prompt_tokens=5000, completion_tokens=10, total_tokens=5010,
+                                  prompt_tokens_details=PromptTokensDetails(cached_tokens=4608)),
+        )
+
+
+def prefix_bytes(request) -> bytes:
+    """The static part of a request: tool schemas and the first (system) message."""
+    return json.dumps({"tools": request["tools"], "first": request["messages"][0]}, ensure_ascii=False).encode("utf-8")
+
+
+def run(client, question, history=None):
+    deps = ClinicAIDeps(knowledge_base=KnowledgeBase({"treatments": [], "pages": []}), openai_client=None)
+    with clinic_ai_expert.override(model=OpenAIModel("gpt-4o-mini", openai_client=client)):
+        return asyncio.run(clinic_ai_expert.run(question, deps=deps, message_history=history))
+
+
+def test_prefix_identical_across_requests():
+    """First turns, follow-ups with a summary and outdated histories share the same prefix bytes"""
+    client = FakeOpenAIClient()
+    first = run(client, "Was kostet Botox?")
+    run(client, "Wie lange hält Morpheus8?")
+
+    # A follow-up whose history carries a summary in the first request
+    history = first.all_messages()
+    history[0] = ModelRequest(parts=list(history[0].parts[:1]) + [SystemPromptPart(content=SUMMARY_PREFIX + "Patient fragt nach Botox.")]
+                              + list(history[0].parts[1:]))
+    run(client, "Und danach?", with_static_prefix(history, system_prompt))
+
+    # A history started with an older system prompt
+    outdated = [ModelRequest(parts=[SystemPromptPart(content="Alter Prompt"), UserPromptPart(content="Hallo")])] + first.all_messages()[1:]
+    run(client, "Haben Sie Termine frei?", with_static_prefix(outdated, system_prompt))
+
+    prefixes = {prefix_bytes(request) for request in client.requests}
+    assert len(prefixes) == 1
+    assert client.requests[0]["messages"][0] == {"role": "system", "content": system_prompt}
+    # Volatile content comes after the prefix
+    assert client.requests[2]["messages"][1]["content"].startswith(SUMMARY_PREFIX)
+    assert all("Alter Prompt" not in json.dumps(request["messages"]) for request in client.requests)
+    print(f"✅ Prefix identical across requests ({len(next(iter(prefixes)))} bytes)")
+
+
+def test_with_static_prefix_keeps_current_history():
+    """A history that already starts with the current prompt is returned unchanged"""
+    history = [ModelRequest(parts=[SystemPromptPart(content=system_prompt), UserPromptPart(content="Hallo")])]
+    assert with_static_prefix(history, system_prompt) is history
+    assert with_static_prefix([], system_prompt) == []
+    print("✅ Current history kept")
+
+
+def test_cached_tokens_recorded():
+    """Cached prompt tokens reported by the API are summed up"""
+    stats = PromptCacheStats()
+    client = FakeOpenAIClient()
+    assert stats.record(run(client, "Was kostet Botox?").usage()) == 4608
+    stats.record(run(client, "Was kostet Botox?").usage())
+    assert stats.stats["cached_tokens"] == 2 * 4608 and stats.stats["prompt_tokens"] == 10000
+    assert abs(stats.stats["cached_ratio"] - 0.9216) < 1e-9
+    print("✅ Cached tokens recorded")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Prompt Prefix Layout")
+    print("=" * 50)
+
+    test_prefix_identical_across_requests()
+    test_with_static_prefix_keeps_current_history()
+    test_cached_tokens_recorded()
+
+    print("\n🎉 All prompt layout tests passed!")
+
+
+if __name__ == "__main__":
+    main()
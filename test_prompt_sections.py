@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the compact system prompt mode
+Splits the real system_prompt.txt into its core and topic sections.
+"""
+
+import os
+
+from prompt_sections import PromptSections
+
+SYSTEM_PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompt.txt")
+
+
+def load_sections():
+    with open(SYSTEM_PROMPT_PATH, "r", encoding="utf-8") as f:
+        return PromptSections(f.read())
+
+
+def test_core_keeps_rules_and_drops_topics():
+    """The core keeps persona and rules; quick reference, social links and imprint become topics"""
+    sections = load_sections()
+    assert "## 2. PERSONA & TONE" in sections.core
+    assert "CRITICAL RESPONSE LENGTH CONTROL" in sections.core
+    assert "TREATMENT QUICK REFERENCE" not in sections.core
+    assert "instagram.com/hautlabor" not in sections.core
+    assert "+49 (0) 157 834 488 90" not in sections.core
+    assert len(sections.core) < 0.7 * len(sections.text)
+    print(f"✅ Core keeps rules ({len(sections.core)} of {len(sections.text)} characters)")
+
+
+def test_no_content_lost():
+    """Every line of the prompt is in the core or in a topic section"""
+    sections = load_sections()
+    parts = [sections.core] + [section.text for section in sections.topics] + [section.group for section in sections.topics]
+    combined = "\n".join(parts)
+    missing = [line for line in sections.text.splitlines() if line.strip() and line.strip() not in combined]
+    assert missing == [], missing
+    print("✅ No content lost")
+
+
+def test_topics_retrieved_by_question():
+    """Questions pull in the matching quick reference entries, social links or imprint"""
+    sections = load_sections()
+
+    morpheus = sections.render("Was kostet Morpheus8?")
+    assert "Morpheus8 — Dauer: 30–60 Minuten" in morpheus
+    # The quick reference intro is added once for all of its entries
+    assert morpheus.count("TREATMENT QUICK REFERENCE") == 1
+
+    assert "https://www.instagram.com/hautlabor" in sections.render("Haben Sie Instagram?")
+    assert "+49 (0) 157 834 488 90" in sections.render("Wie erreiche ich Sie telefonisch?")
+    assert sections.render("Hallo") == ""
+    print("✅ Topics retrieved by question")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Prompt Sections")
+    print("=" * 50)
+
+    test_core_keeps_rules_and_drops_topics()
+    test_no_content_lost()
+    test_topics_retrieved_by_question()
+
+    print("\n🎉 All prompt section tests passed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the first-turn response cache
+Uses a fake embeddings client, so no OpenAI key is needed.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from embedding_cache import EmbeddingCache
+from pydantic_ai.messages import ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart
+from response_cache import ResponseCache
+
+TOPIC_VECTORS = {"botox": [1.0, 0.0, 0.0], "morpheus": [0.0, 1.0, 0.0]}
+
+
+class FakeEmbeddingsClient:
+    """Embeds every text as the vector of the first topic it mentions"""
+
+    def __init__(self):
+        self.embeddings = self
+
+    async def create(self, model, input):
+        def embed(text):
+            return next((vector for topic, vector in TOPIC_VECTORS.items() if topic in text.lower()), [0.0, 0.0, 1.0])
+        return SimpleNamespace(data=[SimpleNamespace(embedding=embed(text)) for text in input])
+
+
+def run_messages(question, answer):
+    return [
+        ModelRequest(parts=[SystemPromptPart(content="System"), UserPromptPart(content=question)]),
+        ModelResponse(parts=[TextPart(content=answer)]),
+    ]
+
+
+def make_cache(directory, **kwargs):
+    return ResponseCache(
+        embedding_cache=EmbeddingCache(os.path.join(directory, "embeddings.sqlite3")),
+        openai_client=FakeEmbeddingsClient(),
+        **kwargs,
+    )
+
+
+def test_exact_and_semantic_hits():
+    """Normalized repeats hit the exact tier, paraphrases the semantic tier"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = make_cache(directory)
+        answer = "Botox kostet ab 250 €."
+        asyncio.run(cache.put("Was kostet Botox?", answer, run_messages("Was kostet Botox?", answer), latency=4.0))
+
+        assert asyncio.run(cache.get("  was kostet BOTOX? ")).answer == answer
+        semantic = asyncio.run(cache.get("Wie teuer ist eine Botox-Behandlung?"))
+        assert semantic.answer == answer
+        assert semantic.messages_for("Wie teuer ist eine Botox-Behandlung?")[0].parts[1].content == "Wie teuer ist eine Botox-Behandlung?"
+        assert asyncio.run(cache.get("Wie funktioniert Morpheus8?")) is None
+
+        stats = cache.stats
+        assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+        assert stats["saved_seconds"] == 8.0
+        assert abs(stats["hit_rate"] - 2 / 3) < 1e-9
+    print("✅ Exact and semantic hits")
+
+
+def test_ttl_expiry():
+    """Entries older than the TTL are not returned"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = make_cache(directory, ttl_seconds=0.05)
+        asyncio.run(cache.put("Termin buchen", "Online unter ...", [], latency=1.0))
+        time.sleep(0.1)
+        assert asyncio.run(cache.get("Termin buchen")) is None
+        assert cache.stats["entries"] == 0
+    print("✅ TTL expiry")
+
+
+def test_version_mismatch():
+    """Entries only answer lookups for the knowledge base and prompt version they were generated with"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = make_cache(directory)
+        asyncio.run(cache.put("Was kostet Botox?", "ab 250 €", [], latency=1.0, version="kb1:p1"))
+        assert asyncio.run(cache.get("Was kostet Botox?", "kb1:p1")) is not None
+
+        # An answer still being generated from the old snapshot after a reload is never served for the new one
+        asyncio.run(cache.put("Wie teuer ist Botox?", "ab 250 €", [], latency=1.0, version="kb1:p1"))
+        assert asyncio.run(cache.get("Wie teuer ist Botox?", "kb2:p1")) is None
+        assert asyncio.run(cache.get("Was kostet eine Botox-Behandlung?", "kb2:p1")) is None
+        assert cache.stats["invalidations"] == 1
+
+        asyncio.run(cache.put("Was kostet Botox?", "ab 270 €", [], latency=1.0, version="kb2:p1"))
+        assert asyncio.run(cache.get("Was kostet Botox?", "kb2:p1")).answer == "ab 270 €"
+        assert asyncio.run(cache.get("Was kostet Botox?", "kb2:p2")) is None
+    print("✅ Version mismatch")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Response Cache")
+    print("=" * 50)
+
+    test_exact_and_semantic_hits()
+    test_ttl_expiry()
+    test_version_mismatch()
+
+    print("\n🎉 All response cache tests passed!")
+
+
+if __name__ == "__main__":
+    main()
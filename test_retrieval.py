@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for hybrid lexical + vector retrieval
+Uses an in-memory vector store and a fake embeddings client.
+"""
+
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+from embedding_cache import EmbeddingCache
+from knowledge_index import KnowledgeBase, get_rendered
+from retrieval import KNOWLEDGE_BASE_SOURCE, HybridRetriever, reciprocal_rank_fusion
+from vector_store import LocalVectorStore
+
+KNOWLEDGE_BASE = KnowledgeBase({
+    "treatments": [
+        {"id": "lidstraffung", "treatment_name": "Lidstraffung ohne OP", "category": "Gesicht", "tags": ["Augenpartie"], "content": {}},
+        {"id": "botox", "treatment_name": "Botox", "category": "Gesicht", "tags": ["Falten"], "content": {}},
+    ],
+    "pages": [{"id": "ueber-uns", "page_title": "Über uns", "sections": []}],
+})
+
+# The query "Schlupflider" shares no word with "Lidstraffung", but its embedding is close
+QUERY_EMBEDDINGS = {"schlupflider": [1.0, 0.0, 0.0], "falten": [0.0, 1.0, 0.0]}
+
+ROWS = [
+    {"url": "https://hautlabor.de/lidstraffung", "chunk_number": 0, "title": "Lidstraffung", "summary": "",
+     "content": "...", "metadata": {"source": KNOWLEDGE_BASE_SOURCE, "type": "treatment", "id": "lidstraffung"},
+     "embedding": [0.9, 0.1, 0.0]},
+    {"url": "https://hautlabor.de/lidstraffung", "chunk_number": 1, "title": "Lidstraffung", "summary": "",
+     "content": "...", "metadata": {"source": KNOWLEDGE_BASE_SOURCE, "type": "treatment", "id": "lidstraffung"},
+     "embedding": [0.8, 0.2, 0.0]},
+    {"url": "https://hautlabor.de/blog/schlupflider", "chunk_number": 0, "title": "Blog: Schlupflider",
+     "summary": "Was gegen Schlupflider hilft.", "content": "...", "metadata": {}, "embedding": [0.7, 0.0, 0.3]},
+]
+
+
+class FakeEmbeddingsClient:
+    def __init__(self):
+        self.embeddings = self
+
+    async def create(self, model, input):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=QUERY_EMBEDDINGS.get(text.lower(), [0.0, 0.0, 1.0])) for text in input])
+
+
+def make_retriever(directory, vector=True):
+    if not vector:
+        return HybridRetriever(KNOWLEDGE_BASE)
+    return HybridRetriever(
+        KNOWLEDGE_BASE,
+        vector_store=LocalVectorStore.from_rows(ROWS),
+        embedding_cache=EmbeddingCache(os.path.join(directory, "embeddings.sqlite3")),
+        openai_client=FakeEmbeddingsClient(),
+    )
+
+
+def test_reciprocal_rank_fusion():
+    """Documents ranked well in several lists win"""
+    scores = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+    assert max(scores, key=scores.get) == "b"
+    assert scores["a"] == 1 / 61
+    print("✅ Reciprocal rank fusion")
+
+
+def test_vector_hits_add_recall_and_are_deduplicated():
+    """Paraphrases are found via embeddings; chunks of one document count once"""
+    with tempfile.TemporaryDirectory() as directory:
+        hits = asyncio.run(make_retriever(directory).search("Schlupflider", top_k=5))
+        keys = [hit.key for hit in hits]
+        assert keys == [("treatment", 0), ("url", "https://hautlabor.de/blog/schlupflider")]
+        assert "## Lidstraffung ohne OP" in hits[0].text
+        assert "Quelle: https://hautlabor.de/blog/schlupflider" in hits[1].text
+
+        # Both rankings agree on Botox for "Falten"
+        assert asyncio.run(make_retriever(directory).search("Falten", top_k=1))[0].key == ("treatment", 1)
+    print("✅ Vector hits add recall and are deduplicated")
+
+
+def test_top_treatments_come_with_details():
+    """The first treatment hits carry the get_treatment_details page, the rest their summary"""
+    with tempfile.TemporaryDirectory() as directory:
+        hits = asyncio.run(make_retriever(directory).search("Schlupflider", top_k=5, detailed_treatments=1))
+        assert hits[0].detailed and hits[0].text == get_rendered(KNOWLEDGE_BASE).treatment_details[0]
+        assert not hits[1].detailed
+
+        hits = asyncio.run(make_retriever(directory, vector=False).search("Gesicht", top_k=5, detailed_treatments=1))
+        assert [hit.detailed for hit in hits] == [True, False]
+        assert hits[1].text == get_rendered(KNOWLEDGE_BASE).treatment_summaries[hits[1].key[1]]
+    print("✅ Top treatments come with details")
+
+
+def test_lexical_only_fallback():
+    """Without a vector store the BM25 ranking is used alone"""
+    with tempfile.TemporaryDirectory() as directory:
+        retriever = make_retriever(directory, vector=False)
+        assert [hit.key for hit in asyncio.run(retriever.search("Botox Falten"))] == [("treatment", 1)]
+        assert asyncio.run(retriever.search("Schlupflider")) == []
+    print("✅ Lexical only fallback")
+
+
+def test_weak_pages_rank_below_treatments():
+    """Treatments and pages share one BM25 ranking, so a weak page hit does not push out treatments"""
+    knowledge_base = KnowledgeBase({
+        "treatments": [
+            {"id": "botox", "treatment_name": "Botox gegen Falten", "category": "Gesicht", "tags": ["Falten"], "content": {}},
+            {"id": "hyaluron", "treatment_name": "Hyaluron gegen Falten", "category": "Gesicht", "tags": ["Falten"], "content": {}},
+            {"id": "laser", "treatment_name": "Laser", "category": "Körper", "tags": ["Haare"], "content": {}},
+        ],
+        "pages": [
+            {"id": "blog", "page_title": "Blog", "sections": [{"heading": "Neues", "content":
+                "Im Blog schreiben wir über Hautpflege, Sonnenschutz, Ernährung, Sport, Schlaf und auch einmal über Falten im Alltag."}]},
+            {"id": "team", "page_title": "Team", "sections": [{"heading": "Team", "content": "Unser Team berät Sie gerne."}]},
+        ],
+    })
+    hits = asyncio.run(HybridRetriever(knowledge_base).search("Falten", top_k=3))
+    assert [hit.key for hit in hits] == [("treatment", 0), ("treatment", 1), ("page", 0)]
+    print("✅ Weak pages rank below treatments")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Hybrid Retrieval")
+    print("=" * 50)
+
+    test_reciprocal_rank_fusion()
+    test_vector_hits_add_recall_and_are_deduplicated()
+    test_top_treatments_come_with_details()
+    test_lexical_only_fallback()
+    test_weak_pages_rank_below_treatments()
+
+    print("\n🎉 All retrieval tests passed!")
+
+
+if __name__ == "__main__":
+    main()
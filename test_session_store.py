@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded conversation history stores
+Runs offline; only needs pydantic-ai for the message classes.
+"""
+
+import os
+import tempfile
+import time
+
+from pydantic_ai.messages import (
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from session_store import MemorySessionStore, SessionStore, SQLiteSessionStore, trim_history
+
+
+def make_turn(question, answer, with_system_prompt=False, with_tool=False):
+    """Build the messages of one user turn as the agent would produce them"""
+    parts = [SystemPromptPart(content="Sie sind der Hautlabor Assistent.")] if with_system_prompt else []
+    messages = [ModelRequest(parts=parts + [UserPromptPart(content=question)])]
+    if with_tool:
+        messages.append(ModelResponse(parts=[ToolCallPart.from_raw_args("search_knowledge_base", {"user_query": question})]))
+        messages.append(ModelRequest(parts=[ToolReturnPart(tool_name="search_knowledge_base", content="...")]))
+    messages.append(ModelResponse(parts=[TextPart(content=answer)]))
+    return messages
+
+
+def test_trim_history_keeps_system_prompt_and_turns():
+    """Trimming cuts at user prompts and keeps the system prompt"""
+    history = make_turn("Frage 1", "Antwort 1", with_system_prompt=True, with_tool=True)
+    history += make_turn("Frage 2", "Antwort 2", with_tool=True)
+    history += make_turn("Frage 3", "Antwort 3")
+
+    trimmed = trim_history(history, 5)
+
+    assert len(trimmed) == 2
+    assert isinstance(trimmed[0].parts[0], SystemPromptPart)
+    assert trimmed[0].parts[1].content == "Frage 3"
+    assert trim_history(history, 100) is history
+
+    # A single turn longer than the cap (tool calls) is kept whole rather than dropped
+    long_turn = trim_history(history[:8], 2)
+    assert len(long_turn) == 4
+    assert [part.content for part in long_turn[0].parts] == ["Sie sind der Hautlabor Assistent.", "Frage 2"]
+    print("✅ History trimmed at turn boundaries")
+
+
+def test_memory_store_bounds():
+    """The memory store evicts least recently used and idle sessions"""
+    store = MemorySessionStore(max_sessions=2, ttl_seconds=60, max_messages=10)
+    for session_id in ("a", "b", "c"):
+        store.append(session_id, make_turn("Hallo", "Guten Tag"))
+
+    assert len(store) == 2
+    assert store.load("a") == []
+    assert len(store.load("c")) == 2
+
+    store.ttl_seconds = 0
+    time.sleep(0.01)
+    assert store.load("c") == []
+    print("✅ Memory store bounded by LRU and TTL")
+
+
+def test_sqlite_store_persists_and_resets():
+    """The SQLite store round-trips messages across instances and supports reset"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sessions.sqlite3")
+        store = SQLiteSessionStore(path, max_messages=4)
+        store.append("visitor", make_turn("Was kostet Botox?", "Ab 250 EUR.", with_system_prompt=True))
+        store.append("visitor", make_turn("Und Filler?", "Ab 300 EUR.", with_tool=True))
+        store.close()
+
+        other_worker = SQLiteSessionStore(path, max_messages=4)
+        history = other_worker.load("visitor")
+        assert len(history) == 4
+        assert isinstance(history[0].parts[0], SystemPromptPart)
+        assert history[-1].parts[0].content == "Ab 300 EUR."
+
+        other_worker.reset("visitor")
+        assert other_worker.load("visitor") == []
+        other_worker.close()
+    print("✅ SQLite store persists across instances")
+
+
+def test_replace_skips_changed_history():
+    """A compacted history is only written if nobody appended since it was loaded"""
+    with tempfile.TemporaryDirectory() as directory:
+        for store in (MemorySessionStore(), SQLiteSessionStore(os.path.join(directory, "sessions.sqlite3"))):
+            store.append("visitor", make_turn("Was kostet Botox?", "Ab 250 EUR.", with_system_prompt=True))
+            loaded = store.load("visitor")
+            compacted = make_turn("Zusammenfassung", "Botox ab 250 EUR.", with_system_prompt=True)
+
+            # Another request appends while the history is being summarized
+            store.append("visitor", make_turn("Und Filler?", "Ab 300 EUR."))
+            assert not store.replace("visitor", compacted, expected=loaded)
+            assert len(store.load("visitor")) == 4
+
+            assert store.replace("visitor", compacted, expected=store.load("visitor"))
+            assert store.load("visitor")[0].parts[1].content == "Zusammenfassung"
+
+    # Stores must implement the whole interface; the base class itself is abstract
+    try:
+        SessionStore()
+        raise AssertionError("expected TypeError")
+    except TypeError:
+        pass
+    print("✅ Replace skips changed histories")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Session Stores")
+    print("=" * 50)
+
+    test_trim_history_keeps_system_prompt_and_turns()
+    test_memory_store_bounds()
+    test_sqlite_store_persists_and_resets()
+    test_replace_skips_changed_history()
+
+    print("\n🎉 All session store tests passed!")
+
+
+if __name__ == "__main__":
+    main()
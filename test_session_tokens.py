@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for the signed session ids
+"""
+
+from pydantic_ai.messages import ModelRequest, UserPromptPart
+
+from session_store import MemorySessionStore
+from session_tokens import SessionTokens
+
+
+def test_issued_tokens_verify():
+    """Issued ids are unique and verify with the same secret only"""
+    tokens = SessionTokens("test-secret")
+    first, second = tokens.issue(), tokens.issue()
+    assert first != second
+    assert tokens.verify(first) == first
+    assert SessionTokens("other-secret").verify(first) is None
+    print(f"✅ Issued tokens verify ({first})")
+
+
+def test_forged_tokens_rejected():
+    """Missing, client-chosen and tampered ids are rejected"""
+    tokens = SessionTokens("test-secret")
+    session_id, signature = tokens.issue().split(".")
+    for token in [None, "", "default", "test_session_123", session_id, f"{session_id}.",
+                  f"{'0' * len(session_id)}.{signature}", f"{session_id}.{signature}x", f"{session_id}.{signature}.x"]:
+        assert tokens.verify(token) is None, token
+    print("✅ Forged tokens rejected")
+
+
+def test_sessions_isolated():
+    """Each visitor's history only contains their own turns, and a reset clears it"""
+    tokens = SessionTokens("test-secret")
+    store = MemorySessionStore()
+    alice, bob = tokens.issue(), tokens.issue()
+    store.append(alice, [ModelRequest(parts=[UserPromptPart(content="Was kostet Botox?")])])
+    store.append(bob, [ModelRequest(parts=[UserPromptPart(content="Haben Sie Instagram?")])])
+    assert len(store.load(alice)) == 1 and len(store.load(bob)) == 1
+
+    store.reset(alice)
+    assert store.load(alice) == [] and len(store.load(bob)) == 1
+    print("✅ Sessions isolated")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Session Tokens")
+    print("=" * 50)
+
+    test_issued_tokens_verify()
+    test_forged_tokens_rejected()
+    test_sessions_isolated()
+
+    print("\n🎉 All session token tests passed!")
+
+
+if __name__ == "__main__":
+    main()
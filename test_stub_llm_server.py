@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for the stub LLM server and the load test summary
+Runs the real agent against the stub server on a local port, fully offline.
+"""
+
+import asyncio
+import json
+import os
+import threading
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-test")
+
+from openai import AsyncOpenAI
+from pydantic_ai.models.openai import OpenAIModel
+from werkzeug.serving import make_server
+
+from knowledge_manager import load_knowledge_base_file
+from load_test import MemorySampler, RequestResult, summarize
+from pydantic_ai_expert import KNOWLEDGE_BASE_FILE, ClinicAIDeps, clinic_ai_expert
+from stub_llm_server import StubConfig, create_app
+
+
+def start_stub(config):
+    """Serve the stub on a free local port; returns (server, base url)."""
+    server = make_server("127.0.0.1", 0, create_app(config), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def test_chat_completion_script():
+    """A turn walks through the script: a tool call first, then the text answer"""
+    client = create_app(StubConfig(ttft_seconds=0, token_seconds=0, completion_tokens=8)).test_client()
+    tools = [{"type": "function", "function": {"name": "search_knowledge_base", "parameters": {}}}]
+    messages = [{"role": "system", "content": "Prompt"}, {"role": "user", "content": "Was kostet Botox?"}]
+
+    first = client.post("/v1/chat/completions", json={"model": "stub", "messages": messages, "tools": tools}).json
+    call = first["choices"][0]["message"]["tool_calls"][0]
+    assert call["function"]["name"] == "search_knowledge_base"
+    assert json.loads(call["function"]["arguments"]) == {"user_query": "Was kostet Botox?"}
+
+    messages += [first["choices"][0]["message"], {"role": "tool", "tool_call_id": call["id"], "content": "Botox ab 200 EUR"}]
+    second = client.post("/v1/chat/completions", json={"model": "stub", "messages": messages, "tools": tools}).json
+    assert second["choices"][0]["finish_reason"] == "stop"
+    assert len(second["choices"][0]["message"]["content"].split()) == 8
+
+    # Without the tool on offer (e.g. the history summarizer) the answer is text
+    summary = client.post("/v1/chat/completions", json={"model": "stub", "messages": messages[:2]}).json
+    assert summary["choices"][0]["message"]["content"]
+    print("✅ Chat completion script")
+
+
+def test_agent_against_stub():
+    """The agent runs and streams through the stub with its tool call, and embeddings are deterministic"""
+    server, base_url = start_stub(StubConfig(ttft_seconds=0.01, token_seconds=0.001, completion_tokens=20))
+    try:
+        client = AsyncOpenAI(base_url=base_url, api_key="sk-stub")
+        deps = ClinicAIDeps(knowledge_base=load_knowledge_base_file(KNOWLEDGE_BASE_FILE), openai_client=client)
+
+        async def run():
+            with clinic_ai_expert.override(model=OpenAIModel("gpt-4o-mini", openai_client=client)):
+                result = await clinic_ai_expert.run("Was kostet Botox?", deps=deps)
+                async with clinic_ai_expert.run_stream("Was kostet Morpheus8?", deps=deps) as streamed:
+                    text = "".join([delta async for delta in streamed.stream_text(delta=True)])
+            first = await client.embeddings.create(model="text-embedding-3-small", input=["Botox", "Botox"])
+            return result, text, first
+
+        result, text, embeddings = asyncio.run(run())
+        assert result.usage().requests == 2
+        assert "Was kostet Botox?" in result.data
+        assert "Was kostet Morpheus8?" in text
+        assert embeddings.data[0].embedding == embeddings.data[1].embedding
+        assert len(embeddings.data[0].embedding) == 1536
+
+        counters = server.app.config["stub"].counters
+        assert counters["chat_completions"] == 4 and counters["streamed"] == 2 and counters["tool_calls"] == 2
+        print(f"✅ Agent against stub ({counters})")
+    finally:
+        server.shutdown()
+
+
+def test_load_test_summary():
+    """Errors, throughput and memory growth of a load test run"""
+    results = [RequestResult(0, turn, True, 0.1 * (turn + 1), 0.05) for turn in range(9)]
+    results.append(RequestResult(1, 0, False, 0.5, error="HTTP 500"))
+    summary = summarize(results, 2.0, MemorySampler(pid=None, samples=[100.0, 140.0, 120.0]))
+    assert summary["requests"] == 10 and summary["errors"] == 1
+    assert summary["error_rate"] == 0.1 and summary["error_messages"] == {"HTTP 500": 1}
+    assert summary["throughput_rps"] == 4.5
+    assert abs(summary["latency"]["p50_ms"] - 500) < 1e-6
+    assert summary["memory"]["rss_peak_mb"] == 140.0 and summary["memory"]["rss_growth_mb"] == 20.0
+    print("✅ Load test summary")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Stub LLM Server")
+    print("=" * 50)
+
+    test_chat_completion_script()
+    test_agent_against_stub()
+    test_load_test_summary()
+
+    print("\n🎉 All stub LLM server tests passed!")
+
+
+if __name__ == "__main__":
+    main()
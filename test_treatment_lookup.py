@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for the fuzzy and alias-aware treatment lookup
+"""
+
+import time
+
+from treatment_lookup import TreatmentResolver
+
+TREATMENTS = [
+    {"id": "gesicht-co2-laserbehandlung-gesicht-01", "treatment_name": "CO₂-Laserbehandlung (Gesicht)", "category": "Gesicht", "tags": ["Aknenarben", "Laser"]},
+    {"id": "gesicht-morpheus8-09", "treatment_name": "Morpheus8", "category": "Gesicht", "tags": ["Morpheus8", "Radiofrequenz"]},
+    {"id": "gesicht-hydrafacial-05", "treatment_name": "HydraFacial", "category": "Gesicht", "tags": ["HydraFacial", "Tiefenreinigung"]},
+    {"id": "korper-lipolyse-behandlung-04", "treatment_name": "Lipolyse-Behandlung", "category": "Körper", "tags": ["Fett-weg-Spritze"]},
+    {"id": "manner-botox-behandlung-fur-manner-02", "treatment_name": "Botox-Behandlung für Männer", "category": "Männer", "tags": ["Botox", "Männer"]},
+    {"id": "manner-morpheus8-behandlung-fur-manner-05", "treatment_name": "Morpheus8-Behandlung für Männer", "category": "Männer", "tags": ["Morpheus8", "Männer"]},
+]
+
+resolver = TreatmentResolver(TREATMENTS)
+
+
+def name_of(match):
+    return TREATMENTS[match.index]["treatment_name"] if match.index is not None else None
+
+
+def test_exact_and_alias_lookup():
+    """Exact names, names without '-Behandlung' or qualifiers, ids and tags resolve"""
+    assert name_of(resolver.resolve("Morpheus8")) == "Morpheus8"
+    assert not resolver.resolve("Morpheus8").ambiguous
+    assert name_of(resolver.resolve("CO2 Laser")) == "CO₂-Laserbehandlung (Gesicht)"
+    assert name_of(resolver.resolve("Lipolyse")) == "Lipolyse-Behandlung"
+    assert name_of(resolver.resolve("Fett-weg-Spritze")) == "Lipolyse-Behandlung"
+    assert name_of(resolver.resolve("Botox")) == "Botox-Behandlung für Männer"
+    assert name_of(resolver.resolve("morpheus8 für männer")) == "Morpheus8-Behandlung für Männer"
+    print("✅ Exact and alias lookup")
+
+
+def test_typos():
+    """Misspelled names are matched by trigram similarity"""
+    assert name_of(resolver.resolve("Hydrafacal")) == "HydraFacial"
+    assert name_of(resolver.resolve("Morfeus 8")) == "Morpheus8"
+    assert name_of(resolver.resolve("Pizza")) is None
+    print("✅ Typos")
+
+
+def test_ambiguous_names_return_ranked_candidates():
+    """A name shared by several treatments returns all of them, best first"""
+    match = resolver.resolve("Laser")
+    assert match.ambiguous is False and name_of(match) == "CO₂-Laserbehandlung (Gesicht)"
+
+    match = resolver.resolve("Morpheus")
+    assert match.ambiguous
+    assert [TREATMENTS[i]["treatment_name"] for i in match.candidates] == ["Morpheus8", "Morpheus8-Behandlung für Männer"]
+    print("✅ Ambiguous names return ranked candidates")
+
+
+def test_lookup_speed():
+    """Lookups, including fuzzy ones, stay well below a millisecond"""
+    started = time.perf_counter()
+    for _ in range(1000):
+        resolver.resolve("Hydrafacal")
+    assert (time.perf_counter() - started) / 1000 < 0.001
+    print("✅ Lookup speed")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Treatment Lookup")
+    print("=" * 50)
+
+    test_exact_and_alias_lookup()
+    test_typos()
+    test_ambiguous_names_return_ranked_candidates()
+    test_lookup_speed()
+
+    print("\n🎉 All treatment lookup tests passed!")
+
+
+if __name__ == "__main__":
+    main()
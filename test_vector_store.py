@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the local site_pages vector store
+Checks that it behaves like the match_site_pages SQL function, fully offline.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from vector_store import MAX_CACHED_FILTERS, LocalVectorStore, jsonb_contains
+
+
+def make_rows(count=50, dimensions=16, seed=7):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "id": i,
+            "url": f"https://haut-labor.de/page-{i // 5}",
+            "chunk_number": i % 5,
+            "title": f"Seite {i}",
+            "summary": "",
+            "content": f"Inhalt {i}",
+            "metadata": {"source": "treatment" if i % 2 else "page", "tags": ["laser"] if i % 3 == 0 else []},
+            "embedding": rng.normal(size=dimensions).tolist(),
+        }
+        for i in range(count)
+    ]
+
+
+def brute_force(rows, query, match_count, filter):
+    query = np.asarray(query) / np.linalg.norm(query)
+    scored = []
+    for row in rows:
+        if jsonb_contains(row["metadata"], filter):
+            embedding = np.asarray(row["embedding"])
+            scored.append((float(embedding @ query / np.linalg.norm(embedding)), row["id"]))
+    scored.sort(reverse=True)
+    return [row_id for _, row_id in scored[:match_count]]
+
+
+def test_jsonb_containment():
+    """Filter semantics follow Postgres' jsonb @> operator"""
+    metadata = {"source": "treatment", "tags": ["laser", "narben"], "details": {"price": 400}}
+
+    assert jsonb_contains(metadata, {})
+    assert jsonb_contains(metadata, {"source": "treatment"})
+    assert jsonb_contains(metadata, {"tags": ["narben"]})
+    assert jsonb_contains(metadata, {"details": {"price": 400}})
+    assert not jsonb_contains(metadata, {"source": "page"})
+    assert not jsonb_contains(metadata, {"tags": "laser"})
+    assert not jsonb_contains({"flag": 1}, {"flag": True})
+    assert jsonb_contains(["laser", "narben"], "laser")
+    print("✅ JSONB containment")
+
+
+def test_matches_brute_force():
+    """Top-k results equal a brute force cosine ranking, with and without filters"""
+    rows = make_rows()
+    store = LocalVectorStore.from_rows(rows)
+    query = np.random.default_rng(1).normal(size=16).tolist()
+
+    for filter in ({}, {"source": "treatment"}, {"tags": ["laser"]}):
+        results = store.match_site_pages(query, match_count=5, filter=filter)
+        assert [r["id"] for r in results] == brute_force(rows, query, 5, filter)
+        assert all(-1.0 <= r["similarity"] <= 1.0 for r in results)
+    print("✅ Results match brute force search")
+
+
+def test_batch_and_edge_cases():
+    """Batched queries match single queries; filters and match counts behave"""
+    store = LocalVectorStore.from_rows(make_rows())
+    queries = np.random.default_rng(2).normal(size=(3, 16)).tolist()
+
+    batched = store.match_many(queries, match_count=4)
+    for query, results in zip(queries, batched):
+        single = store.match_site_pages(query, match_count=4)
+        assert [r["id"] for r in results] == [r["id"] for r in single]
+        assert np.allclose([r["similarity"] for r in results], [r["similarity"] for r in single], atol=1e-6)
+
+    assert len(store.match_site_pages(queries[0], match_count=100, filter={"source": "page"})) == 25
+    assert store.match_site_pages(queries[0], filter={"source": "unknown"}) == []
+    assert store.match_site_pages(queries[0], match_count=0) == []
+    print("✅ Batched queries and edge cases")
+
+
+def test_concurrent_filter_cache():
+    """Threads filling and evicting the filter mask cache at the same time do not fail"""
+    store = LocalVectorStore.from_rows(make_rows())
+    query = np.random.default_rng(4).normal(size=16).tolist()
+    filters = [{"source": "page", "n": n} for n in range(4 * MAX_CACHED_FILTERS)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda filter: store.match_site_pages(query, filter=filter), filters))
+    assert results == [[]] * len(filters)
+    assert len(store._filter_masks) == MAX_CACHED_FILTERS
+    print("✅ Concurrent filter cache")
+
+
+def test_save_and_memory_map():
+    """A saved store is memory-mapped on load and returns identical results"""
+    store = LocalVectorStore.from_rows(make_rows())
+    query = np.random.default_rng(3).normal(size=16).tolist()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store.save(directory)
+        loaded = LocalVectorStore.load(directory)
+
+        assert isinstance(loaded.embeddings, np.memmap)
+        assert loaded.embeddings.dtype == np.float32
+        assert loaded.match_site_pages(query, 5) == store.match_site_pages(query, 5)
+
+        # Re-ingesting replaces the files instead of truncating the mapped one
+        LocalVectorStore.from_rows(make_rows()[:3]).save(directory)
+        assert loaded.match_site_pages(query, 5) == store.match_site_pages(query, 5)
+        assert len(LocalVectorStore.load(directory)) == 3
+        assert sorted(os.listdir(directory)) == ["embeddings.npy", "rows.json"]
+    print("✅ Save and memory-mapped load")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Local Vector Store")
+    print("=" * 50)
+
+    test_jsonb_containment()
+    test_matches_brute_force()
+    test_batch_and_edge_cases()
+    test_concurrent_filter_cache()
+    test_save_and_memory_map()
+
+    print("\n🎉 All vector store tests passed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script for the web search cache
+Uses a fake search function instead of the Responses API.
+"""
+
+import asyncio
+
+from event_loop import BackgroundEventLoop
+from web_search_cache import WebSearchCache, normalize_query
+
+
+class FakeSearch:
+    """Counts calls; optionally slow or failing."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+
+    async def __call__(self, query):
+        self.calls.append(query)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("web search unavailable")
+        return f"Ergebnis {len(self.calls)} für {query}"
+
+
+def test_normalized_queries_share_entries():
+    """Case, whitespace and trailing punctuation do not matter"""
+    assert normalize_query("Morpheus8  Studien?") == normalize_query("morpheus8 studien")
+
+    async def scenario():
+        cache = WebSearchCache()
+        search = FakeSearch()
+        first = await cache.search("Morpheus8 Studien?", search)
+        second = await cache.search("morpheus8  studien", search)
+        return cache, search, first, second
+
+    cache, search, first, second = asyncio.run(scenario())
+    assert first == second and len(search.calls) == 1
+    assert cache.stats["hits"] == 1 and cache.stats["calls"] == 1
+    print("✅ Normalized queries share entries")
+
+
+def test_concurrent_queries_are_coalesced():
+    """Identical queries in flight at the same time make one call"""
+    async def scenario():
+        cache = WebSearchCache()
+        search = FakeSearch(delay=0.05)
+        results = await asyncio.gather(*(cache.search("Ultherapy Erfahrungen", search) for _ in range(5)))
+        return cache, search, results
+
+    cache, search, results = asyncio.run(scenario())
+    assert len(search.calls) == 1 and len(set(results)) == 1
+    assert cache.stats["coalesced"] == 4
+    print("✅ Concurrent queries are coalesced")
+
+
+def test_timeout_and_errors_are_not_cached():
+    """A slow call times out, a failed call raises; neither is cached"""
+    async def scenario():
+        cache = WebSearchCache(timeout_seconds=0.01)
+        try:
+            await cache.search("langsam", FakeSearch(delay=0.2))
+            raise AssertionError("expected a timeout")
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await cache.search("kaputt", FakeSearch(fail=True))
+            raise AssertionError("expected an error")
+        except RuntimeError:
+            pass
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache.stats["timeouts"] == 1 and cache.stats["errors"] == 1 and cache.stats["entries"] == 0
+    print("✅ Timeouts and errors are not cached")
+
+
+def test_stale_while_revalidate():
+    """An expired entry is served at once and refreshed in the background"""
+    async def scenario():
+        cache = WebSearchCache(ttl_seconds=0.0, stale_seconds=60)
+        search = FakeSearch()
+        first = await cache.search("Hyaluron Studien", search)
+        stale = await cache.search("Hyaluron Studien", search)
+        await asyncio.sleep(0.01)
+        refreshed = await cache.search("Hyaluron Studien", search)
+        await asyncio.sleep(0.01)
+
+        # A failing refresh keeps serving the stale result
+        failing = FakeSearch(fail=True)
+        kept = await cache.search("Hyaluron Studien", failing)
+        await asyncio.sleep(0.01)
+        return cache, first, stale, refreshed, kept, failing
+
+    cache, first, stale, refreshed, kept, failing = asyncio.run(scenario())
+    assert stale == first
+    assert refreshed != first and refreshed.startswith("Ergebnis 2")
+    assert kept.startswith("Ergebnis 3") and len(failing.calls) == 1
+    assert cache.stats["stale_hits"] == 3
+    print("✅ Stale while revalidate")
+
+
+def test_refresh_keeps_call_of_other_loop():
+    """A finishing refresh does not drop a call another event loop started for the same query"""
+    cache = WebSearchCache(ttl_seconds=0.0, stale_seconds=60)
+    query = "Morpheus8 Studien"
+    other_loop = BackgroundEventLoop(name="web-search-test-loop")
+    try:
+        other_loop.run(cache.search(query, FakeSearch()))
+        # Served stale, the refresh keeps running on the other loop
+        other_loop.run(cache.search(query, FakeSearch(delay=0.05)))
+        cache.clear()
+
+        async def scenario():
+            search = FakeSearch(delay=0.3)
+            miss = asyncio.create_task(cache.search(query, search))
+            await asyncio.sleep(0.15)  # the refresh finishes meanwhile
+            # Still in flight, so no second refresh is started for it
+            await cache.search(query, search)
+            return search, await miss
+
+        search, result = asyncio.run(scenario())
+    finally:
+        other_loop.stop()
+
+    assert len(search.calls) == 1 and result == f"Ergebnis 1 für {query}"
+    assert cache.stats["calls"] == 3 and not cache._in_flight
+    print("✅ Refresh keeps the call of another loop")
+
+
+def main():
+    """Run all tests"""
+    print("🏥 Testing Web Search Cache")
+    print("=" * 50)
+
+    test_normalized_queries_share_entries()
+    test_concurrent_queries_are_coalesced()
+    test_timeout_and_errors_are_not_cached()
+    test_stale_while_revalidate()
+    test_refresh_keeps_call_of_other_loop()
+
+    print("\n🎉 All web search cache tests passed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Resolve the treatment names the model passes to get_treatment_details.
+
+The model rarely uses the exact treatment_name from the knowledge base: it
+writes "CO2 Laser" for "CO₂-Laserbehandlung (Gesicht)", "Botox" for
+"Botox-Behandlung für Männer" or misspells "Morpheus8". The resolver is
+built once per knowledge base and looks a name up in three stages:
+
+1. exact: the folded, compacted treatment name ("co2laserbehandlunggesicht"),
+2. aliases: the name without "-behandlung" and qualifiers such as
+   "(Gesicht)" or "für Männer", the id, and the tags,
+3. fuzzy: character trigram similarity against all names and aliases, for
+   typos and partial names.
+
+An alias shared by several treatments (e.g. "Morpheus8") or several close
+fuzzy matches make the result ambiguous; the candidates are then returned
+ranked by their similarity to the query.
+"""
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from german_text import words
+
+# Fuzzy scores (Dice coefficient of trigrams) needed for a match and for a suggestion
+MIN_MATCH_SCORE = 0.6
+MIN_CANDIDATE_SCORE = 0.3
+# A fuzzy match is ambiguous if another treatment scores within this margin
+AMBIGUITY_MARGIN = 0.1
+
+_QUALIFIER_RE = re.compile(r"\s*\([^)]*\)|\s+f(?:ü|u|ue)r\s+.*$", re.IGNORECASE)
+_ID_SUFFIX_RE = re.compile(r"-\d+$")
+_GENERIC_SUFFIX = "behandlung"
+
+
+def compact(text: str) -> str:
+    """Fold text and drop stopwords, spaces and punctuation: "CO₂-Laser" -> "co2laser"."""
+    return "".join(words(text))
+
+
+def strip_generic(text: str) -> str:
+    """Compact text without the generic "-behandlung" suffix of its words."""
+    stripped = []
+    for word in words(text):
+        if word.endswith(_GENERIC_SUFFIX):
+            word = word[:-len(_GENERIC_SUFFIX)]
+        stripped.append(word)
+    return "".join(stripped)
+
+
+def trigrams(key: str) -> Set[str]:
+    """Character trigrams of a compact key, padded so short keys still have some."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query: str, query_trigrams: Set[str], key: str, key_trigrams: Optional[Set[str]] = None) -> float:
+    """
+    Dice coefficient of the trigrams of two compact keys. A query that is part
+    of the key ("haarentfernung") counts as a match even if the key is long.
+    """
+    key_trigrams = trigrams(key) if key_trigrams is None else key_trigrams
+    score = 2 * len(query_trigrams & key_trigrams) / (len(query_trigrams) + len(key_trigrams))
+    if len(query) >= 4 and query in key:
+        score = max(score, MIN_MATCH_SCORE + 0.1 * len(query) / len(key))
+    return score
+
+
+@dataclass
+class TreatmentMatch:
+    """Result of a lookup: the resolved treatment (if any) and ranked candidates."""
+
+    index: Optional[int] = None
+    candidates: List[int] = field(default_factory=list)
+    ambiguous: bool = False
+
+
+class TreatmentResolver:
+    """Precomputed name, alias and trigram lookup over the treatments of a knowledge base."""
+
+    def __init__(self, treatments: List[Dict[str, Any]]):
+        self.treatments = treatments
+        self._names = [compact(treatment.get("treatment_name", "")) for treatment in treatments]
+
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        self._aliases: Dict[str, List[int]] = defaultdict(list)
+        self._tags: Dict[str, List[int]] = defaultdict(list)
+        for index, treatment in enumerate(treatments):
+            name = treatment.get("treatment_name", "")
+            self._add(self._exact, compact(name), index)
+
+            base_name = _QUALIFIER_RE.sub("", name)
+            treatment_id = _ID_SUFFIX_RE.sub("", treatment.get("id", ""))
+            category = compact(treatment.get("category", ""))
+            id_words = [word for word in treatment_id.split("-") if word]
+            if id_words and compact(id_words[0]) == category:
+                id_words = id_words[1:]
+
+            for alias in (strip_generic(name), compact(base_name), strip_generic(base_name),
+                          compact(" ".join(id_words)), strip_generic(" ".join(id_words))):
+                self._add(self._aliases, alias, index)
+            for tag in treatment.get("tags", []):
+                self._add(self._tags, compact(tag), index)
+
+        # Fuzzy index: every distinct key with the treatments it belongs to, and trigram postings over the keys
+        key_owners: Dict[str, Set[int]] = defaultdict(set)
+        for table in (self._exact, self._aliases, self._tags):
+            for key, indices in table.items():
+                key_owners[key].update(indices)
+        self._keys: List[Tuple[str, Set[str], Tuple[int, ...]]] = [
+            (key, trigrams(key), tuple(sorted(owners))) for key, owners in key_owners.items()
+        ]
+        self._trigram_postings: Dict[str, List[int]] = defaultdict(list)
+        for key_id, (_, key_trigrams, _) in enumerate(self._keys):
+            for trigram in key_trigrams:
+                self._trigram_postings[trigram].append(key_id)
+
+    @staticmethod
+    def _add(table: Dict[str, List[int]], key: str, index: int) -> None:
+        if key and index not in table[key]:
+            table[key].append(index)
+
+    def _rank(self, query: str, indices: List[int]) -> List[int]:
+        """Order treatments by how similar their name is to the query (stable for ties)."""
+        query_trigrams = trigrams(query)
+        return sorted(indices, key=lambda index: -similarity(query, query_trigrams, self._names[index]))
+
+    def _fuzzy_scores(self, query: str) -> Dict[int, float]:
+        """Best trigram similarity of each treatment to the query, using only keys sharing a trigram."""
+        query_trigrams = trigrams(query)
+        shared: Dict[int, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for key_id in self._trigram_postings.get(trigram, ()):
+                shared[key_id] += 1
+
+        scores: Dict[int, float] = {}
+        for key_id in shared:
+            key, key_trigrams, owners = self._keys[key_id]
+            score = similarity(query, query_trigrams, key, key_trigrams)
+            for owner in owners:
+                scores[owner] = max(scores.get(owner, 0.0), score)
+        return scores
+
+    def resolve(self, name: str, max_candidates: int = 5) -> TreatmentMatch:
+        """Return the treatment meant by name, ranked candidates if it is ambiguous, or an empty match."""
+        query = compact(name)
+        if not query:
+            return TreatmentMatch()
+
+        for table, key in ((self._exact, query), (self._aliases, query), (self._aliases, strip_generic(name)),
+                           (self._tags, query)):
+            indices = table.get(key)
+            if indices:
+                ranked = self._rank(query, indices)
+                return TreatmentMatch(index=ranked[0], candidates=ranked[:max_candidates], ambiguous=len(ranked) > 1)
+
+        scores = self._fuzzy_scores(query)
+        ranked = sorted((index for index, score in scores.items() if score >= MIN_CANDIDATE_SCORE),
+                        key=lambda index: (-scores[index], index))[:max_candidates]
+        if not ranked or scores[ranked[0]] < MIN_MATCH_SCORE:
+            return TreatmentMatch(candidates=ranked, ambiguous=bool(ranked))
+
+        best = scores[ranked[0]]
+        close = [index for index in ranked if best - scores[index] <= AMBIGUITY_MARGIN]
+        return TreatmentMatch(index=ranked[0], candidates=ranked, ambiguous=len(close) > 1)
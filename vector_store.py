@@ -0,0 +1,235 @@
+"""
+In-process replacement for the Supabase `match_site_pages` RPC (see site_pages.sql).
+
+The site_pages rows are stored next to each other on disk:
+
+    <directory>/embeddings.npy   float32 matrix, one L2-normalized row per chunk
+    <directory>/rows.json        the remaining columns (id, url, chunk_number, ...)
+
+The matrix is memory-mapped on load, so every process shares the same pages
+through the OS cache, and a query is a single matrix-vector product instead
+of a network round trip to Postgres. Both files are replaced atomically by
+save(), so a process that has the old matrix mapped keeps reading the old
+file until it loads the store again.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDING_DIMENSIONS = 1536  # OpenAI text-embedding-3-small, same as vector(1536) in site_pages.sql
+
+DEFAULT_DIRECTORY = "site_pages_index"
+EMBEDDINGS_FILE = "embeddings.npy"
+ROWS_FILE = "rows.json"
+
+ROW_COLUMNS = ("id", "url", "chunk_number", "title", "summary", "content", "metadata")
+
+# Number of distinct metadata filters whose row masks are kept in memory
+MAX_CACHED_FILTERS = 128
+
+
+def _contains(container: Any, contained: Any) -> bool:
+    if isinstance(contained, dict):
+        return isinstance(container, dict) and all(
+            key in container and _contains(container[key], value)
+            for key, value in contained.items()
+        )
+    if isinstance(contained, list):
+        return isinstance(container, list) and all(
+            any(_contains(element, item) for element in container)
+            for item in contained
+        )
+    if isinstance(container, bool) or isinstance(contained, bool):
+        return container is contained
+    return container == contained
+
+
+def jsonb_contains(container: Any, contained: Any) -> bool:
+    """
+    Python equivalent of Postgres' `container @> contained` for JSONB values.
+
+    Objects contain another object if every key is present and its value is
+    contained; arrays contain another array if every element is contained in
+    some element; scalars must be equal. As in Postgres, a top-level array
+    also contains a bare scalar that is one of its elements.
+    """
+    if isinstance(container, list) and not isinstance(contained, (dict, list)):
+        return any(_contains(element, contained) for element in container)
+    return _contains(container, contained)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a matrix, leaving all-zero rows untouched."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def _parse_embedding(embedding: Any) -> Optional[List[float]]:
+    """Accept embeddings as lists or as the '[0.1,0.2,...]' strings PostgREST returns for vector columns."""
+    if embedding is None:
+        return None
+    if isinstance(embedding, str):
+        return json.loads(embedding)
+    return list(embedding)
+
+
+def _write_atomically(path: str, write: Callable[[Any], None]) -> None:
+    """Write a file through a temporary file in the same directory and os.replace it over path."""
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".vector-store-")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            write(f)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+class LocalVectorStore:
+    """Memory-mapped cosine similarity search over site_pages chunks."""
+
+    def __init__(self, embeddings: np.ndarray, rows: List[Dict[str, Any]]):
+        if len(embeddings) != len(rows):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(rows)} rows")
+        self.embeddings = embeddings
+        self.rows = rows
+        # Shared by request threads and the agent event loop, hence the lock
+        self._filter_masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._filter_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]]) -> "LocalVectorStore":
+        """
+        Build a store from site_pages rows, e.g. the result of
+        `supabase.table('site_pages').select('*').execute().data`.
+
+        Rows without an embedding are skipped, like they never rank in pgvector.
+        """
+        kept_rows = []
+        vectors = []
+        for row in rows:
+            embedding = _parse_embedding(row.get("embedding"))
+            if embedding is None:
+                continue
+            vectors.append(embedding)
+            kept_rows.append({column: row.get(column) for column in ROW_COLUMNS})
+            kept_rows[-1]["metadata"] = kept_rows[-1]["metadata"] or {}
+
+        if vectors:
+            embeddings = _normalize(np.asarray(vectors, dtype=np.float32))
+        else:
+            embeddings = np.zeros((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+        return cls(embeddings, kept_rows)
+
+    @classmethod
+    def load(cls, directory: str) -> "LocalVectorStore":
+        """Open a store written by save(), memory-mapping the embedding matrix."""
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, ROWS_FILE), "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        return cls(embeddings, rows)
+
+    def save(self, directory: str) -> None:
+        """
+        Write the store to a directory so it can be memory-mapped with load().
+
+        Never truncates a file another process may have mapped (that would
+        crash it with SIGBUS): each file is written next to its target and
+        renamed over it. The rows go last, so their change marks a complete
+        store.
+        """
+        os.makedirs(directory, exist_ok=True)
+        embeddings = np.ascontiguousarray(self.embeddings, dtype=np.float32)
+        _write_atomically(os.path.join(directory, EMBEDDINGS_FILE), lambda f: np.save(f, embeddings))
+        rows = json.dumps(self.rows, ensure_ascii=False).encode("utf-8")
+        _write_atomically(os.path.join(directory, ROWS_FILE), lambda f: f.write(rows))
+
+    def _filter_mask(self, filter: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Return a boolean mask of rows whose metadata contains filter (None means all rows)."""
+        if not filter:
+            return None
+
+        key = json.dumps(filter, sort_keys=True)
+        with self._filter_lock:
+            mask = self._filter_masks.get(key)
+        if mask is None:
+            # Computed outside the lock; two threads may both compute the same mask, which is harmless
+            mask = np.fromiter(
+                (jsonb_contains(row["metadata"], filter) for row in self.rows),
+                dtype=bool,
+                count=len(self.rows),
+            )
+            with self._filter_lock:
+                self._filter_masks[key] = mask
+                while len(self._filter_masks) > MAX_CACHED_FILTERS:
+                    self._filter_masks.popitem(last=False)
+        return mask
+
+    def match_many(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        match_count: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """Run match_site_pages for a batch of query embeddings with one matrix product."""
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        if not len(self.rows) or match_count <= 0:
+            return [[] for _ in range(len(queries))]
+
+        similarities = queries @ self.embeddings.T
+        mask = self._filter_mask(filter or {})
+        if mask is not None:
+            similarities[:, ~mask] = -np.inf
+
+        candidates = len(self.rows) if mask is None else int(mask.sum())
+        k = min(match_count, candidates)
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = []
+        for query_similarities, indices in zip(similarities, top):
+            ordered = indices[np.argsort(-query_similarities[indices], kind="stable")]
+            results.append([
+                {**self.rows[index], "similarity": float(query_similarities[index])}
+                for index in ordered
+            ])
+        return results
+
+    def match_site_pages(
+        self,
+        query_embedding: Sequence[float],
+        match_count: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Same contract as the match_site_pages SQL function: the match_count rows
+        closest to query_embedding by cosine similarity whose metadata contains
+        filter, with a `similarity` column, most similar first.
+        """
+        return self.match_many([query_embedding], match_count=match_count, filter=filter)[0]
+
+
+def vector_store_directory(directory: Optional[str] = None) -> str:
+    """The directory of the local site_pages index (VECTOR_STORE_DIR)."""
+    return directory or os.getenv("VECTOR_STORE_DIR", DEFAULT_DIRECTORY)
+
+
+def load_vector_store(directory: Optional[str] = None) -> Optional[LocalVectorStore]:
+    """Load the local site_pages index, or return None if it has not been built yet."""
+    directory = vector_store_directory(directory)
+    try:
+        return LocalVectorStore.load(directory)
+    except FileNotFoundError:
+        print(f"⚠️  Local vector store not found in {directory}")
+        return None
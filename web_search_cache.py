@@ -0,0 +1,168 @@
+"""
+Cache in front of the web_search tool.
+
+A web search is a full Responses API call with the web_search_preview tool
+and by far the slowest tool call. The model often sends near-identical
+queries, within one conversation and across users. WebSearchCache keeps the
+results keyed by the normalized query and
+
+- returns fresh results (younger than the TTL) without calling the API,
+- coalesces concurrent identical queries into one in-flight call,
+- bounds every call with a timeout,
+- serves a stale result (younger than the stale window) immediately and
+  refreshes it in the background (stale-while-revalidate), and falls back
+  to it if the refresh fails.
+
+Failed calls are never cached.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from embedding_cache import normalize_text
+
+DEFAULT_TTL_SECONDS = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", 60 * 60))
+DEFAULT_STALE_SECONDS = float(os.getenv("WEB_SEARCH_STALE_SECONDS", 24 * 60 * 60))
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("WEB_SEARCH_TIMEOUT_SECONDS", 20))
+DEFAULT_MAX_ENTRIES = 500
+
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.,;:]+$")
+
+Fetch = Callable[[str], Awaitable[str]]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so "Morpheus8 Studien?" and "morpheus8  studien" share one entry."""
+    return _TRAILING_PUNCTUATION_RE.sub("", normalize_text(query))
+
+
+@dataclass
+class CachedSearch:
+    result: str
+    created_at: float
+
+
+class WebSearchCache:
+    """TTL + stale-while-revalidate cache with request coalescing for web search results."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        stale_seconds: float = DEFAULT_STALE_SECONDS,
+        timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.timeout_seconds = timeout_seconds
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, CachedSearch]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._refreshes: Set[asyncio.Task] = set()
+
+        self.lookups = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Counters; `calls` is how often the web search API was actually reached."""
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "coalesced": self.coalesced,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "hit_rate": (self.hits + self.stale_hits + self.coalesced) / self.lookups if self.lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _entry(self, key: str, max_age: float) -> Optional[CachedSearch]:
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry.created_at > max_age:
+            return None
+        return entry
+
+    async def _call(self, key: str, query: str, fetch: Fetch) -> str:
+        self.calls += 1
+        try:
+            result = await asyncio.wait_for(fetch(query), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            # Another event loop may have started its own call for key meanwhile
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+
+        self._entries[key] = CachedSearch(result=result, created_at=time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
+
+    def _start_call(self, key: str, query: str, fetch: Fetch) -> asyncio.Task:
+        """Return the in-flight call for key, starting one if there is none on this event loop."""
+        task = self._in_flight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+            return task
+        task = asyncio.create_task(self._call(key, query, fetch))
+        self._in_flight[key] = task
+        return task
+
+    def _refresh_in_background(self, key: str, query: str, fetch: Fetch) -> None:
+        if key in self._in_flight:
+            return
+        task = self._start_call(key, query, fetch)
+        # Keep a reference until done; a failed refresh keeps the stale entry
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️  Web search refresh failed, keeping stale result: {task.exception()!r}")
+
+    async def search(self, query: str, fetch: Fetch) -> str:
+        """
+        Return the result for query, calling fetch(query) only if there is no
+        fresh or stale entry and no identical call in flight. Raises the
+        error of fetch (or asyncio.TimeoutError) if there is nothing to fall
+        back to.
+        """
+        key = normalize_query(query)
+        self.lookups += 1
+
+        entry = self._entry(key, self.ttl_seconds)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.result
+
+        stale = self._entry(key, self.stale_seconds)
+        if stale is not None:
+            self.stale_hits += 1
+            self._refresh_in_background(key, query, fetch)
+            return stale.result
+
+        # Shielded, so one caller being cancelled does not cancel the call for the others
+        return await asyncio.shield(self._start_call(key, query, fetch))